@@ -0,0 +1,82 @@
+"""
+Search latency of the BM25 index on a synthetic corpus.
+
+Builds an index of generated chunks (a mix of English words, part numbers
+and Japanese text, with a Zipf-like word distribution so common terms have
+long postings), then reports per-query latency percentiles for search() and
+reference_score(), before and after tombstoning part of the corpus.
+
+Usage: python benchmark_bm25.py [chunks] [index_dir]
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import List
+import numpy as np
+from rag_utils.bm25_index import BM25Index
+
+n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+index_dir = sys.argv[2] if len(sys.argv) > 2 else None
+words_per_chunk = 120
+batch = 10_000
+
+rng = np.random.default_rng(42)
+vocab = np.array([f"w{i}" for i in range(50_000)])
+zipf = 1.0 / np.arange(1, len(vocab) + 1)
+zipf /= zipf.sum()
+kana = np.array(list("あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"))
+
+
+def make_chunks(first: int, count: int) -> List[str]:
+    words = vocab[rng.choice(len(vocab), size=(count, words_per_chunk), p=zipf)]
+    japanese = kana[rng.integers(len(kana), size=(count, 40))]
+    return [f"{' '.join(words[i])} AB-{(first + i) % 20_000:05d} {''.join(japanese[i])}" for i in range(count)]
+
+
+queries = [
+    "w1 w2 w3",                          # very common terms only
+    "w5 w120 w4000",                     # common + mid + rare
+    "AB-01234 w7",                       # part number
+    "w30000 w40000 w45000",              # rare terms
+    "あいうえ w10",                       # Japanese bigrams
+]
+
+
+def measure(index: BM25Index, label: str, repeats: int = 50):
+    for name, fn in (("search", lambda q: index.search(q, top_k=10)), ("reference_score", index.reference_score)):
+        timings = []
+        for _ in range(repeats):
+            for query in queries:
+                start = time.perf_counter()
+                fn(query)
+                timings.append(time.perf_counter() - start)
+        ms = np.array(timings) * 1000
+        print(f"{label} {name}: p50 {np.percentile(ms, 50):.2f} ms, p95 {np.percentile(ms, 95):.2f} ms, "
+              f"max {ms.max():.2f} ms over {len(ms)} queries")
+
+
+tmp = None
+if index_dir is None:
+    tmp = tempfile.TemporaryDirectory()
+    index_dir = tmp.name
+try:
+    # Postings are merged and snapshotted once at the end instead of while building
+    index = BM25Index(index_dir, merge_threshold=10 ** 12, snapshot_every=10 * n_chunks)
+    print(f"Indexing {n_chunks} chunks of {words_per_chunk} words...")
+    start = time.perf_counter()
+    for offset in range(0, n_chunks, batch):
+        ids = [f"c{i}" for i in range(offset, min(offset + batch, n_chunks))]
+        index.add(ids, make_chunks(offset, len(ids)))
+    index.save()
+    print(f"Indexed in {time.perf_counter() - start:.1f}s, "
+          f"snapshot {os.path.getsize(os.path.join(index_dir, 'index.npz')) / 2**20:.0f} MB")
+    measure(index, "merged")
+
+    # Tombstones stay in the postings until the next merge
+    index.remove([f"c{i}" for i in range(0, n_chunks, 10)])
+    print(f"\nTombstoned {len(range(0, n_chunks, 10))} chunks")
+    measure(index, "tombstoned")
+finally:
+    if tmp is not None:
+        tmp.cleanup()
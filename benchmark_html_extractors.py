@@ -0,0 +1,96 @@
+"""
+Benchmark of the HTML-to-text extractors over a corpus of saved pages.
+
+Reports per extractor the throughput (pages/s, MB/s of HTML), the size of
+the extracted text, the number of chunks it splits into with the
+default chunking settings, and the pages it extracted no text from (e.g.
+a layout wrapper such as an ASP.NET <form> removed as boilerplate).
+
+Usage:
+    python benchmark_html_extractors.py <dir with *.html files> [repeat]
+    python benchmark_html_extractors.py --save <dir> <url> [<url> ...]
+"""
+import os
+import sys
+import time
+import hashlib
+import requests
+import chardet
+from rag_utils.html_extractors import EXTRACTORS, LXML_AVAILABLE
+from rag_utils.pdf_processor import split_text
+from rag_utils.web_processor import DEFAULT_HEADERS
+
+
+def save_pages(corpus_dir, urls):
+    os.makedirs(corpus_dir, exist_ok=True)
+    for url in urls:
+        try:
+            response = requests.get(url, headers=DEFAULT_HEADERS, timeout=10)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Skipping {url}: {e}")
+            continue
+        name = hashlib.md5(url.encode()).hexdigest() + ".html"
+        with open(os.path.join(corpus_dir, name), 'wb') as f:
+            f.write(response.content)
+        print(f"Saved {url} ({len(response.content)} bytes)")
+
+
+def load_corpus(corpus_dir):
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(corpus_dir, name), 'rb') as f:
+                body = f.read()
+            encoding = chardet.detect(body[:65536])['encoding'] or 'utf-8'
+            pages.append((name, body.decode(encoding, errors='replace'), len(body)))
+    return pages
+
+
+if len(sys.argv) > 2 and sys.argv[1] == "--save":
+    save_pages(sys.argv[2], sys.argv[3:])
+    sys.exit(0)
+
+if len(sys.argv) < 2:
+    print(__doc__)
+    sys.exit(1)
+
+pages = load_corpus(sys.argv[1])
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+if not pages:
+    print(f"No .html files in {sys.argv[1]}")
+    sys.exit(1)
+html_bytes = sum(size for _, _, size in pages)
+print(f"Corpus: {len(pages)} pages, {html_bytes / 1e6:.2f} MB of HTML, {repeat} rounds")
+if not LXML_AVAILABLE:
+    print("lxml is not installed; only the soup extractor is benchmarked")
+
+results = {}
+for name, extractor_class in EXTRACTORS.items():
+    try:
+        extractor = extractor_class()
+    except ImportError:
+        continue
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        texts = [extractor.extract(html, page)[1] for page, html, _ in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    chars = sum(len(text) for text in texts)
+    chunks = sum(len(split_text(text)) for text in texts)
+    empty = [page for (page, _, _), text in zip(pages, texts) if not text.strip()]
+    results[name] = (best, chars, chunks)
+    print(f"\n{name}:")
+    print(f"  {len(pages) / best:.1f} pages/s, {html_bytes / 1e6 / best:.2f} MB/s (best of {repeat})")
+    print(f"  {chars} characters of text, {chunks} chunks")
+    if empty:
+        print(f"  no text extracted from {len(empty)} pages: {', '.join(empty[:5])}")
+
+if "soup" in results and len(results) > 1:
+    base_time, base_chars, base_chunks = results["soup"]
+    print("\nRelative to soup:")
+    for name, (elapsed, chars, chunks) in results.items():
+        if name != "soup":
+            print(f"  {name}: {base_time / elapsed:.1f}x faster, "
+                  f"{chars / max(1, base_chars):.0%} of the text, {chunks / max(1, base_chunks):.0%} of the chunks")
@@ -1,9 +1,15 @@
 from __future__ import annotations as _annotations
 
 import asyncio
+import codecs
+import collections
 import json
 import sqlite3
 import os
+import queue
+import sys
+import time
+import uuid
 from collections.abc import AsyncIterator
 from concurrent.futures.thread import ThreadPoolExecutor
 from contextlib import asynccontextmanager
@@ -18,6 +24,7 @@ import fastapi
 import logfire
 from fastapi import Depends, Request
 from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from typing_extensions import LiteralString, ParamSpec, TypedDict
 
 from pydantic import BaseModel
@@ -29,6 +36,7 @@ from pydantic_ai.messages import (
     ModelMessagesTypeAdapter,
     ModelRequest,
     ModelResponse,
+    SystemPromptPart,
     TextPart,
     UserPromptPart,
 )
@@ -60,6 +68,15 @@ agent = Agent(
     ),
     retries=2,
     instrument=True)
+# Folds older turns into the rolling conversation summary sent in place of the full history
+summary_agent = Agent(
+    llama_model,
+    system_prompt=(
+      "あなたは会話の要約係です。これまでの要約と新しい会話から、更新された要約だけを出力してください。"
+      "ユーザーについての事実、要望、決定事項、未解決の質問を簡潔に残してください。",
+    ),
+    retries=1,
+    instrument=True)
 Agent.instrument_all()
 logfire.instrument_httpx(capture_all=True) 
 
@@ -68,18 +85,60 @@ THIS_DIR = Path(__file__).parent
 # Initialize RAG service with PDF documents in the datas folder
 PDF_DIR = os.path.join(THIS_DIR, "datas")
 CHROMA_DB_DIR = os.path.join(THIS_DIR, "chroma_db")
-rag_service = RagService(pdf_dir=PDF_DIR, chroma_db_dir=CHROMA_DB_DIR)
+# "hybrid" fuses vector search with a BM25 index so exact part numbers and names match
+RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "hybrid")
+# Share of the (idf-weighted) query terms a lexical-only hybrid hit must match to pass the score threshold
+LEXICAL_MATCH_THRESH = float(os.environ.get("RAG_LEXICAL_MATCH_THRESH", "0.4"))
+VECTOR_BACKEND = os.environ.get("RAG_VECTOR_BACKEND", "chroma")
+# "background" queues URLs pasted into chat as ingestion jobs so answers never wait on slow sites
+URL_INGEST_MODE = os.environ.get("RAG_URL_INGEST_MODE", "background")
+# Seconds of model output coalesced into one delta line when streaming answers with stream=delta
+STREAM_COALESCE_SECONDS = float(os.environ.get("RAG_STREAM_COALESCE_SECONDS", "0.05"))
+# Token budget of the recent turns sent as message history; older turns are represented by a rolling summary
+HISTORY_MAX_TOKENS = int(os.environ.get("RAG_HISTORY_MAX_TOKENS", "3000"))
+HISTORY_SUMMARY = os.environ.get("RAG_HISTORY_SUMMARY", "true").lower() == "true"
+# Session (a chat_session cookie value) that takes over the shared history of databases from before
+# sessions existed; unset, that history stays in the "legacy" session, which no browser can open
+LEGACY_HISTORY_SESSION = os.environ.get("RAG_LEGACY_HISTORY_SESSION", "")
+# Admission control of LLM generations: concurrent generations, waiting requests, requests per client
+# and the longest (estimated) queue wait before a request is rejected with 429
+MAX_GENERATIONS = int(os.environ.get("RAG_MAX_GENERATIONS", "2"))
+MAX_QUEUE = int(os.environ.get("RAG_MAX_QUEUE", "16"))
+MAX_PER_CLIENT = int(os.environ.get("RAG_MAX_PER_CLIENT", "2"))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("RAG_QUEUE_TIMEOUT_SECONDS", "60"))
+# Header set by a trusted reverse proxy (e.g. X-Forwarded-For) that identifies clients for the per-client limit
+CLIENT_ADDRESS_HEADER = os.environ.get("RAG_CLIENT_ADDRESS_HEADER", "")
+rag_service = RagService(pdf_dir=PDF_DIR, chroma_db_dir=CHROMA_DB_DIR, retrieval_mode=RETRIEVAL_MODE,
+                         vector_backend=VECTOR_BACKEND, url_ingest_mode=URL_INGEST_MODE,
+                         lexical_match_thresh=LEXICAL_MATCH_THRESH)
 
 
 @asynccontextmanager
 async def lifespan(_app: fastapi.FastAPI):
-    async with Database.connect() as db:
+    async with Database.connect(legacy_history_session=LEGACY_HISTORY_SESSION) as db:
         yield {"db": db}
 
 
 app = fastapi.FastAPI(lifespan=lifespan)
 #logfire.instrument_fastapi(app)
 
+SESSION_COOKIE = "chat_session"
+
+
+@app.middleware("http")
+async def session_cookie(request: Request, call_next):
+    """Give every browser its own chat session, identified by a cookie."""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    # The legacy history is not handed to whoever presents its id
+    is_new = not session_id or session_id == LEGACY_SESSION_ID
+    if is_new:
+        session_id = uuid.uuid4().hex
+    request.state.session_id = session_id
+    response = await call_next(request)
+    if is_new:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=365 * 24 * 3600, httponly=True, samesite="lax")
+    return response
+
 
 @app.get("/")
 async def index() -> FileResponse:
@@ -96,20 +155,48 @@ async def get_db(request: Request) -> Database:
     return request.state.db
 
 
+async def get_session_id(request: Request) -> str:
+    return request.state.session_id
+
+
+async def get_client_address(request: Request) -> str:
+    """
+    Address of the client, used for per-client limits.
+
+    Not the session cookie: a client that sends no cookie gets a new session
+    on every request. Behind a reverse proxy every request comes from the
+    proxy's address, so set RAG_CLIENT_ADDRESS_HEADER to the header the proxy
+    sets; its last entry is the one the proxy added, earlier entries can be
+    forged by the client. Only set it when every request goes through the
+    proxy. Clients behind one NAT still share an address.
+    """
+    if CLIENT_ADDRESS_HEADER:
+        forwarded = request.headers.get(CLIENT_ADDRESS_HEADER, "")
+        address = forwarded.split(",")[-1].strip()
+        if address:
+            return address
+    return request.client.host if request.client else "unknown"
+
+
 @app.get("/chat/")
-async def get_chat(database: Database = Depends(get_db)) -> Response:
-    msgs = await database.get_messages()
-    safe_msgs = []
-    for m in msgs:
-        try:
-            safe_msgs.append(json.dumps(to_chat_message(m)).encode("utf-8"))
-        except Exception:
-            # Skip any message that cannot be parsed/displayed as chat
-            continue
-    return Response(
-        b"\n".join(safe_msgs),
-        media_type="text/plain",
-    )
+async def get_chat(
+    before: Optional[int] = None,
+    limit: Annotated[int, fastapi.Query(ge=1, le=500)] = 50,
+    database: Database = Depends(get_db),
+    session_id: str = Depends(get_session_id)
+) -> StreamingResponse:
+    """
+    Stream a page of the session's chat history as new line delimited JSON.
+
+    Returns the newest `limit` stored rows older than the `before` cursor,
+    oldest first, from their pre-rendered chat JSON. The last line is
+    {"page": {"before": cursor of the next older page, "has_more": bool}}.
+    """
+    async def stream_page():
+        async for line in database.iter_chat_page(session_id, before, limit):
+            yield line.encode("utf-8") + b"\n"
+
+    return StreamingResponse(stream_page(), media_type="application/x-ndjson")
 
 
 class ChatMessage(TypedDict):
@@ -147,9 +234,43 @@ def to_chat_message(m: ModelMessage) -> ChatMessage:
 async def post_chat(
     prompt: Annotated[str, fastapi.Form()], 
     use_rag: Annotated[str, fastapi.Form()] = "true",
-    database: Database = Depends(get_db)
-) -> StreamingResponse:
+    stream: Annotated[Literal["full", "delta"], fastapi.Form()] = "full",
+    database: Database = Depends(get_db),
+    session_id: str = Depends(get_session_id),
+    client_address: str = Depends(get_client_address)
+) -> Response:
+    """
+    Answer a prompt, streaming new line delimited JSON messages.
+
+    With stream=full every line re-sends the whole answer so far. With
+    stream=delta the answer is sent as append-only lines
+    {"id", "role", "timestamp", "delta"} carrying only the new text, coalesced
+    over RAG_STREAM_COALESCE_SECONDS, and a final line with "done": true.
+
+    Generations pass through the admission controller: a request that would
+    wait too long is rejected up front with 429, and once its RAG context and
+    history are ready it queues for a slot, sending {"queue": {"position": n}}
+    lines while it waits. The slot is held only while the model generates. The
+    per-client limit counts requests by client address.
+    """
+    try:
+        ticket = admission.reserve(client_address)
+    except AdmissionRejected as e:
+        return Response(
+            json.dumps({"status": "error", "message": str(e)}),
+            media_type="application/json",
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
     async def stream_messages():
+        try:
+            async for line in generate_messages():
+                yield line
+        finally:
+            admission.release(ticket)
+
+    async def generate_messages():
         """Streams new line delimited JSON "Message"s to the client."""
         # Store the original prompt
         original_prompt = prompt
@@ -160,16 +281,15 @@ async def post_chat(
         # Augment with RAG context if enabled
         augmented_prompt = original_prompt
         if use_rag_bool:
-            augmented_prompt = rag_service.answer_with_rag(original_prompt)
+            augmented_prompt = await rag_service.aanswer_with_rag(original_prompt)
         
-        # 1. Add the original user request to the chat DB first, if your framework allows it:
-        from pydantic_ai.messages import ModelRequest, UserPromptPart
-        import json as _jsonlib_mod_for_typing
+        # Recent turns within the token budget plus the summary of older ones, read before this prompt is stored
+        messages = await chat_history.load(database, session_id)
 
+        # 1. Add the original user request to the chat DB first, if your framework allows it:
         user_msg = ModelRequest(parts=[UserPromptPart(content=original_prompt, timestamp=datetime.now(tz=timezone.utc))])
         # Store only the user's true prompt in DB immediately -- flush to DB right now!
-        await database.add_messages(ModelMessagesTypeAdapter.dump_json([user_msg]))
-        messages = await database.get_messages()
+        await database.add_messages(session_id, ModelMessagesTypeAdapter.dump_json([user_msg]))
         # Prepare for streaming to client
         yield (
             json.dumps(
@@ -181,32 +301,74 @@ async def post_chat(
             ).encode("utf-8")
             + b"\n"
         )
+        # Wait for a generation slot, telling the client where it stands in the queue
+        try:
+            async for position in admission.wait(ticket):
+                yield json.dumps({"queue": {"position": position}}).encode("utf-8") + b"\n"
+        except AdmissionRejected as e:
+            yield json.dumps({"error": str(e)}).encode("utf-8") + b"\n"
+            return
         # 2. Use the augmented prompt with the agent, but only for inference—history stays clean
-        async with agent.run_stream(augmented_prompt, message_history=messages) as result:
-            async for text in result.stream(debounce_by=0.01):
-                m = ModelResponse(parts=[TextPart(text)], timestamp=result.timestamp())
-                yield json.dumps(to_chat_message(m)).encode("utf-8") + b"\n"
+        try:
+            async with agent.run_stream(augmented_prompt, message_history=messages) as result:
+                if stream == "delta":
+                    message_id = uuid.uuid4().hex
+                    timestamp = result.timestamp().isoformat()
+                    parts = []
+                    async for delta in result.stream_text(delta=True, debounce_by=STREAM_COALESCE_SECONDS):
+                        parts.append(delta)
+                        yield json.dumps(
+                            {"id": message_id, "role": "model", "timestamp": timestamp, "delta": delta}
+                        ).encode("utf-8") + b"\n"
+                    yield json.dumps(
+                        {"id": message_id, "role": "model", "timestamp": timestamp, "delta": "", "done": True}
+                    ).encode("utf-8") + b"\n"
+                else:
+                    async for text in result.stream(debounce_by=0.01):
+                        m = ModelResponse(parts=[TextPart(text)], timestamp=result.timestamp())
+                        yield json.dumps(to_chat_message(m)).encode("utf-8") + b"\n"
+        finally:
+            # Free the slot before storing the answer, so only generation time is measured
+            admission.release(ticket)
 
         # Only store model's responses from this call (never a user question generated from the agent)
         just_model_responses = [
             msg for msg in ModelMessagesTypeAdapter.validate_json(result.new_messages_json())
             if isinstance(msg, ModelResponse)
         ]
+        if stream == "delta" and not any(isinstance(part, TextPart) for msg in just_model_responses for part in msg.parts):
+            # Delta streaming does not always record the final text in the run's messages
+            just_model_responses = [ModelResponse(parts=[TextPart("".join(parts))], timestamp=result.timestamp())]
         if just_model_responses:
-            await database.add_messages(ModelMessagesTypeAdapter.dump_json(just_model_responses))
-    return StreamingResponse(stream_messages(), media_type="text/plain")
+            await database.add_messages(session_id, ModelMessagesTypeAdapter.dump_json(just_model_responses))
+        chat_history.schedule_summary(database, session_id)
+    media_type = "application/x-ndjson" if stream == "delta" else "text/plain"
+    # The background task frees the slot even if the client disconnects before the body starts
+    return StreamingResponse(stream_messages(), media_type=media_type,
+                             background=BackgroundTask(admission.release, ticket))
+
+
+@app.get("/admission/")
+async def get_admission_stats() -> Response:
+    """Queue depth, generations in flight, rejections and queue wait times of the admission controller."""
+    return Response(
+        json.dumps({"status": "success", "admission": admission.stats()}),
+        media_type="application/json"
+    )
 
 
 @app.get("/rag_status/")
 async def get_rag_status() -> Response:
     """Get information about the RAG service status and loaded documents"""
     try:
-        doc_count = len(rag_service.vector_store.collection.get()['documents']) if rag_service.vector_store.collection.count() > 0 else 0
+        doc_count = rag_service.vector_store.count()
         return Response(
             json.dumps({
                 "status": "active",
                 "pdf_dir": PDF_DIR,
                 "document_chunks": doc_count,
+                "sources": rag_service.vector_store.registry.stats(),
+                "caches": rag_service.vector_store.cache_stats(),
             }),
             media_type="application/json",
         )
@@ -251,28 +413,17 @@ async def add_url(url: Annotated[str, fastapi.Form()]) -> Response:
                 status_code=400
             )
         
-        # Add URL to knowledge base
-        success = rag_service.add_web_url(url)
-        
-        if success:
-            print(f"Successfully added URL: {url}")
-            return Response(
-                json.dumps({
-                    "status": "success",
-                    "message": f"Successfully added content from {url} to knowledge base"
-                }),
-                media_type="application/json"
-            )
-        else:
-            print(f"Failed to add URL: {url}")
-            return Response(
-                json.dumps({
-                    "status": "error",
-                    "message": f"Failed to add content from {url}"
-                }),
-                media_type="application/json",
-                status_code=500
-            )
+        # Ingest in the background; the client polls /jobs/{job_id} for progress
+        job_id = rag_service.enqueue_url(url)
+        return Response(
+            json.dumps({
+                "status": "accepted",
+                "job_id": job_id,
+                "message": f"Queued {url} for ingestion"
+            }),
+            media_type="application/json",
+            status_code=202
+        )
     except Exception as e:
         print(f"Error processing URL: {e}")
         return Response(
@@ -285,6 +436,107 @@ async def add_url(url: Annotated[str, fastapi.Form()]) -> Response:
         )
 
 
+async def upload_lines(file: fastapi.UploadFile, chunk_size: int = 64 * 1024) -> AsyncIterator[str]:
+    """Yield the lines of an uploaded UTF-8 text file, reading it in chunks instead of all at once"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while chunk := await file.read(chunk_size):
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+@app.post("/add_urls/")
+async def add_urls(
+    urls: Annotated[Optional[list[str]], fastapi.Form()] = None,
+    file: Optional[fastapi.UploadFile] = None,
+) -> StreamingResponse:
+    """Add many URLs at once, given as form fields or a newline-delimited file, streaming NDJSON results"""
+    candidates = [line.strip() for value in (urls or []) for line in value.splitlines()]
+    if file is not None:
+        candidates += [line.strip() async for line in upload_lines(file)]
+    candidates = [url for url in candidates if url and not url.startswith("#")]
+    valid = [url for url in candidates if url.startswith(('http://', 'https://'))]
+    print(f"Received {len(candidates)} URLs for bulk ingestion")
+
+    async def stream_results():
+        counts = {"added": 0, "unchanged": 0, "error": 0}
+        for url in candidates:
+            if url not in valid:
+                counts["error"] += 1
+                yield json.dumps({"url": url, "status": "error", "chunks": 0,
+                                  "error": "URL must start with http:// or https://"}).encode("utf-8") + b"\n"
+        async for result in rag_service.aadd_web_urls(valid):
+            counts[result["status"]] += 1
+            yield json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n"
+        yield json.dumps({"done": True, "counts": counts}).encode("utf-8") + b"\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.get("/jobs/")
+async def list_jobs(status: Optional[str] = None, limit: int = 50) -> Response:
+    """List recent ingestion jobs, newest first"""
+    return Response(
+        json.dumps({
+            "status": "success",
+            "counts": rag_service.jobs.stats(),
+            "jobs": rag_service.jobs.list_jobs(status=status, limit=limit)
+        }, ensure_ascii=False),
+        media_type="application/json"
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Response:
+    """Get the status and progress of an ingestion job"""
+    job = rag_service.jobs.get(job_id)
+    if job is None:
+        return Response(
+            json.dumps({
+                "status": "error",
+                "message": f"Unknown job: {job_id}"
+            }),
+            media_type="application/json",
+            status_code=404
+        )
+    return Response(
+        json.dumps({
+            "status": "success",
+            "job": job
+        }, ensure_ascii=False),
+        media_type="application/json"
+    )
+
+
+@app.post("/refresh_urls/")
+async def refresh_urls() -> Response:
+    """Revalidate every indexed URL and re-index the pages that changed"""
+    try:
+        counts = await rag_service.arefresh_web_urls()
+        return Response(
+            json.dumps({
+                "status": "success",
+                "results": counts
+            }),
+            media_type="application/json"
+        )
+    except Exception as e:
+        print(f"Error refreshing URLs: {e}")
+        return Response(
+            json.dumps({
+                "status": "error",
+                "message": f"Error refreshing URLs: {str(e)}"
+            }),
+            media_type="application/json",
+            status_code=500
+        )
+
+
 @app.post("/clear_url_cache/")
 async def clear_url_cache() -> Response:
     """Clear the web content cache"""
@@ -313,28 +565,16 @@ async def clear_url_cache() -> Response:
 async def get_urls() -> Response:
     """Get the list of URLs added to the knowledge base"""
     try:
-        # Get all documents from vector store with 'web' type
-        web_docs = []
-        collection_count = rag_service.vector_store.collection.count()
-        print(f"Collection contains {collection_count} total documents")
-        
-        if collection_count > 0:
-            results = rag_service.vector_store.collection.get()
-            print(f"Retrieved {len(results.get('metadatas', []))} documents from collection")
-            
-            for i, metadata in enumerate(results.get('metadatas', [])):
-                # Log the metadata for debugging
-                print(f"Document {i} metadata: {metadata}")
-                
-                if metadata.get('type') == 'web' and 'source' in metadata and 'title' in metadata:
-                    # Check if this URL is already in our list
-                    url = metadata['source']
-                    if not any(doc['url'] == url for doc in web_docs):
-                        web_docs.append({
-                            'url': url,
-                            'title': metadata['title'],
-                            'domain': metadata.get('domain', urlparse(url).netloc)
-                        })
+        # Web sources come from the source registry, one row per URL
+        web_docs = [
+            {
+                'url': source['source'],
+                'title': source['title'],
+                'domain': source['domain'] or urlparse(source['source']).netloc,
+                'chunks': source['chunk_count'],
+            }
+            for source in rag_service.vector_store.registry.list_sources("web")
+        ]
         
         print(f"Found {len(web_docs)} unique web URLs")
         return Response(
@@ -359,72 +599,598 @@ async def get_urls() -> Response:
 
 
 @app.post("/chat/clear")
-async def clear_chat(database: Database = Depends(get_db)) -> Response:
-    """Clear all chat history from the database."""
-    await database.clear_messages()
+async def clear_chat(database: Database = Depends(get_db), session_id: str = Depends(get_session_id)) -> Response:
+    """Clear the chat history of the caller's session."""
+    await database.clear_messages(session_id)
     return Response(status_code=200)
     
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about one token per CJK character and per four other characters."""
+    wide = sum(1 for ch in text if ord(ch) > 0x2E7F)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def transcript(messages: list[ModelMessage]) -> str:
+    """User prompts and model answers of messages as "User: ..." / "Assistant: ..." lines."""
+    lines = []
+    for m in messages:
+        for part in m.parts:
+            if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                lines.append(f"User: {part.content}")
+            elif isinstance(part, TextPart):
+                lines.append(f"Assistant: {part.content}")
+    return "\n".join(lines)
+
+
+class ChatHistory:
+    def __init__(self, max_tokens: int = 3000, summarize: bool = True,
+                 summary_min_tokens: int = 500, summary_batch_tokens: int = 2000):
+        """
+        Token-budgeted conversation history with a rolling summary of older turns.
+
+        Each turn only reads the newest messages that fit in max_tokens, so
+        prompt size and load time stay flat as the conversation grows. Turns
+        that fall out of the window are folded into a summary stored in the
+        database, in the background and a batch at a time, so each summary
+        call sees the previous summary plus only the newly expired turns.
+
+        Args:
+            max_tokens: Estimated token budget of the recent messages sent as history
+            summarize: Keep a rolling summary of the turns outside the window
+            summary_min_tokens: Expired text needed before a summary update is run
+            summary_batch_tokens: Expired text folded into the summary per model call
+        """
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary_min_tokens = summary_min_tokens
+        self.summary_batch_tokens = summary_batch_tokens
+        self._summary_tasks: dict[str, asyncio.Task] = {}
+
+    async def load(self, database: Database, session_id: str) -> list[ModelMessage]:
+        """Message history for the next prompt: the summary, if any, then the recent window."""
+        messages, _ = await database.get_history_window(session_id, self.max_tokens)
+        summary, _ = await database.get_summary(session_id)
+        if summary:
+            messages = [ModelRequest(parts=[SystemPromptPart(content=f"これまでの会話の要約:\n{summary}")]), *messages]
+        return messages
+
+    def schedule_summary(self, database: Database, session_id: str):
+        """Start a background summary update of a session unless one is already running."""
+        task = self._summary_tasks.get(session_id)
+        if not self.summarize or (task and not task.done()):
+            return
+        task = asyncio.create_task(self._update_summary(database, session_id))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+
+    async def _update_summary(self, database: Database, session_id: str):
+        try:
+            _, window_start = await database.get_history_window(session_id, self.max_tokens)
+            if window_start is None:
+                return
+            while True:
+                summary, through = await database.get_summary(session_id)
+                last_seq, messages, tokens = await database.get_messages_between(
+                    session_id, through, window_start, self.summary_batch_tokens
+                )
+                if not messages or tokens < self.summary_min_tokens:
+                    return
+                # Summaries share the generation slots with chat answers
+                async with admission.admit(f"summary:{session_id}"):
+                    result = await summary_agent.run(
+                        f"これまでの要約:\n{summary or '(なし)'}\n\n新しい会話:\n{transcript(messages)}"
+                    )
+                new_summary = "".join(
+                    part.content for m in result.new_messages() if isinstance(m, ModelResponse)
+                    for part in m.parts if isinstance(part, TextPart)
+                ).strip()
+                if not new_summary:
+                    return
+                await database.save_summary(session_id, new_summary, last_seq)
+                print(f"Updated conversation summary of session {session_id} through message {last_seq}")
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+
+
+chat_history = ChatHistory(max_tokens=HISTORY_MAX_TOKENS, summarize=HISTORY_SUMMARY)
+
+
+class AdmissionRejected(Exception):
+    """A generation request refused by the admission controller (sent to the client as 429)."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(eq=False)
+class AdmissionTicket:
+    client_id: str
+    # Set when the ticket joins the queue in AdmissionController.wait
+    enqueued_at: Optional[float] = None
+    granted_at: Optional[float] = None
+    released: bool = False
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 16, max_per_client: int = 2,
+                 queue_timeout: float = 60.0, position_interval: float = 1.0):
+        """
+        Bounds concurrent LLM generations with a FIFO admission queue.
+
+        At most max_in_flight generations run at once; further requests wait
+        in arrival order. A request is rejected immediately when the queue is
+        full, when its client already has max_per_client requests queued or
+        running, or when its estimated wait (from recent generation times)
+        exceeds queue_timeout; a queued request still waiting after
+        queue_timeout is dropped. Runs on the event loop, so no locking.
+
+        Args:
+            max_in_flight: Maximum concurrent generations
+            max_queue: Maximum number of waiting requests
+            max_per_client: Maximum queued plus running requests per client
+            queue_timeout: Longest time a request may wait for a slot, in seconds
+            position_interval: Seconds between queue position updates while waiting
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.max_per_client = max(1, max_per_client)
+        self.queue_timeout = queue_timeout
+        self.position_interval = position_interval
+        self._in_flight = 0
+        self._waiting: collections.deque[AdmissionTicket] = collections.deque()
+        self._per_client: dict[str, int] = {}
+        self._moved = asyncio.Event()
+        self._wait_seconds: collections.deque[float] = collections.deque(maxlen=500)
+        self._generation_seconds: collections.deque[float] = collections.deque(maxlen=100)
+        self._counts = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    def reserve(self, client_id: str) -> AdmissionTicket:
+        """
+        Admit a request of a client, counting it against the client's limit.
+
+        No slot is taken yet: the request can prepare its prompt first and
+        then queue for a slot with wait().
+
+        Raises:
+            AdmissionRejected: The client is over its limit or the queue is too long
+        """
+        if self._per_client.get(client_id, 0) >= self.max_per_client:
+            self._counts["rejected"] += 1
+            raise AdmissionRejected(f"Too many requests in progress for this client (limit {self.max_per_client})")
+        if self._in_flight >= self.max_in_flight:
+            estimated_wait = self._estimated_wait(len(self._waiting) + 1)
+            if len(self._waiting) >= self.max_queue or estimated_wait > self.queue_timeout:
+                self._counts["rejected"] += 1
+                raise AdmissionRejected("The model is busy, please try again shortly",
+                                        retry_after=max(1, int(estimated_wait or self.queue_timeout)))
+        ticket = AdmissionTicket(client_id=client_id)
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+        return ticket
+
+    async def wait(self, ticket: AdmissionTicket) -> AsyncIterator[int]:
+        """
+        Queue the ticket and wait until it is granted a slot, yielding its
+        1-based queue position whenever it changes.
+
+        Raises:
+            AdmissionRejected: The ticket waited longer than queue_timeout
+        """
+        if ticket.enqueued_at is None:
+            ticket.enqueued_at = time.monotonic()
+            self._waiting.append(ticket)
+            self._grant()
+        last_position = None
+        while ticket.granted_at is None:
+            # Capture the event before checking, so a release in between is not missed
+            moved = self._moved
+            waited = time.monotonic() - ticket.enqueued_at
+            if waited > self.queue_timeout:
+                self._counts["timed_out"] += 1
+                self.release(ticket)
+                raise AdmissionRejected(f"Timed out after waiting {waited:.0f}s for the model")
+            position = self._waiting.index(ticket) + 1
+            if position != last_position:
+                last_position = position
+                yield position
+            try:
+                await asyncio.wait_for(moved.wait(), timeout=self.position_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @asynccontextmanager
+    async def admit(self, client_id: str) -> AsyncIterator[None]:
+        """Hold a generation slot for the duration of the block (for calls without a client stream)."""
+        ticket = self.reserve(client_id)
+        try:
+            async for _ in self.wait(ticket):
+                pass
+            yield
+        finally:
+            self.release(ticket)
+
+    def release(self, ticket: AdmissionTicket):
+        """Give back the slot or queue place of a ticket; safe to call more than once."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted_at is None:
+            if ticket.enqueued_at is not None:
+                self._waiting.remove(ticket)
+        else:
+            self._in_flight -= 1
+            self._generation_seconds.append(time.monotonic() - ticket.granted_at)
+        remaining = self._per_client.get(ticket.client_id, 1) - 1
+        if remaining > 0:
+            self._per_client[ticket.client_id] = remaining
+        else:
+            self._per_client.pop(ticket.client_id, None)
+        self._grant()
+        # Wake every waiter to re-check its position; later waits use a fresh event
+        self._moved.set()
+        self._moved = asyncio.Event()
+
+    def _grant(self):
+        while self._waiting and self._in_flight < self.max_in_flight:
+            ticket = self._waiting.popleft()
+            ticket.granted_at = time.monotonic()
+            self._in_flight += 1
+            self._counts["admitted"] += 1
+            self._wait_seconds.append(ticket.granted_at - ticket.enqueued_at)
+
+    def _estimated_wait(self, position: int) -> float:
+        if not self._generation_seconds:
+            return 0.0
+        average = sum(self._generation_seconds) / len(self._generation_seconds)
+        return position * average / self.max_in_flight
+
+    def stats(self) -> dict[str, Any]:
+        """Current load, totals and recent queue wait times (seconds)."""
+        waits = sorted(self._wait_seconds)
+        generations = self._generation_seconds
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiting),
+            "max_queue": self.max_queue,
+            "oldest_wait_seconds": round(time.monotonic() - self._waiting[0].enqueued_at, 3) if self._waiting else 0.0,
+            **self._counts,
+            "wait_seconds": {
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+            "generation_seconds_avg": round(sum(generations) / len(generations), 3) if generations else 0.0,
+        }
+
+
+admission = AdmissionController(max_in_flight=MAX_GENERATIONS, max_queue=MAX_QUEUE,
+                                max_per_client=MAX_PER_CLIENT, queue_timeout=QUEUE_TIMEOUT_SECONDS)
+
+
 P = ParamSpec("P")
 R = TypeVar("R")
 
 
+def render_chat_json(messages: list[ModelMessage]) -> str:
+    """The messages that can be shown in the chat, as the NDJSON lines sent by GET /chat/."""
+    lines = []
+    for m in messages:
+        try:
+            lines.append(json.dumps(to_chat_message(m)))
+        except Exception:
+            # Skip any message that cannot be parsed/displayed as chat
+            continue
+    return "\n".join(lines)
+
+
+def _migrate_to_sessions(cur: sqlite3.Cursor):
+    """Version 1: per-session messages ordered by seq; the old global history moves to session "legacy"."""
+    cur.execute(
+        "CREATE TABLE sessions (id TEXT PRIMARY KEY, created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+    )
+    cur.execute(
+        "CREATE TABLE session_messages ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE, "
+        "seq INTEGER NOT NULL, message_list TEXT NOT NULL, tokens INTEGER NOT NULL, created_at REAL NOT NULL);"
+    )
+    cur.execute("CREATE UNIQUE INDEX session_messages_seq ON session_messages (session_id, seq);")
+    cur.execute(
+        "CREATE TABLE session_summaries ("
+        "session_id TEXT PRIMARY KEY REFERENCES sessions (id) ON DELETE CASCADE, "
+        "summary TEXT NOT NULL, through_seq INTEGER NOT NULL);"
+    )
+    tables = {row[0] for row in cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "messages" in tables:
+        now = time.time()
+        rows = cur.execute("SELECT message_list FROM messages ORDER BY rowid").fetchall()
+        if rows:
+            cur.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?);",
+                        (LEGACY_SESSION_ID, now, now))
+            cur.executemany(
+                "INSERT INTO session_messages (session_id, seq, message_list, tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?);",
+                [
+                    (LEGACY_SESSION_ID, seq, message_list,
+                     estimate_tokens(transcript(ModelMessagesTypeAdapter.validate_json(message_list))), now)
+                    for seq, (message_list,) in enumerate(rows, start=1)
+                ],
+            )
+        cur.execute("DROP TABLE messages;")
+    if "history_summary" in tables:
+        cur.execute("DROP TABLE history_summary;")
+
+
+def _add_chat_json(cur: sqlite3.Cursor):
+    """Version 2: pre-rendered chat JSON per row, so loading the chat needs no pydantic round trip."""
+    cur.execute("ALTER TABLE session_messages ADD COLUMN chat_json TEXT NOT NULL DEFAULT '';")
+    rows = cur.execute("SELECT id, message_list FROM session_messages").fetchall()
+    cur.executemany(
+        "UPDATE session_messages SET chat_json = ? WHERE id = ?;",
+        [(render_chat_json(ModelMessagesTypeAdapter.validate_json(message_list)), row_id)
+         for row_id, message_list in rows],
+    )
+
+
+# Schema migrations; PRAGMA user_version records how many have been applied
+MIGRATIONS: list[Callable[[sqlite3.Cursor], None]] = [_migrate_to_sessions, _add_chat_json]
+# Session that keeps the single global history of databases created before sessions existed,
+# unless RAG_LEGACY_HISTORY_SESSION names a session to move it to (Database.claim_legacy_history)
+LEGACY_SESSION_ID = "legacy"
+
+
 @dataclass
 class Database:
+    """
+    Chat storage: sessions and their messages, ordered by a per-session seq.
+
+    The file is in WAL mode. All writes go through one connection on a
+    single thread; reads use a small pool of connections on their own
+    threads, so one user's history load never waits behind another's write.
+    """
 
     con: sqlite3.Connection
     _loop: asyncio.AbstractEventLoop
     _executor: ThreadPoolExecutor
+    _readers: queue.Queue
+    _read_executor: ThreadPoolExecutor
     
     @classmethod
     @asynccontextmanager
     async def connect(
-        cls, file: Path = THIS_DIR / ".chat_app_messages.sqlite"
+        cls, file: Path = THIS_DIR / ".chat_app_messages.sqlite", readers: int = 4,
+        legacy_history_session: str = ""
     ) -> AsyncIterator[Database]:
         with logfire.span("connect to DB"):
             loop = asyncio.get_event_loop()
             executor = ThreadPoolExecutor(max_workers=1)
             con = await loop.run_in_executor(executor, cls._connect, file)
-            slf = cls(con, loop, executor)
+            reader_pool: queue.Queue = queue.Queue()
+            for _ in range(readers):
+                reader_pool.put(await loop.run_in_executor(executor, cls._connect_reader, file))
+            slf = cls(con, loop, executor, reader_pool, ThreadPoolExecutor(max_workers=readers))
+            await slf._asyncify(slf.claim_legacy_history, legacy_history_session)
         try:
             yield slf
         finally:
+            while not reader_pool.empty():
+                reader_pool.get().close()
+            slf._read_executor.shutdown()
             await slf._asyncify(con.close)
 
     @staticmethod
     def _connect(file: Path) -> sqlite3.Connection:
-        con = sqlite3.connect(str(file))
+        con = sqlite3.connect(str(file), check_same_thread=False)
         con = logfire.instrument_sqlite3(con)
         cur = con.cursor()
-        cur.execute(
-            "CREATE TABLE IF NOT EXISTS messages (id INT PRIMARY KEY, message_list TEXT);"
-        )
+        cur.execute("PRAGMA journal_mode=WAL;")
+        cur.execute("PRAGMA foreign_keys=ON;")
+        version = cur.execute("PRAGMA user_version;").fetchone()[0]
+        for target, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+            with con:
+                cur.execute("BEGIN;")
+                migrate(cur)
+                cur.execute(f"PRAGMA user_version = {target};")
+            print(f"Migrated chat database {file} to schema version {target}")
         con.commit()
         return con
+
+    @staticmethod
+    def _connect_reader(file: Path) -> sqlite3.Connection:
+        con = sqlite3.connect(f"file:{file}?mode=ro", uri=True, check_same_thread=False)
+        return logfire.instrument_sqlite3(con)
         
-    async def add_messages(self, messages: bytes):
+    def _has_session(self, session_id: str) -> bool:
+        return self._execute("SELECT 1 FROM sessions WHERE id = ?;", session_id).fetchone() is not None
+
+    def claim_legacy_history(self, session_id: str):
+        """
+        Move the history migrated from the single-user schema to session_id.
+
+        Before sessions existed everybody shared one history; the migration
+        parks it under LEGACY_SESSION_ID, which no cookie maps to, so on a
+        shared deployment nobody sees another user's old chats. The operator
+        opts in to taking it over by naming their own session in
+        RAG_LEGACY_HISTORY_SESSION. A session that already has messages of
+        its own is not given it.
+        """
+        with self.con:
+            if not self._has_session(LEGACY_SESSION_ID):
+                return
+            if not session_id or session_id == LEGACY_SESSION_ID:
+                print(f"Chat history from before sessions is kept in session {LEGACY_SESSION_ID!r}; "
+                      "set RAG_LEGACY_HISTORY_SESSION to a chat_session cookie to move it there")
+                return
+            if self.con.execute("SELECT 1 FROM session_messages WHERE session_id = ? LIMIT 1;", (session_id,)).fetchone():
+                print(f"Legacy chat history not moved: session {session_id} already has messages")
+                return
+            now = time.time()
+            self.con.execute(
+                "INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at;",
+                (session_id, now, now),
+            )
+            self.con.execute("UPDATE session_messages SET session_id = ? WHERE session_id = ?;",
+                             (session_id, LEGACY_SESSION_ID))
+            self.con.execute("UPDATE session_summaries SET session_id = ? WHERE session_id = ?;",
+                             (session_id, LEGACY_SESSION_ID))
+            self.con.execute("DELETE FROM sessions WHERE id = ?;", (LEGACY_SESSION_ID,))
+        print(f"Legacy chat history moved to session {session_id}")
+
+    async def add_messages(self, session_id: str, messages: bytes):
+        """Append a serialized message list to a session's history."""
+        parsed = ModelMessagesTypeAdapter.validate_json(messages)
+        tokens = estimate_tokens(transcript(parsed))
+        await self._asyncify(self._insert_messages, session_id, messages, tokens, render_chat_json(parsed))
+
+    def _insert_messages(self, session_id: str, messages: bytes, tokens: int, chat_json: str):
+        now = time.time()
+        with self.con:
+            self.con.execute(
+                "INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at;",
+                (session_id, now, now),
+            )
+            # The single writer thread makes MAX(seq) + 1 race-free
+            self.con.execute(
+                "INSERT INTO session_messages (session_id, seq, message_list, tokens, chat_json, created_at) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?, ? FROM session_messages WHERE session_id = ?;",
+                (session_id, messages, tokens, chat_json, now, session_id),
+            )
+
+    async def iter_chat_page(self, session_id: str, before: Optional[int], limit: int,
+                             batch_size: int = 64) -> AsyncIterator[str]:
+        """
+        Yield the chat JSON lines of the newest `limit` rows older than seq `before`, oldest first.
+
+        Rows are read in batches by seq range on the reader pool, so memory
+        and time depend on the page size, not the length of the history. The
+        last line describes the page: {"page": {"before", "has_more"}}.
+
+        Args:
+            session_id: Session whose history is read
+            before: Only rows with a smaller seq; None for the newest page
+            limit: Number of rows in the page
+            batch_size: Rows fetched per query
+        """
+        before = before if before is not None else sys.maxsize
+        start, has_more = await self._read_with(self._page_start, session_id, before, limit)
+        if start is not None:
+            seq = start
+            while True:
+                rows = await self._read(
+                    "SELECT seq, chat_json FROM session_messages "
+                    "WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq LIMIT ?",
+                    session_id, seq, before, batch_size,
+                )
+                for _, chat_json in rows:
+                    if chat_json:
+                        yield chat_json
+                if len(rows) < batch_size:
+                    break
+                seq = rows[-1][0] + 1
+        yield json.dumps({"page": {"before": start, "has_more": has_more}})
+
+    @staticmethod
+    def _page_start(con: sqlite3.Connection, session_id: str, before: int, limit: int) -> tuple[Optional[int], bool]:
+        # Walk the (session_id, seq) index back `limit` rows from the cursor
+        row = con.execute(
+            "SELECT MIN(seq) FROM (SELECT seq FROM session_messages WHERE session_id = ? AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?)",
+            (session_id, before, limit),
+        ).fetchone()
+        start = row[0] if row else None
+        if start is None:
+            return None, False
+        older = con.execute(
+            "SELECT 1 FROM session_messages WHERE session_id = ? AND seq < ? LIMIT 1", (session_id, start)
+        ).fetchone()
+        return start, older is not None
+
+    async def get_history_window(self, session_id: str, max_tokens: int) -> tuple[list[ModelMessage], Optional[int]]:
+        """
+        Newest messages of a session within an estimated token budget, oldest first.
+
+        Rows are read newest first and reading stops at the budget, so the
+        cost does not depend on the length of the conversation. The window
+        always starts with a user request.
+
+        Returns:
+            (messages, seq of the first row in the window or None if empty)
+        """
+        return await self._read_with(self._read_window, session_id, max_tokens)
+
+    @staticmethod
+    def _read_window(con: sqlite3.Connection, session_id: str,
+                     max_tokens: int) -> tuple[list[ModelMessage], Optional[int]]:
+        rows = []
+        total = 0
+        for seq, message_list, tokens in con.execute(
+            "SELECT seq, message_list, tokens FROM session_messages WHERE session_id = ? ORDER BY seq DESC",
+            (session_id,),
+        ):
+            if rows and total + tokens > max_tokens:
+                break
+            total += tokens
+            rows.append((seq, ModelMessagesTypeAdapter.validate_json(message_list)))
+        rows.reverse()
+        # A window starting with a model response would have lost its question
+        while rows and not isinstance(rows[0][1][0], ModelRequest):
+            rows.pop(0)
+        messages = [m for _, row_messages in rows for m in row_messages]
+        return messages, rows[0][0] if rows else None
+
+    async def get_summary(self, session_id: str) -> tuple[Optional[str], int]:
+        """The rolling summary of a session and the last message seq it covers (0 if none)."""
+        rows = await self._read(
+            "SELECT summary, through_seq FROM session_summaries WHERE session_id = ?", session_id
+        )
+        return (rows[0][0], rows[0][1]) if rows else (None, 0)
+
+    async def save_summary(self, session_id: str, summary: str, through_seq: int):
         await self._asyncify(
             self._execute,
-            "INSERT INTO messages (message_list) VALUES (?);",
-            messages,
+            "INSERT OR REPLACE INTO session_summaries (session_id, summary, through_seq) VALUES (?, ?, ?);",
+            session_id,
+            summary,
+            through_seq,
             commit=True,
         )
-        await self._asyncify(self.con.commit)
 
-    async def get_messages(self) -> list[ModelMessage]:
-        c = await self._asyncify(
-            self._execute, "SELECT message_list FROM messages order by id"
-        )
-        rows = await self._asyncify(c.fetchall)
+    async def get_messages_between(self, session_id: str, after_seq: int, before_seq: int,
+                                   max_tokens: int) -> tuple[int, list[ModelMessage], int]:
+        """
+        Messages of rows after after_seq and before before_seq, oldest first, up to max_tokens.
+
+        Returns:
+            (seq of the last row read, messages, their estimated tokens)
+        """
+        return await self._read_with(self._read_between, session_id, after_seq, before_seq, max_tokens)
+
+    @staticmethod
+    def _read_between(con: sqlite3.Connection, session_id: str, after_seq: int, before_seq: int,
+                      max_tokens: int) -> tuple[int, list[ModelMessage], int]:
+        last_seq = after_seq
         messages: list[ModelMessage] = []
-        for row in rows:
-            messages.extend(ModelMessagesTypeAdapter.validate_json(row[0]))
-        return messages
+        total = 0
+        for seq, message_list, tokens in con.execute(
+            "SELECT seq, message_list, tokens FROM session_messages "
+            "WHERE session_id = ? AND seq > ? AND seq < ? ORDER BY seq",
+            (session_id, after_seq, before_seq),
+        ):
+            if messages and total + tokens > max_tokens:
+                break
+            total += tokens
+            messages.extend(ModelMessagesTypeAdapter.validate_json(message_list))
+            last_seq = seq
+        return last_seq, messages, total
 
-    async def clear_messages(self) -> None:
-        """Delete all messages from the database."""
+    async def clear_messages(self, session_id: str) -> None:
+        """Delete all messages (and the summary) of a session."""
         await self._asyncify(
-            self._execute, "DELETE FROM messages;", commit=True
+            self._execute, "DELETE FROM sessions WHERE id = ?;", session_id, commit=True
         )
 
     def _execute(
@@ -446,6 +1212,20 @@ class Database:
             partial(func, **kwargs),
             *args,
         )
+
+    async def _read(self, sql: LiteralString, *args: Any) -> list[tuple]:
+        """Run a query on a pooled reader connection and fetch all rows."""
+        return await self._read_with(lambda con: con.execute(sql, args).fetchall())
+
+    async def _read_with(self, func: Callable[..., R], *args: Any) -> R:
+        """Call func(connection, *args) on a pooled reader connection in the read executor."""
+        def run() -> R:
+            con = self._readers.get()
+            try:
+                return func(con, *args)
+            finally:
+                self._readers.put(con)
+        return await self._loop.run_in_executor(self._read_executor, run)
     
 
 if __name__ == "__main__":
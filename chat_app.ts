@@ -10,9 +10,10 @@ const urlInput = document.getElementById('url-input') as HTMLInputElement
 const urlStatus = document.getElementById('url-status') as HTMLDivElement
 
 // stream the response and render messages as each chunk is received
-// data is sent as newline-delimited JSON
+// data is sent as newline-delimited JSON; only complete lines are parsed, and
+// the partial line at the end of a chunk is kept until the rest arrives
 async function onFetchResponse(response: Response): Promise<void> {
-  let text = ''
+  let buffer = ''
   let decoder = new TextDecoder()
   if (response.ok) {
     const reader = response.body.getReader()
@@ -21,11 +22,24 @@ async function onFetchResponse(response: Response): Promise<void> {
       if (done) {
         break
       }
-      text += decoder.decode(value)
-      addMessages(text)
+      buffer += decoder.decode(value, {stream: true})
+      const newline = buffer.lastIndexOf('\n')
+      if (newline >= 0) {
+        addMessages(buffer.slice(0, newline))
+        buffer = buffer.slice(newline + 1)
+      }
       spinner.classList.remove('active')
     }
-    addMessages(text)
+    addMessages(buffer + decoder.decode())
+    renderMessages()
+    setQueueStatus(null)
+    promptInput.disabled = false
+    promptInput.focus()
+  } else if (response.status === 429) {
+    // The server is busy: say so instead of failing, and let the user retry
+    const data = await response.json().catch(() => ({}))
+    spinner.classList.remove('active')
+    setQueueStatus(`⚠ ${data.message || 'The model is busy, please try again shortly'}`)
     promptInput.disabled = false
     promptInput.focus()
   } else {
@@ -36,13 +50,23 @@ async function onFetchResponse(response: Response): Promise<void> {
 }
 
 // The format of messages, this matches pydantic-ai both for brevity and understanding
-// in production, you might not want to keep this format all the way to the frontend
+// in production, you might not want to keep this format all the way to the frontend.
+// Delta-streamed answers instead send {id, role, timestamp, delta} lines that append to message `id`
 interface Message {
+  id?: string
   role: string
-  content: string
+  content?: string
+  delta?: string
+  done?: boolean
   timestamp: string
 }
 
+// Last line of a GET /chat/ page: cursor of the next older page
+interface HistoryPage {
+  before: number | null
+  has_more: boolean
+}
+
 // Helper function to scroll conversation to bottom
 function scrollConversationToBottom(delay = 0) {
   setTimeout(() => {
@@ -52,13 +76,17 @@ function scrollConversationToBottom(delay = 0) {
   }, delay);
 }
 
-// take raw response text and render messages into the `#conversation` element
-// Message timestamp is assumed to be a unique identifier of a message, and is used to deduplicate
+// Text of every message by element id, and the ids changed since the last render
+const messageContents = new Map<string, string>()
+const dirtyMessages = new Set<string>()
+let renderScheduled = false
+
+// take complete lines of response text and apply them to the messages in the `#conversation` element
+// Message timestamp (or id for delta-streamed answers) is assumed to be a unique identifier of a message,
 // hence you can send data about the same message multiple times, and it will be updated
-// instead of creating a new message elements
+// instead of creating a new message elements. Rendering happens at most once per animation frame.
 function addMessages(responseText: string) {
-  const lines = responseText.split('\n')
-  const messages: Message[] = lines.filter(line => line.length > 1).map(j => JSON.parse(j))
+  const messages = parseLines(responseText)
   
   // Clear the 'Ask me anything...' message if we have messages to display
   if (messages.length > 0) {
@@ -66,27 +94,147 @@ function addMessages(responseText: string) {
     if (welcomeMsg) {
       welcomeMsg.remove()
     }
+    
+    // Remove any client-side added messages from previous submissions 
+    // (they'll be replaced by server-sent ones)
+    const clientSideMessages = convElement.querySelectorAll('[data-client-side="true"]');
+    clientSideMessages.forEach(msg => msg.remove());
   }
   
-  // Remove any client-side added messages from previous submissions 
-  // (they'll be replaced by server-sent ones)
-  const clientSideMessages = convElement.querySelectorAll('[data-client-side="true"]');
-  clientSideMessages.forEach(msg => msg.remove());
-  
   for (const message of messages) {
-    // we use the timestamp as a crude element id
-    const {timestamp, role, content} = message
-    const id = `msg-${timestamp}`
-    let msgDiv = document.getElementById(id)
-    if (!msgDiv) {
-      msgDiv = document.createElement('div')
-      msgDiv.id = id
-      msgDiv.title = `${role} at ${timestamp}`
-      msgDiv.classList.add('border-top', 'pt-2', role)
-      convElement.appendChild(msgDiv)
+    const id = `msg-${message.id ?? message.timestamp}`
+    if (!document.getElementById(id)) {
+      convElement.appendChild(createMessageDiv(id, message))
+    }
+    if (message.delta !== undefined) {
+      messageContents.set(id, (messageContents.get(id) ?? '') + message.delta)
+    } else {
+      messageContents.set(id, message.content)
+    }
+    dirtyMessages.add(id)
+  }
+  if (dirtyMessages.size > 0 && !renderScheduled) {
+    renderScheduled = true
+    requestAnimationFrame(renderMessages)
+  }
+}
+
+// parse complete NDJSON lines into messages, handing the history page line to the "load older" button
+function parseLines(responseText: string): Message[] {
+  const messages: Message[] = []
+  for (const line of responseText.split('\n')) {
+    if (line.length <= 1) {
+      continue
+    }
+    const data = JSON.parse(line)
+    if (data.page) {
+      updateLoadOlder(data.page as HistoryPage)
+    } else if (data.queue) {
+      setQueueStatus(`Waiting for the model... (position ${data.queue.position} in queue)`)
+    } else if (data.error) {
+      setQueueStatus(`⚠ ${data.error}`)
+    } else {
+      setQueueStatus(null)
+      messages.push(data as Message)
+    }
+  }
+  return messages
+}
+
+// show (or with null, remove) a status line under the conversation, e.g. the queue position
+function setQueueStatus(text: string | null) {
+  let status = document.getElementById('queue-status')
+  if (text === null) {
+    if (status && !status.textContent.startsWith('⚠')) {
+      status.remove()
+    }
+    return
+  }
+  if (!status) {
+    status = document.createElement('div')
+    status.id = 'queue-status'
+    status.classList.add('text-muted', 'small', 'py-2')
+    convElement.appendChild(status)
+  }
+  status.textContent = text
+}
+
+function createMessageDiv(id: string, message: Message): HTMLElement {
+  const msgDiv = document.createElement('div')
+  msgDiv.id = id
+  msgDiv.title = `${message.role} at ${message.timestamp}`
+  msgDiv.classList.add('border-top', 'pt-2', message.role)
+  return msgDiv
+}
+
+// Cursor of the next older page of history, or null when everything is loaded
+let olderCursor: number | null = null
+
+// show a "load older messages" button above the conversation while older history exists
+function updateLoadOlder(page: HistoryPage) {
+  olderCursor = page.has_more ? page.before : null
+  let button = document.getElementById('load-older') as HTMLButtonElement
+  if (olderCursor === null) {
+    button?.remove()
+    return
+  }
+  if (!button) {
+    button = document.createElement('button')
+    button.id = 'load-older'
+    button.classList.add('btn', 'btn-sm', 'btn-link', 'w-100')
+    button.textContent = 'Load older messages'
+    button.dataset.older = 'true'
+    button.addEventListener('click', () => loadOlderMessages().catch(onError))
+    convElement.prepend(button)
+  }
+}
+
+// fetch the page of history before the oldest shown message and insert it at the top,
+// keeping the visible messages in place
+async function loadOlderMessages(): Promise<void> {
+  if (olderCursor === null) {
+    return
+  }
+  const response = await fetch(`/chat/?before=${olderCursor}`)
+  if (!response.ok) {
+    throw new Error(`Unexpected response: ${response.status}`)
+  }
+  const messages = parseLines(await response.text())
+  const fragment = document.createDocumentFragment()
+  for (const message of messages) {
+    const id = `msg-${message.id ?? message.timestamp}`
+    if (document.getElementById(id)) {
+      continue
+    }
+    const msgDiv = createMessageDiv(id, message)
+    msgDiv.dataset.older = 'true'
+    messageContents.set(id, message.content ?? '')
+    msgDiv.innerHTML = marked.parse(message.content ?? '')
+    fragment.appendChild(msgDiv)
+  }
+  const previousHeight = convElement.scrollHeight
+  const button = document.getElementById('load-older')
+  if (button) {
+    button.after(fragment)
+  } else {
+    convElement.prepend(fragment)
+  }
+  convElement.scrollTop += convElement.scrollHeight - previousHeight
+}
+
+// render the markdown of messages that changed since the last frame
+function renderMessages() {
+  renderScheduled = false
+  if (dirtyMessages.size === 0) {
+    return
+  }
+  for (const id of dirtyMessages) {
+    const msgDiv = document.getElementById(id)
+    if (msgDiv) {
+      msgDiv.innerHTML = marked.parse(messageContents.get(id) ?? '')
     }
-    msgDiv.innerHTML = marked.parse(content)
   }
+  dirtyMessages.clear()
   // Scroll the conversation container to the bottom to show the latest message
   scrollConversationToBottom(0);
 }
@@ -100,11 +248,14 @@ function onError(error: any) {
 async function onSubmit(e: SubmitEvent): Promise<void> {
   e.preventDefault();
   spinner.classList.add('active');
+  document.getElementById('queue-status')?.remove();
   const body = new FormData(e.target as HTMLFormElement);
   
   // Make sure the useRag checkbox value is properly set in the form data
   // FormData.set will ensure the correct value is sent
   body.set('use_rag', useRagCheckbox.checked ? 'true' : 'false');
+  // Receive the answer as append-only deltas instead of the full text on every line
+  body.set('stream', 'delta');
 
   // First create a user message div to immediately show what the user submitted
   // We'll add a temporary attribute to identify this as a client-side message
@@ -140,6 +291,9 @@ async function clearConversation(): Promise<void> {
       const response = await fetch('/chat/clear', {method: 'POST'})
       if (response.ok) {
         // Clear the conversation display and restore welcome message
+        messageContents.clear()
+        dirtyMessages.clear()
+        olderCursor = null
         convElement.innerHTML = `
           <div class="text-center py-5">
             <div class="bg-primary rounded-circle d-inline-flex justify-content-center align-items-center mb-3" style="width: 60px; height: 60px;">
@@ -227,13 +381,16 @@ async function handleUrlSubmit(e: SubmitEvent): Promise<void> {
     }
     
     if (response.ok) {
-      // Show success message
-      urlStatus.innerHTML = `✓ ${result.message}`;
-      urlStatus.className = 'small mt-2 text-success';
-      
       // Clear input field
       urlInput.value = '';
       
+      // The URL is ingested in the background; follow the job until it finishes
+      const message = result.job_id ? await waitForJob(result.job_id) : result.message;
+      
+      // Show success message
+      urlStatus.innerHTML = `✓ ${message}`;
+      urlStatus.className = 'small mt-2 text-success';
+      
       // Refresh the URL list
       fetchURLs().catch(e => console.error('Error refreshing URLs after add:', e));
     } else {
@@ -257,6 +414,27 @@ async function handleUrlSubmit(e: SubmitEvent): Promise<void> {
   }
 }
 
+// Poll an ingestion job, showing its progress, until it succeeds or fails
+async function waitForJob(jobId: string): Promise<string> {
+  while (true) {
+    const response = await fetch(`/jobs/${jobId}`);
+    const data = await response.json();
+    if (!response.ok) {
+      throw new Error(data.message || `Server error: ${response.status}`);
+    }
+    const job = data.job;
+    if (job.status === 'succeeded') {
+      const title = job.result && job.result.title ? job.result.title : job.payload.url;
+      return `Added ${title} to knowledge base`;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Ingestion failed');
+    }
+    urlStatus.innerHTML = `${job.status === 'queued' ? 'Queued' : 'Processing'}: ${job.message || ''} (${Math.round(job.progress * 100)}%)`;
+    await new Promise(resolve => setTimeout(resolve, 1000));
+  }
+}
+
 // call onSubmit when the form is submitted (e.g. user clicks the send button or hits Enter)
 document.querySelector('form[method="post"]').addEventListener('submit', (e) => onSubmit(e).catch(onError))
 
@@ -384,9 +562,10 @@ async function fetchURLs(): Promise<void> {
 
 // Set up a MutationObserver to automatically scroll when new content is added
 const conversationObserver = new MutationObserver((mutations) => {
-  // Only scroll if content was added (not just attributes changed)
+  // Only scroll if content was added (not just attributes changed), and not for older history inserted above
   const contentAdded = mutations.some(mutation => 
-    mutation.type === 'childList' && mutation.addedNodes.length > 0
+    mutation.type === 'childList' &&
+    Array.from(mutation.addedNodes).some(node => !(node instanceof HTMLElement && node.dataset.older === 'true'))
   );
   
   if (contentAdded) {
@@ -0,0 +1,75 @@
+"""
+A/B comparison of the Chroma (HNSW) and NumPy (exact) vector store backends.
+
+Copies the chunks and stored embeddings of a Chroma collection into a NumPy
+store (once), then runs the same queries against both and reports latency
+and top-k overlap.
+
+Usage: python compare_vector_backends.py [collection_name] [db_dir] [queries_file]
+"""
+import sys
+import time
+import numpy as np
+from rag_utils.vector_store import VectorStore
+from rag_utils.numpy_store import NumpyVectorStore
+
+collection_name = sys.argv[1] if len(sys.argv) > 1 else "documents"
+db_dir = sys.argv[2] if len(sys.argv) > 2 else "./chroma_db"
+top_k = 10
+
+if len(sys.argv) > 3:
+    with open(sys.argv[3], 'r') as f:
+        queries = [line.strip() for line in f if line.strip()]
+else:
+    queries = [
+        "What is retrieval augmented generation?",
+        "How are documents split into chunks?",
+        "ベクトル検索の仕組み",
+        "embedding model",
+        "system requirements",
+    ]
+
+chroma_store = VectorStore(collection_name=collection_name, data_dir=db_dir)
+numpy_store = NumpyVectorStore(collection_name=collection_name, data_dir=db_dir)
+
+if numpy_store.count() == 0 and chroma_store.count() > 0:
+    print(f"Copying {chroma_store.count()} chunks into the NumPy store...")
+    offset = 0
+    while True:
+        page = chroma_store.collection.get(include=["documents", "metadatas", "embeddings"], limit=5000, offset=offset)
+        if not page["ids"]:
+            break
+        numpy_store._upsert(page["ids"], list(page["embeddings"]), page["documents"], page["metadatas"])
+        numpy_store.bm25.add(page["ids"], page["documents"])
+        offset += len(page["ids"])
+    numpy_store.bm25.save()
+
+print(f"Chroma: {chroma_store.count()} chunks, NumPy: {numpy_store.count()} chunks")
+
+# Embed once up front so only the search itself is timed
+embeddings = chroma_store.query_cache.get_many(queries)
+
+timings = {"chroma": [], "numpy": []}
+overlaps = []
+for query, embedding in zip(queries, embeddings):
+    start = time.perf_counter()
+    chroma_hits = chroma_store._search([embedding], top_k)[0]
+    timings["chroma"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    numpy_hits = numpy_store._search([embedding], top_k)[0]
+    timings["numpy"].append(time.perf_counter() - start)
+
+    chroma_ids = [hit[0] for hit in chroma_hits]
+    numpy_ids = [hit[0] for hit in numpy_hits]
+    overlap = len(set(chroma_ids) & set(numpy_ids)) / max(1, len(numpy_ids))
+    overlaps.append(overlap)
+    print(f"\nQuery: {query}")
+    print(f"  top-{top_k} overlap: {overlap:.2f}")
+    print(f"  chroma: {timings['chroma'][-1] * 1000:.2f} ms, numpy: {timings['numpy'][-1] * 1000:.2f} ms")
+
+print("\nSummary")
+for name, values in timings.items():
+    values_ms = np.array(values) * 1000
+    print(f"  {name}: mean {values_ms.mean():.2f} ms, p95 {np.percentile(values_ms, 95):.2f} ms")
+print(f"  mean top-{top_k} overlap (recall of HNSW against exact search): {np.mean(overlaps):.3f}")
@@ -0,0 +1,152 @@
+from typing import Dict, List, Optional, Union, AsyncIterator
+import asyncio
+import random
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+import httpx
+
+
+# Status codes worth retrying: rate limiting and transient server/gateway failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _LoopState:
+    """Client and semaphores bound to one event loop."""
+
+    def __init__(self, client: httpx.AsyncClient, max_concurrency: int):
+        self.client = client
+        self.global_limit = asyncio.Semaphore(max_concurrency)
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+class AsyncFetcher:
+    def __init__(self, max_concurrency: int = 32, per_host: int = 4, timeout: float = 10.0,
+                 connect_timeout: float = 5.0, retries: int = 2, backoff: float = 0.5, max_backoff: float = 8.0,
+                 headers: Optional[Dict[str, str]] = None):
+        """
+        Concurrent HTTP fetcher sharing one pooled connection per host across requests.
+
+        Requests are limited globally and per host, time out on connect and
+        read, and are retried with exponential backoff and jitter on network
+        errors and on 429/5xx responses (honouring a numeric Retry-After).
+
+        Args:
+            max_concurrency: Maximum requests in flight overall
+            per_host: Maximum requests in flight to a single host
+            timeout: Read/write/pool timeout in seconds
+            connect_timeout: Connection timeout in seconds
+            retries: Retries after the first attempt
+            backoff: Base delay of the exponential backoff in seconds
+            max_backoff: Upper bound of a single backoff delay in seconds
+            headers: Default request headers
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host = max(1, per_host)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.headers = dict(headers or {})
+        # asyncio primitives and httpx clients belong to the loop that created them
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+            state = _LoopState(client, self.max_concurrency)
+            self._states[loop] = state
+        return state
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+        return random.uniform(delay / 2, delay)
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        Fetch a URL, retrying transient failures.
+
+        Args:
+            url: URL to fetch
+            headers: Extra headers for this request
+
+        Returns:
+            The final response with its body read: a 2xx, or 304 for a conditional request
+
+        Raises:
+            httpx.HTTPError: If the request still fails after all retries
+        """
+        async with self.stream(url, headers=headers) as response:
+            await response.aread()
+            return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[httpx.Response]:
+        """
+        Open a URL for streaming, retrying transient failures before any body is read.
+
+        The concurrency slots are held until the context exits, since the
+        connection is busy while the body streams.
+
+        Args:
+            url: URL to fetch
+            headers: Extra headers for this request
+
+        Yields:
+            The response with its body unread: a 2xx, or 304 for a conditional request
+
+        Raises:
+            httpx.HTTPError: If the request still fails after all retries
+        """
+        state = self._state()
+        host = urlparse(url).netloc
+        host_limit = state.host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        for attempt in range(self.retries + 1):
+            response = None
+            async with state.global_limit, host_limit:
+                try:
+                    response = await state.client.send(state.client.build_request("GET", url, headers=headers), stream=True)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    if attempt == self.retries:
+                        raise
+                    print(f"Retrying {url} after error: {e}")
+                else:
+                    try:
+                        if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                            # 304 answers a conditional request; the caller handles it
+                            if response.status_code != 304:
+                                response.raise_for_status()
+                            yield response
+                            return
+                        print(f"Retrying {url} after HTTP {response.status_code}")
+                    finally:
+                        await response.aclose()
+            # Sleep outside the semaphores so other requests can use the slot
+            await asyncio.sleep(self._retry_delay(attempt, response))
+        raise RuntimeError("unreachable")
+
+    async def fetch_many(self, urls: List[str]) -> List[Union[httpx.Response, Exception]]:
+        """
+        Fetch many URLs concurrently within the configured limits.
+
+        Returns:
+            One response or exception per URL, in input order
+        """
+        return await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
+
+    async def aclose(self):
+        """Close the connection pool of the current event loop."""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
@@ -0,0 +1,367 @@
+from typing import List, Dict, Any, Optional, Tuple
+from array import array
+from collections import Counter
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+
+
+# ASCII words keep internal separators so part numbers like "ab-1234" stay one term;
+# everything else that is a letter (kana, kanji, ...) becomes character bigrams
+_TOKEN_RE = re.compile(r"(?P<word>[a-z0-9]+(?:[-_./][a-z0-9]+)*)|(?P<cjk>[^\W\d_a-z]+)")
+_SEPARATOR_RE = re.compile(r"[-_./]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize text for lexical search.
+
+    The text is NFKC-normalized and lowercased. ASCII words and numbers are
+    kept whole (plus their separator-delimited parts and the concatenation
+    without separators, so "AB-1234" also matches "AB1234"); runs of other
+    letters, e.g. Japanese, are split into overlapping character bigrams.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text):
+        word = match.group("word")
+        if word is not None:
+            tokens.append(word)
+            parts = _SEPARATOR_RE.split(word)
+            if len(parts) > 1:
+                tokens.extend(part for part in parts if part)
+                tokens.append("".join(parts))
+            continue
+        run = match.group("cjk")
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75,
+                 merge_threshold: int = 200_000, snapshot_every: int = 2_000):
+        """
+        Persistent BM25 inverted index over chunk texts.
+
+        Postings live in CSR form (term offsets, int32 doc numbers, uint16 term
+        frequencies). New documents go to small per-term append buffers that
+        are merged into the CSR arrays once merge_threshold postings have
+        accumulated. Removed documents are tombstoned and dropped on merge.
+        Within a term, postings are always sorted by document number.
+
+        On disk the index is one snapshot (index.npz) plus an append-only log
+        of additions/removals since that snapshot, replayed on load.
+
+        Args:
+            index_dir: Directory holding the snapshot and the log
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            merge_threshold: Buffered postings that trigger a merge into the CSR arrays
+            snapshot_every: Minimum logged operations before a new snapshot is written
+        """
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.merge_threshold = merge_threshold
+        self.snapshot_every = snapshot_every
+        self._lock = threading.RLock()
+        self._snapshot_path = os.path.join(index_dir, "index.npz")
+        self._log_path = os.path.join(index_dir, "log.jsonl")
+        os.makedirs(index_dir, exist_ok=True)
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self._vocab: Dict[str, int] = {}
+        self._doc_ids: List[Optional[str]] = []
+        self._id_to_doc: Dict[str, int] = {}
+        self._doc_len = array("I")
+        self._alive = array("B")
+        self._alive_count = 0
+        self._alive_length = 0
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_docs = np.zeros(0, dtype=np.int32)
+        self._post_tfs = np.zeros(0, dtype=np.uint16)
+        self._pending: Dict[int, Tuple[array, array]] = {}
+        self._pending_count = 0
+        self._logged_ops = 0
+
+    def __len__(self) -> int:
+        return self._alive_count
+
+    def add(self, ids: List[str], texts: List[str]):
+        """
+        Index documents, replacing any previous version stored under the same ID.
+
+        Args:
+            ids: Chunk IDs
+            texts: Chunk texts, one per ID
+        """
+        entries = []
+        for doc_id, text in zip(ids, texts):
+            term_counts = Counter(tokenize(text))
+            entries.append({"op": "add", "id": doc_id, "tf": dict(term_counts)})
+        with self._lock:
+            for entry in entries:
+                self._apply(entry)
+            self._append_log(entries)
+
+    def remove(self, ids: List[str]):
+        """Remove documents by ID; unknown IDs are ignored."""
+        entries = [{"op": "del", "id": doc_id} for doc_id in ids]
+        with self._lock:
+            for entry in entries:
+                self._apply(entry)
+            self._append_log(entries)
+
+    def _apply(self, entry: Dict[str, Any]):
+        doc_id = entry["id"]
+        previous = self._id_to_doc.pop(doc_id, None)
+        if previous is not None and self._alive[previous]:
+            self._alive[previous] = 0
+            self._alive_count -= 1
+            self._alive_length -= self._doc_len[previous]
+            self._doc_ids[previous] = None
+        if entry["op"] != "add":
+            return
+        doc = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        self._id_to_doc[doc_id] = doc
+        length = 0
+        for term, tf in entry["tf"].items():
+            term_id = self._vocab.setdefault(term, len(self._vocab))
+            buffers = self._pending.get(term_id)
+            if buffers is None:
+                buffers = self._pending[term_id] = (array("i"), array("H"))
+            buffers[0].append(doc)
+            buffers[1].append(min(tf, 65535))
+            length += tf
+        self._pending_count += len(entry["tf"])
+        self._doc_len.append(length)
+        self._alive.append(1)
+        self._alive_count += 1
+        self._alive_length += length
+        if self._pending_count >= self.merge_threshold:
+            self._merge()
+
+    def _merge(self):
+        """Fold buffered postings into the CSR arrays, dropping removed documents."""
+        n_terms = len(self._vocab)
+        base_terms = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int32), np.diff(self._offsets))
+        term_parts = [base_terms]
+        doc_parts = [self._post_docs]
+        tf_parts = [self._post_tfs]
+        for term_id, (docs, tfs) in self._pending.items():
+            term_parts.append(np.full(len(docs), term_id, dtype=np.int32))
+            doc_parts.append(np.frombuffer(docs, dtype=np.int32))
+            tf_parts.append(np.frombuffer(tfs, dtype=np.uint16))
+        terms = np.concatenate(term_parts)
+        docs = np.concatenate(doc_parts)
+        tfs = np.concatenate(tf_parts)
+
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        keep = alive[docs] if len(docs) else np.zeros(0, dtype=bool)
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+
+        # Renumber documents when tombstones make up a sizeable part of the index
+        if len(alive) and self._alive_count < 0.8 * len(alive):
+            new_numbers = np.cumsum(alive, dtype=np.int64) - 1
+            docs = new_numbers[docs].astype(np.int32)
+            self._doc_ids = [doc_id for doc_id in self._doc_ids if doc_id is not None]
+            self._id_to_doc = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+            self._doc_len = array("I", np.frombuffer(self._doc_len, dtype=np.uint32)[alive].tobytes())
+            self._alive = array("B", b"\x01" * len(self._doc_ids))
+
+        order = np.lexsort((docs, terms))
+        self._post_docs = np.ascontiguousarray(docs[order], dtype=np.int32)
+        self._post_tfs = np.ascontiguousarray(tfs[order], dtype=np.uint16)
+        counts = np.bincount(terms, minlength=n_terms)
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._pending = {}
+        self._pending_count = 0
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        if term_id < len(self._offsets) - 1:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            docs, tfs = self._post_docs[start:end], self._post_tfs[start:end]
+        else:
+            docs, tfs = self._post_docs[:0], self._post_tfs[:0]
+        buffers = self._pending.get(term_id)
+        if buffers is not None:
+            docs = np.concatenate((docs, np.frombuffer(buffers[0], dtype=np.int32)))
+            tfs = np.concatenate((tfs, np.frombuffer(buffers[1], dtype=np.uint16)))
+        return docs, tfs
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank documents for a query with BM25.
+
+        Args:
+            query: Query text
+            top_k: Number of results to return
+
+        Returns:
+            List of (chunk ID, BM25 score), best first
+        """
+        query_terms = Counter(tokenize(query))
+        with self._lock:
+            if not query_terms or not self._alive_count:
+                return []
+            alive = np.frombuffer(self._alive, dtype=np.uint8)
+            doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+            n_docs = self._alive_count
+            avgdl = self._alive_length / n_docs if n_docs else 1.0
+
+            terms = []
+            for term, query_tf in query_terms.items():
+                term_id = self._vocab.get(term)
+                if term_id is not None:
+                    docs, tfs = self._postings(term_id)
+                    df = self._live_df(docs)
+                    if df:
+                        terms.append((len(docs), df, query_tf, docs, tfs))
+            if not terms:
+                return []
+
+            # Candidates come from the selective terms only (by posting length, which
+            # is what they cost); very common terms just add to the score of those candidates
+            terms.sort(key=lambda t: t[0])
+            cutoff = max(10_000, len(alive) // 50)
+            selective = [t for t in terms if t[0] <= cutoff] or terms[:1]
+            if len(selective) == 1:
+                candidates = selective[0][3]
+            else:
+                candidates = np.sort(np.concatenate([t[3] for t in selective]))
+                candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+            candidates = candidates[alive[candidates].astype(bool)]
+            if not len(candidates):
+                return []
+
+            norm = self.k1 * (1.0 - self.b + self.b * doc_len[candidates] / avgdl)
+            scores = np.zeros(len(candidates), dtype=np.float64)
+            for _, df, query_tf, docs, tfs in terms:
+                # Postings are sorted by document number, so look candidates up directly
+                positions = np.searchsorted(docs, candidates)
+                found = positions < len(docs)
+                found[found] = docs[positions[found]] == candidates[found]
+                tf = np.zeros(len(candidates), dtype=np.float64)
+                tf[found] = tfs[positions[found]]
+                idf = self._idf(df, n_docs)
+                scores += query_tf * idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+            top = top[np.argsort(-scores[top])]
+            return [(self._doc_ids[candidates[i]], float(scores[i])) for i in top]
+
+    def _live_df(self, docs: np.ndarray) -> int:
+        # Tombstoned documents stay in the postings until the next merge and must not count
+        if self._alive_count == len(self._alive):
+            return len(docs)
+        return int(np.count_nonzero(np.frombuffer(self._alive, dtype=np.uint8)[docs]))
+
+    @staticmethod
+    def _idf(df: int, n_docs: int) -> float:
+        return math.log(1.0 + (n_docs - min(df, n_docs) + 0.5) / (min(df, n_docs) + 0.5))
+
+    def reference_score(self, query: str) -> float:
+        """
+        Score of a document of average length containing every query term once.
+
+        Dividing a search score by it gives the idf-weighted share of the query
+        a document matches (about 1.0 for a full match), so a hit on a single
+        common bigram of a long Japanese question stays far below a hit on its
+        part numbers and names. Terms missing from the index count with the
+        highest idf, since no document can match them.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Reference BM25 score, 0.0 for an empty query or index
+        """
+        query_terms = Counter(tokenize(query))
+        with self._lock:
+            n_docs = self._alive_count
+            if not query_terms or not n_docs:
+                return 0.0
+            total = 0.0
+            for term, query_tf in query_terms.items():
+                term_id = self._vocab.get(term)
+                df = self._live_df(self._postings(term_id)[0]) if term_id is not None else 0
+                total += query_tf * self._idf(df, n_docs)
+            return total
+
+    def save(self):
+        """Merge buffered postings and write a fresh snapshot, truncating the log."""
+        with self._lock:
+            self._merge()
+            meta = json.dumps({
+                "vocab": sorted(self._vocab, key=self._vocab.get),
+                "doc_ids": self._doc_ids,
+                "alive_length": self._alive_length,
+            }, ensure_ascii=False).encode("utf-8")
+            tmp_path = f"{self._snapshot_path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                meta=np.frombuffer(meta, dtype=np.uint8),
+                offsets=self._offsets,
+                post_docs=self._post_docs,
+                post_tfs=self._post_tfs,
+                doc_len=np.frombuffer(self._doc_len, dtype=np.uint32),
+                alive=np.frombuffer(self._alive, dtype=np.uint8),
+            )
+            os.replace(tmp_path, self._snapshot_path)
+            # Replaying a log over a snapshot that already contains it is harmless,
+            # so a crash between these two steps cannot corrupt the index
+            open(self._log_path, "w").close()
+            self._logged_ops = 0
+
+    def _append_log(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._logged_ops += len(entries)
+        # Growing the threshold with the index keeps snapshot cost amortized linear
+        if self._logged_ops >= max(self.snapshot_every, self._alive_count // 4):
+            self.save()
+
+    def _load(self):
+        if os.path.exists(self._snapshot_path):
+            try:
+                with np.load(self._snapshot_path) as data:
+                    meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                    self._offsets = data["offsets"]
+                    self._post_docs = data["post_docs"]
+                    self._post_tfs = data["post_tfs"]
+                    self._doc_len = array("I", data["doc_len"].tobytes())
+                    self._alive = array("B", data["alive"].tobytes())
+                self._vocab = {term: i for i, term in enumerate(meta["vocab"])}
+                self._doc_ids = meta["doc_ids"]
+                self._id_to_doc = {doc_id: i for i, doc_id in enumerate(self._doc_ids) if doc_id is not None}
+                self._alive_length = meta["alive_length"]
+                self._alive_count = sum(self._alive)
+            except Exception as e:
+                print(f"Error loading BM25 index {self._snapshot_path}: {e}")
+                self._reset()
+        if os.path.exists(self._log_path):
+            replayed = 0
+            with open(self._log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        continue
+                    self._apply(entry)
+                    replayed += 1
+            self._logged_ops = replayed
@@ -0,0 +1,148 @@
+from typing import List, Dict, Any, Optional
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class EmbeddingCache:
+    def __init__(self, db_path: str, model_id: str, max_entries: int = 500_000, dtype: str = "float32",
+                 touch_batch: int = 10_000):
+        """
+        On-disk cache of embeddings keyed by (model identifier, text hash).
+
+        Vectors are stored as raw float32 blobs in a single SQLite file, so a hit
+        returns exactly the vector the model produced. float16 storage halves the
+        file but makes hits lossy, so it is only used when asked for. When the
+        cache grows past max_entries the least recently used tenth is evicted.
+
+        Access times of hits are kept in memory and written in one batch before
+        each eviction sweep (or once touch_batch hashes are pending), so a lookup
+        does not write to the database and commit every time.
+
+        Args:
+            db_path: Path of the SQLite file holding the cache
+            model_id: Identifier of the embedding model; vectors of other models are never returned
+            max_entries: Maximum number of cached vectors
+            dtype: Storage precision, "float32" or (lossy, half the size) "float16"
+            touch_batch: Pending access-time updates that trigger a write
+        """
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.db_path = db_path
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.touch_batch = max(1, touch_batch)
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, dtype TEXT NOT NULL, vector BLOB NOT NULL, "
+            "accessed_at REAL NOT NULL, PRIMARY KEY (model, text_hash))"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed_at)")
+        self._con.commit()
+        self._count = self._con.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached vectors.
+
+        Args:
+            text_hashes: Content hashes of the texts to look up
+
+        Returns:
+            Mapping from text hash to float32 vector for every hash found
+        """
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(text_hashes))
+        with self._lock:
+            # Stay well below SQLite's host parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._con.execute(
+                    f"SELECT text_hash, dtype, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_id, *batch],
+                ).fetchall()
+                for text_hash, dtype, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+            if found:
+                now = time.time()
+                self._touched.update((text_hash, now) for text_hash in found)
+                if len(self._touched) >= self.touch_batch:
+                    self._flush_touched()
+                    self._con.commit()
+            self.hits += sum(1 for text_hash in text_hashes if text_hash in found)
+            self.misses += sum(1 for text_hash in text_hashes if text_hash not in found)
+        return found
+
+    def put_many(self, vectors: Dict[str, Any]):
+        """
+        Store vectors, evicting the least recently used entries if the cache is full.
+
+        Args:
+            vectors: Mapping from text hash to embedding vector
+        """
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (self.model_id, text_hash, self.dtype.name, np.asarray(vector, dtype=self.dtype).tobytes(), now)
+            for text_hash, vector in vectors.items()
+        ]
+        with self._lock:
+            cur = self._con.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, dtype, vector, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._count += max(cur.rowcount, 0)
+            if self._count > self.max_entries:
+                # Eviction must see the recent hits
+                self._flush_touched()
+                excess = self._count - int(self.max_entries * 0.9)
+                self._con.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+                self._count = self._con.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._con.commit()
+
+    def _flush_touched(self):
+        # Caller holds the lock and commits
+        if self._touched:
+            self._con.executemany(
+                "UPDATE embeddings SET accessed_at = ? WHERE model = ? AND text_hash = ?",
+                [(accessed_at, self.model_id, text_hash) for text_hash, accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_id,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._con.commit()
+            self._con.close()
@@ -0,0 +1,78 @@
+from typing import List, Dict, Any, Iterator, Tuple
+import os
+import pickle
+import sys
+import time
+from rag_utils.pdf_processor import iter_chunk_documents, iter_document_pages
+
+# Messages streamed for one file:
+#   ("chunks", file_path, [document, ...])  at most batch_size chunks each
+#   ("done", file_path, (error or None, pages, extract_seconds, chunk_seconds))  last message
+Message = Tuple[str, str, Any]
+
+
+def iter_file_messages(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                       batch_size: int = 256) -> Iterator[Message]:
+    """
+    Extract and chunk one file, yielding its chunks in batches as pages are decoded.
+
+    Only the current page window and one batch are held, so memory does not
+    grow with the size of the file. Time spent by the consumer between
+    batches is not counted as busy time.
+    """
+    counted = {"pages": 0, "extract_seconds": 0.0}
+
+    def timed_pages() -> Iterator[Tuple[int, str]]:
+        pages = iter_document_pages(file_path)
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            finally:
+                counted["extract_seconds"] += time.perf_counter() - started
+            counted["pages"] += 1
+            yield page
+
+    batch: List[Dict[str, Any]] = []
+    busy = 0.0
+    error = None
+    resumed = time.perf_counter()
+    try:
+        for doc in iter_chunk_documents(file_path, timed_pages(), chunk_size=chunk_size, chunk_overlap=chunk_overlap):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                busy += time.perf_counter() - resumed
+                yield "chunks", file_path, batch
+                batch = []
+                resumed = time.perf_counter()
+    except Exception as e:
+        error = str(e)
+    busy += time.perf_counter() - resumed
+    if batch:
+        yield "chunks", file_path, batch
+    extract_seconds = counted["extract_seconds"]
+    yield "done", file_path, (error, counted["pages"], extract_seconds, max(busy - extract_seconds, 0.0))
+
+
+def main():
+    """
+    Serve extraction requests: one file path per line on stdin, the pickled
+    messages of iter_file_messages for that file on stdout.
+
+    IngestPipeline starts this in a new ``python -c`` interpreter, so every
+    worker is a fresh process: nothing is forked from the multi-threaded
+    parent, and unlike multiprocessing's spawn start method the parent's
+    __main__ script (chat_app.py, the test scripts) is not re-run. Writes block
+    once the pipe is full, so a worker never runs ahead of the writer by more
+    than the parent's queue and the pipe buffer.
+    """
+    chunk_size, chunk_overlap, batch_size = (int(arg) for arg in sys.argv[1:4])
+    out = sys.stdout.buffer
+    # Stray prints from parsers must not corrupt the message stream
+    sys.stdout = sys.stderr
+    for line in sys.stdin.buffer:
+        for message in iter_file_messages(os.fsdecode(line.rstrip(b"\n")), chunk_size, chunk_overlap, batch_size):
+            pickle.dump(message, out)
+            out.flush()
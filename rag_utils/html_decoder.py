@@ -0,0 +1,143 @@
+from typing import Optional, Tuple, List
+import codecs
+import re
+import chardet
+
+
+# Media types that can be turned into text; anything else (PDFs, images, archives) is skipped
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "text/xml", "application/xml")
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_META_CHARSET = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([A-Za-z0-9._:-]+)', re.I)
+
+
+class UnsupportedContentError(ValueError):
+    """Raised for responses that are not text, e.g. binaries served by a pasted link."""
+
+
+def is_text_content_type(content_type: str) -> bool:
+    """True for text media types and for a missing header (the body is sniffed instead)."""
+    media_type = content_type.split(';')[0].strip().lower()
+    return not media_type or media_type in TEXT_CONTENT_TYPES
+
+
+def _known_encoding(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip().strip('"\'')).name
+    except LookupError:
+        return None
+
+
+def charset_from_content_type(content_type: str) -> Optional[str]:
+    """The charset parameter of a Content-Type header, if present and known."""
+    match = re.search(r'charset\s*=\s*"?([^";\s]+)', content_type, re.I)
+    return _known_encoding(match.group(1)) if match else None
+
+
+def sniff_charset(prefix: bytes) -> Tuple[str, str]:
+    """
+    Detect the encoding of a document from its first bytes.
+
+    Checks, in order, a byte order mark, a <meta charset> / http-equiv
+    declaration, and finally chardet over the prefix only.
+
+    Args:
+        prefix: First bytes of the document
+
+    Returns:
+        (encoding, how it was determined)
+    """
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding, "bom"
+    match = _META_CHARSET.search(prefix)
+    encoding = _known_encoding(match.group(1).decode('ascii', errors='ignore')) if match else None
+    if encoding:
+        return encoding, "meta"
+    detected = chardet.detect(prefix)
+    encoding = _known_encoding(detected['encoding'])
+    if encoding == "ascii":
+        # An ASCII prefix says nothing about the rest of the page; UTF-8 is a superset
+        encoding = "utf-8"
+    if encoding:
+        return encoding, f"chardet ({detected['confidence']:.2f})"
+    return "utf-8", "default"
+
+
+class StreamingHtmlDecoder:
+    def __init__(self, content_type: str = "", max_bytes: int = 5 * 1024 * 1024, sniff_bytes: int = 32 * 1024):
+        """
+        Incrementally decode a streamed response body within a byte budget.
+
+        The encoding comes from the Content-Type charset or, failing that, is
+        sniffed from the first sniff_bytes (BOM, meta tag, chardet); after that
+        chunks are decoded as they arrive. Bytes beyond max_bytes are dropped.
+
+        Args:
+            content_type: Content-Type header of the response
+            max_bytes: Maximum number of body bytes decoded
+            sniff_bytes: Size of the prefix used for charset sniffing
+        """
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.sniff_bytes = sniff_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.encoding: Optional[str] = None
+        self.encoding_source: Optional[str] = None
+        self._header_charset = charset_from_content_type(content_type)
+        self._pending = b""
+        self._decoder = None
+        self._parts: List[str] = []
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Add the next chunk of the body.
+
+        Returns:
+            False once the byte budget is used up and reading should stop
+        """
+        room = self.max_bytes - self.bytes_read
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.truncated = True
+        self.bytes_read += len(chunk)
+        if self._decoder is None:
+            self._pending += chunk
+            # A header charset only needs enough bytes to rule out a BOM
+            needed = 4 if self._header_charset else self.sniff_bytes
+            if len(self._pending) >= needed:
+                self._start()
+        else:
+            self._parts.append(self._decoder.decode(chunk))
+        return not self.truncated
+
+    def _start(self):
+        prefix = self._pending
+        if not self.content_type.split(';')[0].strip() and b"\x00" in prefix[:1024] and not prefix.startswith(
+                (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            raise UnsupportedContentError("Response without a content type looks binary")
+        bom_encoding = next((encoding for bom, encoding in _BOMS if prefix.startswith(bom)), None)
+        if bom_encoding:
+            self.encoding, self.encoding_source = bom_encoding, "bom"
+        elif self._header_charset:
+            self.encoding, self.encoding_source = self._header_charset, "header"
+        else:
+            self.encoding, self.encoding_source = sniff_charset(prefix)
+        print(f"Detected encoding from {self.encoding_source}: {self.encoding}")
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        self._pending = b""
+        self._parts.append(self._decoder.decode(prefix))
+
+    def finish(self) -> str:
+        """Decode whatever is left and return the full text."""
+        if self._decoder is None:
+            self._start()
+        self._parts.append(self._decoder.decode(b"", final=True))
+        return "".join(self._parts)
@@ -0,0 +1,211 @@
+from typing import Tuple, Dict, Type
+from abc import ABC, abstractmethod
+import re
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+
+class HtmlExtractor(ABC):
+    """Turns a decoded HTML document into a title and plain text."""
+    name = "base"
+
+    @abstractmethod
+    def extract(self, html: str, url: str) -> Tuple[str, str]:
+        """
+        Extract the title and text of a page.
+
+        Args:
+            html: Decoded HTML document
+            url: URL of the page, for extractors that need it
+
+        Returns:
+            (title, text); the title is empty if the page has none
+        """
+
+
+class SoupExtractor(HtmlExtractor):
+    """The original BeautifulSoup (html.parser) extractor; keeps navigation-free full-page text."""
+    name = "soup"
+
+    def extract(self, html: str, url: str) -> Tuple[str, str]:
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Extract and clean title
+        title = ""
+        if soup.title and soup.title.string:
+            title = soup.title.string.strip()
+            # Ensure title is properly encoded
+            title = title.encode().decode('utf-8', errors='replace')
+
+        # Remove script and style elements
+        for script in soup(["script", "style", "header", "footer", "nav"]):
+            script.extract()
+
+        # Get text content with better handling of line breaks and whitespace
+        text_parts = []
+        for element in soup.find_all(string=True):
+            parent = element.parent.name.lower() if element.parent else ''
+            if parent in ['script', 'style', 'meta', 'noscript', 'header', 'footer', 'nav']:
+                continue
+
+            text = element.strip()
+            if text:
+                # Add appropriate spacing based on parent element
+                if parent in ['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li']:
+                    text_parts.append(text + '\n')
+                else:
+                    text_parts.append(text + ' ')
+
+        # Join all parts and normalize whitespace
+        raw_text = ''.join(text_parts)
+
+        # Normalize whitespace (multiple spaces/newlines to single)
+        text = re.sub(r'\s+', ' ', raw_text).strip()
+        text = re.sub(r'\n\s*\n', '\n\n', text)  # Keep paragraph breaks
+
+        # Verify text encoding is consistent
+        text = text.encode().decode('utf-8', errors='replace')
+        return title, text
+
+
+# Elements that never hold page content. <form> itself is kept: ASP.NET WebForms pages wrap
+# the whole body in one, so only the form controls are dropped
+_REMOVE_TAGS = (
+    "script", "style", "noscript", "template", "svg", "iframe", "input", "button", "select", "textarea",
+    "nav", "header", "footer", "aside",
+)
+# Elements that start a new line in the extracted text
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "table", "tr",
+    "pre", "blockquote", "figcaption", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6",
+}
+# class/id fragments of navigation, sharing and advertising blocks
+_BOILERPLATE = re.compile(
+    r"nav|menu|footer|header|sidebar|breadcrumb|comment|share|social|related|banner|advert|"
+    r"promo|cookie|popup|modal|subscribe|pagination|toolbar", re.I
+)
+# Only containers are checked; inline elements (e.g. highlighted code spans) are too many to visit
+_CONTAINER_TAGS = ("div", "section", "ul", "ol", "dl", "table")
+_SPACES = re.compile(r"[ \t\r\f\v　]+")
+_LINE_BREAKS = re.compile(r" ?\n[\s　]*")
+
+
+class LxmlExtractor(HtmlExtractor):
+    """
+    Fast extractor on lxml's C parser with main-content detection.
+
+    Drops non-content elements and boilerplate blocks (navigation, share
+    bars, ads) recognised by class/id and link density, then keeps the
+    <main>/<article> element or, failing that, the container holding most
+    of the paragraph text. Line breaks between blocks are preserved.
+    """
+    name = "lxml"
+
+    def __init__(self, min_main_ratio: float = 0.25):
+        """
+        Args:
+            min_main_ratio: Share of the page text a detected main-content
+                element must hold; below it the whole body is used
+        """
+        if not LXML_AVAILABLE:
+            raise ImportError("LxmlExtractor requires lxml: pip install lxml")
+        self.min_main_ratio = min_main_ratio
+
+    def extract(self, html: str, url: str) -> Tuple[str, str]:
+        if not html.strip():
+            return "", ""
+        # lxml rejects str input with an XML encoding declaration
+        if html.lstrip()[:5] == "<?xml":
+            html = html[html.index("?>") + 2:]
+        doc = lxml.html.document_fromstring(html)
+        title = (doc.findtext(".//title") or "").strip()
+
+        etree.strip_elements(doc, etree.Comment, etree.ProcessingInstruction, *_REMOVE_TAGS, with_tail=False)
+        body = doc.find("body")
+        if body is None:
+            body = doc
+        self._drop_boilerplate(body)
+        root = self._main_content(body)
+        return title, self._text(root)
+
+    def _drop_boilerplate(self, body):
+        for el in list(body.iter(*_CONTAINER_TAGS)):
+            attributes = el.attrib
+            if "class" not in attributes and "id" not in attributes:
+                continue
+            if not _BOILERPLATE.search(f"{attributes.get('class', '')} {attributes.get('id', '')}"):
+                continue
+            # Skip elements already removed together with a boilerplate ancestor
+            if not self._attached(el, body):
+                continue
+            text_len = len(el.text_content())
+            link_len = sum(len(a.text_content()) for a in el.iter("a"))
+            # Wrapper classes such as "has-sidebar" may hold the article; only drop small or link-heavy blocks
+            if text_len < 500 or link_len > 0.5 * text_len:
+                el.drop_tree()
+
+    def _attached(self, el, body) -> bool:
+        for ancestor in el.iterancestors():
+            if ancestor is body:
+                return True
+        return False
+
+    def _main_content(self, body):
+        total = len(body.text_content().strip()) or 1
+        landmarks = body.xpath(".//main | .//article | .//*[@role='main']")
+        if landmarks:
+            best = max(landmarks, key=lambda el: len(el.text_content()))
+            if len(best.text_content().strip()) >= self.min_main_ratio * total:
+                return best
+
+        # Credit paragraph text to the parent (and half to the grandparent) like Readability
+        scores: Dict = {}
+        for el in body.iter("p", "pre", "td", "blockquote"):
+            length = len(el.text_content().strip())
+            if length < 25:
+                continue
+            parent = el.getparent()
+            if parent is not None:
+                scores[parent] = scores.get(parent, 0) + length
+                grandparent = parent.getparent()
+                if grandparent is not None:
+                    scores[grandparent] = scores.get(grandparent, 0) + length / 2
+        if scores:
+            best = max(scores, key=scores.get)
+            if len(best.text_content().strip()) >= self.min_main_ratio * total:
+                return best
+        return body
+
+    def _text(self, root) -> str:
+        for el in root.iter(*_BLOCK_TAGS):
+            el.tail = "\n" + (el.tail or "")
+        return _LINE_BREAKS.sub("\n", _SPACES.sub(" ", root.text_content())).strip()
+
+
+EXTRACTORS: Dict[str, Type[HtmlExtractor]] = {
+    SoupExtractor.name: SoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+
+def get_extractor(name: str = "auto") -> HtmlExtractor:
+    """
+    Create an extractor by name.
+
+    Args:
+        name: "soup", "lxml", or "auto" for lxml when installed and soup otherwise
+
+    Returns:
+        Extractor instance
+    """
+    if name == "auto":
+        name = "lxml" if LXML_AVAILABLE else "soup"
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor: {name}")
+    return EXTRACTORS[name]()
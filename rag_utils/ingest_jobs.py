@@ -0,0 +1,200 @@
+from typing import List, Dict, Any, Optional, Callable
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# Handler signature: (payload, report_progress(fraction, message)) -> result dictionary
+ProgressCallback = Callable[[float, str], None]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Dict[str, Any]]
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class IngestJobQueue:
+    def __init__(self, db_path: str, workers: int = 2, max_attempts: int = 2):
+        """
+        Persistent queue of background ingestion jobs processed by worker threads.
+
+        Jobs are rows in a SQLite table, so queued work survives a restart;
+        jobs found running at start-up were interrupted and are queued again.
+        Handlers are registered per job kind and report progress while they run.
+
+        Args:
+            db_path: Path of the SQLite file holding the queue
+            workers: Number of worker threads
+            max_attempts: Attempts per job before it is marked failed
+        """
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, dedupe_key TEXT, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, result TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._con.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (kind, dedupe_key, status)")
+        # Jobs left running by a previous process were interrupted
+        self._con.execute("UPDATE jobs SET status = 'queued', message = 'requeued after restart' WHERE status = 'running'")
+        self._con.commit()
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the function that runs jobs of the given kind."""
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Start the worker threads."""
+        if self._threads:
+            return
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers after their current job."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None) -> str:
+        """
+        Queue a job.
+
+        Args:
+            kind: Job kind, selecting the registered handler
+            payload: JSON-serializable job arguments
+            dedupe_key: If given and a queued or running job of the same kind has
+                this key, that job's ID is returned instead of queueing another
+
+        Returns:
+            ID of the job
+        """
+        with self._lock:
+            if dedupe_key is not None:
+                row = self._con.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND dedupe_key = ? AND status IN (?, ?)",
+                    (kind, dedupe_key, *ACTIVE_STATUSES),
+                ).fetchone()
+                if row:
+                    return row[0]
+            job_id = uuid.uuid4().hex
+            self._con.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, payload, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, dedupe_key, json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+            self._con.commit()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status, progress and result of a job, or None if it does not exist."""
+        with self._lock:
+            row = self._con.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally only those with the given status."""
+        query = f"SELECT {self._COLUMNS} FROM jobs"
+        params: List[Any] = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._con.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._lock:
+            return dict(self._con.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    _COLUMNS = "id, kind, payload, status, progress, message, result, error, attempts, created_at, started_at, finished_at"
+
+    def _to_dict(self, row) -> Dict[str, Any]:
+        job = dict(zip([c.strip() for c in self._COLUMNS.split(",")], row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._con.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._con.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, message = 'started' "
+                "WHERE id = ?",
+                (time.time(), row[0]),
+            )
+            self._con.commit()
+        job = self._to_dict(row)
+        job["attempts"] += 1
+        return job
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._con.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._con.commit()
+
+    def _worker(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(timeout=1.0)
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+
+        def report_progress(fraction: float, message: str):
+            self._update(job_id, progress=max(0.0, min(1.0, fraction)), message=message)
+
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind: {job['kind']}")
+            result = handler(job["payload"], report_progress)
+            self._update(job_id, status="succeeded", progress=1.0, message="done",
+                         result=json.dumps(result or {}, ensure_ascii=False), finished_at=time.time())
+        except Exception as e:
+            print(f"Error in ingestion job {job_id} ({job['kind']}): {e}")
+            if handler is not None and job["attempts"] < self.max_attempts:
+                self._update(job_id, status="queued", message=f"retrying after error: {e}", error=str(e))
+            else:
+                self._update(job_id, status="failed", message="failed", error=str(e), finished_at=time.time())
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._con.close()
@@ -0,0 +1,92 @@
+from typing import List, Dict, Any, Optional
+import os
+import json
+import hashlib
+
+
+MANIFEST_VERSION = 1
+
+
+def file_content_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """Compute the SHA-256 of a file without loading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    def __init__(self, manifest_path: str):
+        """
+        Persistent record of the files that have been ingested into a collection.
+
+        Each entry is keyed by file path and stores the file size, mtime, content
+        hash, the splitter settings used and the IDs of the chunks written, so a
+        restart only has to process files that are new, changed or removed.
+
+        Args:
+            manifest_path: Path of the JSON file holding the manifest
+        """
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it is missing or corrupt."""
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("files", {})
+            else:
+                print(f"Ignoring ingestion manifest with unknown version: {self.manifest_path}")
+        except Exception as e:
+            print(f"Error reading ingestion manifest {self.manifest_path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written."""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(file_path)
+
+    def is_unchanged(self, file_path: str, stat: os.stat_result, splitter: Dict[str, Any]) -> bool:
+        """
+        Cheap check that a file matches its manifest entry by size and mtime.
+
+        Args:
+            file_path: Path of the file to check
+            stat: Result of os.stat for the file
+            splitter: Splitter settings the file would be chunked with
+
+        Returns:
+            True if the file can be skipped without reading it
+        """
+        entry = self.entries.get(file_path)
+        if not entry or entry.get("splitter") != splitter:
+            return False
+        return entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime
+
+    def record(self, file_path: str, stat: os.stat_result, content_hash: str,
+               chunk_ids: List[str], splitter: Dict[str, Any]):
+        """Record a file as ingested with the given chunk IDs."""
+        self.entries[file_path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": content_hash,
+            "chunk_ids": chunk_ids,
+            "splitter": splitter,
+        }
+
+    def remove(self, file_path: str) -> List[str]:
+        """Forget a file and return the chunk IDs that belonged to it."""
+        entry = self.entries.pop(file_path, None)
+        return entry.get("chunk_ids", []) if entry else []
@@ -0,0 +1,256 @@
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from rag_utils.extract_worker import Message, iter_file_messages
+
+
+class _ExtractWorker:
+    """
+    One extraction process, started as a fresh interpreter running rag_utils.extract_worker.
+
+    The pipeline runs next to other threads (job queue, chromadb, logfire), and
+    forking such a process can deadlock the child on a lock that another thread
+    held at fork time, so workers are never forked from the parent.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, batch_size: int):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._env = dict(os.environ)
+        self._env["PYTHONPATH"] = os.pathsep.join(p for p in (root, self._env.get("PYTHONPATH")) if p)
+        self._args = [sys.executable, "-c", "from rag_utils.extract_worker import main; main()",
+                      str(chunk_size), str(chunk_overlap), str(batch_size)]
+        self._proc = self._start()
+
+    def _start(self) -> subprocess.Popen:
+        return subprocess.Popen(self._args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=self._env)
+
+    def messages(self, file_path: str) -> Iterator[Message]:
+        """Stream the messages of one file from the process; a process that died is replaced."""
+        try:
+            self._proc.stdin.write(os.fsencode(file_path) + b"\n")
+            self._proc.stdin.flush()
+            while True:
+                message = pickle.load(self._proc.stdout)
+                yield message
+                if message[0] == "done":
+                    return
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = self._start()
+            yield "done", file_path, (f"extraction worker failed: {e}", 0, 0.0, 0.0)
+
+    def close(self):
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        self._proc.wait()
+
+
+@dataclass
+class StageStats:
+    """Items processed by one pipeline stage and the time its workers spent busy."""
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def rate(self, wall_seconds: float) -> float:
+        return self.items / wall_seconds if wall_seconds > 0 else 0.0
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    failed_files: int = 0
+    wall_seconds: float = 0.0
+    extract: StageStats = field(default_factory=StageStats)  # pages
+    chunk: StageStats = field(default_factory=StageStats)  # chunks
+    embed: StageStats = field(default_factory=StageStats)  # embeddings written
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "failed_files": self.failed_files,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "pages_per_second": round(self.extract.rate(self.wall_seconds), 2),
+            "chunks_per_second": round(self.chunk.rate(self.wall_seconds), 2),
+            "embeddings_per_second": round(self.embed.rate(self.wall_seconds), 2),
+            "extract_busy_seconds": round(self.extract.busy_seconds, 3),
+            "chunk_busy_seconds": round(self.chunk.busy_seconds, 3),
+            "embed_busy_seconds": round(self.embed.busy_seconds, 3),
+        }
+
+    def summary(self) -> str:
+        d = self.as_dict()
+        return (
+            f"{self.files} files ({self.failed_files} failed) in {d['wall_seconds']}s: "
+            f"{self.extract.items} pages ({d['pages_per_second']} pages/s, busy {d['extract_busy_seconds']}s), "
+            f"{self.chunk.items} chunks ({d['chunks_per_second']} chunks/s, busy {d['chunk_busy_seconds']}s), "
+            f"{self.embed.items} embeddings ({d['embeddings_per_second']} embeddings/s, busy {d['embed_busy_seconds']}s)"
+        )
+
+
+# Callback invoked once per file: (file_path, chunk_ids or None on failure, error message)
+FileDoneCallback = Callable[[str, Optional[List[str]], Optional[str]], None]
+
+_DONE = object()
+
+
+class IngestPipeline:
+    def __init__(self, vector_store, extract_workers: Optional[int] = None,
+                 batch_size: int = 256, queue_depth: int = 8,
+                 chunk_size: int = 1000, chunk_overlap: int = 200):
+        """
+        Staged ingestion: extraction and chunking in worker processes, embedding
+        and writes in batches in the calling thread, connected by a bounded queue.
+
+        Workers stream each file page by page and send its chunks back in
+        batches, so no stage ever holds a whole file: peak memory is about
+        queue_depth batches of chunks plus one page window per worker,
+        independent of file and corpus size.
+
+        Args:
+            vector_store: VectorStore to write chunks into
+            extract_workers: Extraction processes; 0 extracts and chunks the files one
+                after another in a thread of this process instead
+            batch_size: Number of chunks embedded and written per batch
+            queue_depth: Maximum chunk batches in flight between the workers and the writer
+            chunk_size: Size of each text chunk
+            chunk_overlap: Overlap between chunks
+        """
+        self.vector_store = vector_store
+        self.extract_workers = min(4, os.cpu_count() or 1) if extract_workers is None else extract_workers
+        self.batch_size = max(1, batch_size)
+        self.queue_depth = max(1, queue_depth)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def run(self, file_paths: List[str], on_file_done: Optional[FileDoneCallback] = None) -> IngestStats:
+        """
+        Ingest the given files.
+
+        Args:
+            file_paths: Paths of the PDF and text files to ingest
+            on_file_done: Called from the calling thread once all chunks of a file are written
+
+        Returns:
+            Per-stage throughput statistics
+        """
+        stats = IngestStats()
+        if not file_paths:
+            return stats
+        start = time.perf_counter()
+        message_queue: queue.Queue = queue.Queue(maxsize=self.queue_depth)
+        paths = iter(file_paths)
+        paths_lock = threading.Lock()
+
+        def next_path() -> Optional[str]:
+            with paths_lock:
+                return next(paths, None)
+
+        workers = min(self.extract_workers or 1, len(file_paths))
+        extractors = [
+            threading.Thread(target=self._extract_stage, args=(next_path, message_queue), daemon=True)
+            for _ in range(workers)
+        ]
+        for t in extractors:
+            t.start()
+
+        self._write_stage(message_queue, workers, stats, on_file_done)
+
+        for t in extractors:
+            t.join()
+        stats.wall_seconds = time.perf_counter() - start
+        print(f"Ingestion pipeline: {stats.summary()}")
+        return stats
+
+    def _extract_stage(self, next_path: Callable[[], Optional[str]], message_queue: queue.Queue):
+        """Feed files to one worker process (or chunk them in this thread) and forward its messages."""
+        worker = None
+        try:
+            if self.extract_workers > 0:
+                worker = _ExtractWorker(self.chunk_size, self.chunk_overlap, self.batch_size)
+            for file_path in iter(next_path, None):
+                if worker:
+                    messages = worker.messages(file_path)
+                else:
+                    messages = iter_file_messages(file_path, self.chunk_size, self.chunk_overlap, self.batch_size)
+                for message in messages:
+                    # Blocks when the writer falls behind; the worker then blocks on the full pipe
+                    message_queue.put(message)
+        except Exception as e:
+            print(f"Error in extraction stage: {e}")
+        finally:
+            if worker:
+                worker.close()
+            message_queue.put(_DONE)
+
+    def _write_stage(self, message_queue: queue.Queue, producers: int, stats: IngestStats,
+                     on_file_done: Optional[FileDoneCallback]):
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        file_ids: Dict[str, List[str]] = {}
+        failed: Dict[str, str] = {}
+        completed: List[str] = []  # files whose last chunk is in the current batch or earlier
+
+        def report(paths: List[str]):
+            for path in paths:
+                stats.files += 1
+                error = failed.pop(path, None)
+                ids = file_ids.pop(path, [])
+                if error is not None:
+                    stats.failed_files += 1
+                    print(f"Error processing {path}: {error}")
+                if on_file_done:
+                    on_file_done(path, None if error is not None else ids, error)
+
+        def write(entries: List[Tuple[str, Dict[str, Any]]]):
+            started = time.perf_counter()
+            ids = self.vector_store.add_documents([doc for _, doc in entries])
+            stats.embed.busy_seconds += time.perf_counter() - started
+            if ids:
+                stats.embed.items += len(entries)
+                for (path, _), doc_id in zip(entries, ids):
+                    file_ids.setdefault(path, []).append(doc_id)
+            else:
+                for path, _ in entries:
+                    failed.setdefault(path, "failed to write chunks to the vector store")
+
+        def report_written():
+            # A completed file is reported once none of its chunks wait in the batch
+            pending = {path for path, _ in batch}
+            ready = [path for path in completed if path not in pending]
+            completed[:] = [path for path in completed if path in pending]
+            report(ready)
+
+        finished = 0
+        while finished < producers:
+            item = message_queue.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            kind, path, payload = item
+            if kind == "chunks":
+                stats.chunk.items += len(payload)
+                batch.extend((path, doc) for doc in payload)
+                while len(batch) >= self.batch_size:
+                    write(batch[:self.batch_size])
+                    del batch[:self.batch_size]
+            else:
+                error, pages, extract_seconds, chunk_seconds = payload
+                stats.extract.items += pages
+                stats.extract.busy_seconds += extract_seconds
+                stats.chunk.busy_seconds += chunk_seconds
+                if error is not None:
+                    failed[path] = error
+                completed.append(path)
+            report_written()
+        if batch:
+            write(batch)
+            batch.clear()
+        report_written()
@@ -0,0 +1,360 @@
+from typing import List, Dict, Any, Optional, Iterator, Set, Tuple
+import json
+import os
+import threading
+import numpy as np
+from rag_utils.vector_store import VectorStore
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, collection_name: str = "pdf_documents", data_dir: str = "./chroma_db",
+                 dtype: str = "float32", block_rows: int = 65536, **kwargs):
+        """
+        Vector store doing exact cosine search with NumPy instead of HNSW.
+
+        Normalized embeddings live in an append-only, memory-mapped float32 or
+        float16 matrix. Row-parallel files hold the chunk IDs, an alive flag
+        and offsets into a file of JSON records (content + metadata), so
+        opening the store maps the matrix and reads only the small row tables.
+        Metadata rewritten after a row was appended (chunks that moved) goes to
+        a side table that overrides the record until the next compaction, so
+        moving a chunk never copies its vector. Queries are scored in blocks of
+        block_rows with a single matrix product per block and reduced with
+        argpartition.
+
+        Metadata filters (delete_where) use an in-memory value->rows index per
+        filtered key, built by one scan the first time a key is used and kept
+        up to date afterwards.
+
+        Args:
+            collection_name: Name of the collection to store documents
+            data_dir: Directory under which the store's files are kept
+            dtype: Storage precision of the matrix, "float32" or "float16"
+            block_rows: Rows scored per block, bounding temporary memory
+            **kwargs: Passed on to VectorStore (cache settings)
+        """
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"Unsupported matrix dtype: {dtype}")
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        super().__init__(collection_name=collection_name, data_dir=data_dir, **kwargs)
+
+    @property
+    def storage_prefix(self) -> str:
+        return os.path.join(self.data_dir, f"{self.collection_name}_numpy")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.storage_prefix, name)
+
+    def _open_backend(self):
+        self._lock = threading.RLock()
+        os.makedirs(self.storage_prefix, exist_ok=True)
+        self._dim: Optional[int] = None
+        if os.path.exists(self._path("header.json")):
+            with open(self._path("header.json"), 'r') as f:
+                header = json.load(f)
+            self._dim = header["dim"]
+            if header["dtype"] != self.dtype.name:
+                print(f"Using stored matrix dtype {header['dtype']} instead of {self.dtype.name}")
+                self.dtype = np.dtype(header["dtype"])
+
+        for name in ("vectors.bin", "records.bin", "ids.txt", "alive.bin", "offsets.bin", "metadata.jsonl"):
+            open(self._path(name), 'ab').close()
+
+        # offsets.bin is written last on every append, so it defines how many rows are complete
+        self._offsets = np.fromfile(self._path("offsets.bin"), dtype=np.int64).reshape(-1, 2)
+        rows = len(self._offsets)
+        with open(self._path("ids.txt"), 'r', encoding='utf-8') as f:
+            ids = f.read().split("\n")[:rows]
+        self._ids: List[str] = ids if rows else []
+        self._alive = np.fromfile(self._path("alive.bin"), dtype=np.uint8)[:rows].copy()
+        self._truncate_partial_rows(rows)
+
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids) if self._alive[row]}
+        self._load_metadata_updates(rows)
+        # Filter key -> metadata value -> rows, and filter key -> row -> value, built on first use
+        self._value_rows: Dict[str, Dict[Any, Set[int]]] = {}
+        self._row_values: Dict[str, Dict[int, Any]] = {}
+        self._records_fd = os.open(self._path("records.bin"), os.O_RDONLY)
+        self._map_matrix()
+        print(f"Opened NumPy vector store {self.storage_prefix} with {len(self._row_of)} documents")
+
+    def _truncate_partial_rows(self, rows: int):
+        # Drop whatever an interrupted append left behind after the last complete row
+        record_end = int(self._offsets[-1].sum()) if rows else 0
+        os.truncate(self._path("records.bin"), record_end)
+        os.truncate(self._path("alive.bin"), rows)
+        os.truncate(self._path("offsets.bin"), rows * 16)
+        id_bytes = sum(len(doc_id.encode("utf-8")) + 1 for doc_id in self._ids)
+        os.truncate(self._path("ids.txt"), id_bytes)
+        if self._dim:
+            os.truncate(self._path("vectors.bin"), rows * self._dim * self.dtype.itemsize)
+
+    def _load_metadata_updates(self, rows: int):
+        # Later lines win; rows past the last complete row belong to an interrupted append
+        self._metadata: Dict[int, Dict[str, Any]] = {}
+        self._metadata_updates = 0
+        with open(self._path("metadata.jsonl"), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    update = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    continue
+                self._metadata_updates += 1
+                if update["row"] < rows and self._alive[update["row"]]:
+                    self._metadata[update["row"]] = update["metadata"]
+
+    def _map_matrix(self):
+        rows = len(self._ids)
+        if rows and self._dim:
+            self._matrix = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode='r', shape=(rows, self._dim))
+        else:
+            self._matrix = np.zeros((0, self._dim or 0), dtype=self.dtype)
+
+    def _read_record(self, row: int) -> Dict[str, Any]:
+        start, length = self._offsets[row]
+        record = json.loads(os.pread(self._records_fd, int(length), int(start)).decode("utf-8"))
+        if row in self._metadata:
+            record["metadata"] = self._metadata[row]
+        return record
+
+    def _index_rows(self, rows: List[int], metadatas: List[Dict[str, Any]]):
+        for key, value_rows in self._value_rows.items():
+            row_values = self._row_values[key]
+            for row, meta in zip(rows, metadatas):
+                value = meta.get(key)
+                row_values[row] = value
+                value_rows.setdefault(value, set()).add(row)
+
+    def _unindex_rows(self, rows: List[int]):
+        for key, value_rows in self._value_rows.items():
+            row_values = self._row_values[key]
+            for row in rows:
+                if row in row_values:
+                    value = row_values.pop(row)
+                    value_rows[value].discard(row)
+                    if not value_rows[value]:
+                        del value_rows[value]
+
+    def _rows_with(self, key: str, value: Any) -> Set[int]:
+        if key not in self._value_rows:
+            # One scan of the records, then the index is maintained on every write
+            self._value_rows[key] = {}
+            self._row_values[key] = {}
+            rows = list(self._row_of.values())
+            for start in range(0, len(rows), 5000):
+                page = rows[start:start + 5000]
+                self._index_rows(page, [self._read_record(row)["metadata"] for row in page])
+        return self._value_rows[key].get(value, set())
+
+    # Storage primitives
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def _get_metadatas(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = {doc_id: self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of}
+            return {doc_id: self._read_record(row)["metadata"] for doc_id, row in rows.items()}
+
+    def _get_documents(self, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            found = {}
+            for doc_id in ids:
+                row = self._row_of.get(doc_id)
+                if row is not None:
+                    record = self._read_record(row)
+                    found[doc_id] = (record["content"], record["metadata"])
+            return found
+
+    def _upsert(self, ids: List[str], embeddings: List[np.ndarray], texts: List[str], metadatas: List[Dict[str, Any]]):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = (matrix / np.where(norms == 0, 1.0, norms)).astype(self.dtype)
+        with self._lock:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                with open(self._path("header.json"), 'w') as f:
+                    json.dump({"dim": self._dim, "dtype": self.dtype.name}, f)
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self._dim}")
+
+            # Replaced IDs are tombstoned and appended again
+            self._tombstone([self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of])
+
+            record_start = os.path.getsize(self._path("records.bin"))
+            offsets = []
+            with open(self._path("records.bin"), 'ab') as f:
+                for doc_id, text, meta in zip(ids, texts, metadatas):
+                    record = json.dumps({"id": doc_id, "content": text, "metadata": meta}, ensure_ascii=False).encode("utf-8")
+                    f.write(record)
+                    offsets.append((record_start, len(record)))
+                    record_start += len(record)
+            with open(self._path("vectors.bin"), 'ab') as f:
+                f.write(matrix.tobytes())
+            with open(self._path("ids.txt"), 'a', encoding='utf-8') as f:
+                f.write("".join(f"{doc_id}\n" for doc_id in ids))
+            with open(self._path("alive.bin"), 'ab') as f:
+                f.write(b"\x01" * len(ids))
+            new_offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+            with open(self._path("offsets.bin"), 'ab') as f:
+                f.write(new_offsets.tobytes())
+
+            first_row = len(self._ids)
+            self._ids.extend(ids)
+            self._alive = np.concatenate((self._alive, np.ones(len(ids), dtype=np.uint8)))
+            self._offsets = np.concatenate((self._offsets, new_offsets))
+            for i, doc_id in enumerate(ids):
+                self._row_of[doc_id] = first_row + i
+            self._index_rows(list(range(first_row, first_row + len(ids))), metadatas)
+            self._map_matrix()
+            self._maybe_compact()
+
+    def _update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        # Records and vectors stay where they are; the side table overrides the metadata
+        with self._lock:
+            updates = [(self._row_of[doc_id], meta) for doc_id, meta in zip(ids, metadatas) if doc_id in self._row_of]
+            if not updates:
+                return
+            with open(self._path("metadata.jsonl"), 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps({"row": row, "metadata": meta}, ensure_ascii=False) + "\n" for row, meta in updates))
+            rows = [row for row, _ in updates]
+            self._unindex_rows(rows)
+            for row, meta in updates:
+                self._metadata[row] = meta
+            self._index_rows(rows, [meta for _, meta in updates])
+            self._metadata_updates += len(updates)
+            self._maybe_compact()
+
+    def _tombstone(self, rows: List[int]):
+        if not rows:
+            return
+        with open(self._path("alive.bin"), 'r+b') as f:
+            for row in rows:
+                self._alive[row] = 0
+                f.seek(row)
+                f.write(b"\x00")
+        for row in rows:
+            self._row_of.pop(self._ids[row], None)
+            self._metadata.pop(row, None)
+        self._unindex_rows(rows)
+
+    def _delete(self, ids: List[str]):
+        with self._lock:
+            self._tombstone([self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of])
+            self._maybe_compact()
+
+    def _ids_where(self, where: Dict[str, Any]) -> List[str]:
+        # Only plain equality filters are supported, which is all the ingestion code uses
+        with self._lock:
+            rows: Optional[Set[int]] = None
+            for key, value in where.items():
+                matching = self._rows_with(key, value)
+                rows = set(matching) if rows is None else rows & matching
+            if rows is None:
+                rows = set(self._row_of.values())
+            return [self._ids[row] for row in sorted(rows)]
+
+    def _search(self, query_embeddings: List[np.ndarray], top_k: int) -> List[List[Tuple[str, str, Dict[str, Any], float]]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+        with self._lock:
+            matrix, alive = self._matrix, self._alive
+            k = min(top_k, len(self._row_of))
+            if k <= 0:
+                return [[] for _ in query_embeddings]
+            best_scores = np.empty((len(queries), 0), dtype=np.float32)
+            best_rows = np.empty((len(queries), 0), dtype=np.int64)
+            for start in range(0, len(matrix), self.block_rows):
+                block = np.asarray(matrix[start:start + self.block_rows], dtype=np.float32)
+                sims = queries @ block.T
+                sims[:, alive[start:start + len(block)] == 0] = -np.inf
+                scores = np.concatenate((best_scores, sims), axis=1)
+                rows = np.concatenate((best_rows, np.broadcast_to(np.arange(start, start + len(block)), sims.shape)), axis=1)
+                if scores.shape[1] > k:
+                    keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                    scores = np.take_along_axis(scores, keep, axis=1)
+                    rows = np.take_along_axis(rows, keep, axis=1)
+                best_scores, best_rows = scores, rows
+
+            results = []
+            for scores, rows in zip(best_scores, best_rows):
+                order = np.argsort(-scores)
+                hits = []
+                for i in order:
+                    if not np.isfinite(scores[i]):
+                        continue
+                    record = self._read_record(int(rows[i]))
+                    # Report cosine distance like the Chroma collection does
+                    hits.append((record["id"], record["content"], record["metadata"], float(1.0 - scores[i])))
+                results.append(hits)
+            return results
+
+    def iter_documents(self, page_size: int = 5000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        with self._lock:
+            rows = [row for row in range(len(self._ids)) if self._alive[row]]
+        for start in range(0, len(rows), page_size):
+            with self._lock:
+                records = [self._read_record(row) for row in rows[start:start + page_size] if self._alive[row]]
+            yield ([r["id"] for r in records], [r["content"] for r in records], [r["metadata"] for r in records])
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._row_of)
+        limit = max(1000, len(self._ids) * 0.3)
+        if dead > limit or self._metadata_updates > limit:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the store without tombstoned rows, folding the metadata side table into the records."""
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            tmp_dir = f"{self.storage_prefix}.compact"
+            os.makedirs(tmp_dir, exist_ok=True)
+            offsets = []
+            position = 0
+            with open(os.path.join(tmp_dir, "records.bin"), 'wb') as f:
+                for row in rows:
+                    if row in self._metadata:
+                        record = json.dumps(self._read_record(row), ensure_ascii=False).encode("utf-8")
+                    else:
+                        start, length = self._offsets[row]
+                        record = os.pread(self._records_fd, int(length), int(start))
+                    f.write(record)
+                    offsets.append((position, len(record)))
+                    position += len(record)
+            with open(os.path.join(tmp_dir, "vectors.bin"), 'wb') as f:
+                for start in range(0, len(rows), self.block_rows):
+                    f.write(np.asarray(self._matrix[rows[start:start + self.block_rows]], dtype=self.dtype).tobytes())
+            ids = [self._ids[row] for row in rows]
+            with open(os.path.join(tmp_dir, "ids.txt"), 'w', encoding='utf-8') as f:
+                f.write("".join(f"{doc_id}\n" for doc_id in ids))
+            with open(os.path.join(tmp_dir, "alive.bin"), 'wb') as f:
+                f.write(b"\x01" * len(rows))
+            new_offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+            with open(os.path.join(tmp_dir, "offsets.bin"), 'wb') as f:
+                f.write(new_offsets.tobytes())
+            open(os.path.join(tmp_dir, "metadata.jsonl"), 'wb').close()
+
+            # Swap offsets first-to-last in reverse dependency order: an empty
+            # offsets table is always a valid (if empty) store
+            os.close(self._records_fd)
+            self._matrix = np.zeros((0, self._dim or 0), dtype=self.dtype)
+            os.truncate(self._path("offsets.bin"), 0)
+            for name in ("records.bin", "vectors.bin", "ids.txt", "alive.bin", "metadata.jsonl", "offsets.bin"):
+                os.replace(os.path.join(tmp_dir, name), self._path(name))
+            os.rmdir(tmp_dir)
+
+            self._ids = ids
+            self._alive = np.ones(len(rows), dtype=np.uint8)
+            self._offsets = new_offsets
+            self._row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+            self._metadata = {}
+            self._metadata_updates = 0
+            # Row numbers changed; indexes are rebuilt on their next use
+            self._value_rows = {}
+            self._row_values = {}
+            self._records_fd = os.open(self._path("records.bin"), os.O_RDONLY)
+            self._map_matrix()
+            print(f"Compacted NumPy vector store to {len(rows)} documents")
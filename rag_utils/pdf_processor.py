@@ -1,22 +1,32 @@
 import os
-from typing import List, Dict, Any
+import re
+import zlib
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import PyPDF2
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract all text from a PDF file."""
+def iter_pdf_pages(pdf_path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (page number, text) for each page of a PDF as it is decoded."""
     with open(pdf_path, 'rb') as file:
         reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page_num in range(len(reader.pages)):
-            page = reader.pages[page_num]
-            text += page.extract_text() + "\n"
-    return text
+        for page_num, page in enumerate(reader.pages, start=1):
+            yield page_num, page.extract_text() or ""
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Extract all text from a PDF file."""
+    return "".join(text + "\n" for _, text in iter_pdf_pages(pdf_path))
 
 
 def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
-    """Split text into chunks for processing."""
+    """
+    Split text into chunks for processing.
+
+    Used for web pages and other one-off text. Files in the document
+    directory are chunked by split_pages instead, whose content-defined
+    boundaries keep re-ingestion of edited files incremental.
+    """
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
@@ -26,35 +36,177 @@ def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
     return chunks
 
 
+# Ends of sentences, used to break lines that are too long to be one segment
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？])|(?<=[.!?;]\s)")
+
+
+def _iter_segments(pages: Iterable[Tuple[int, str]], max_length: int) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (segment, page number): the lines of each page, with lines longer
+    than max_length broken into sentences, and sentences longer than
+    max_length at word boundaries.
+
+    Segments depend only on the sentence they come from, so an edit changes
+    only the segments of the sentences it touches.
+    """
+    word_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=max_length,
+        chunk_overlap=0,
+        separators=[" ", ""],
+        keep_separator="end",
+        strip_whitespace=False,
+        length_function=len,
+    )
+    for page_num, text in pages:
+        for line in (text + "\n").splitlines(keepends=True):
+            if len(line) <= max_length:
+                yield line, page_num
+                continue
+            for sentence in _SENTENCE_END_RE.split(line):
+                if len(sentence) <= max_length:
+                    if sentence:
+                        yield sentence, page_num
+                else:
+                    for piece in word_splitter.split_text(sentence):
+                        yield piece, page_num
+
+
+def _is_cut_point(segment: str, spacing: int) -> bool:
+    # A segment ends a chunk with probability len / spacing, decided by a hash of
+    # its own text, so the same text is a cut point wherever it moves to. Blank
+    # lines all hash alike and never are.
+    text = segment.strip()
+    return bool(text) and zlib.crc32(text.encode("utf-8")) % spacing < len(segment)
+
+
+def split_pages(pages: Iterable[Tuple[int, str]], chunk_size: int = 1000,
+                chunk_overlap: int = 200) -> Iterator[Tuple[str, int, int]]:
+    """
+    Split a stream of pages into chunks with content-defined boundaries.
+
+    The text is cut into segments (lines, or sentences of long lines) that
+    are packed into chunks. A chunk ends after a segment whose hash marks it
+    as a cut point, or before a segment that would overflow it. Cut points
+    depend on the text of the segment, not on its position in the document,
+    so inserting or deleting a line only changes the chunk containing it (and
+    the overlap of the next one) instead of shifting every later boundary.
+    Only the current chunk is buffered.
+
+    Args:
+        pages: Iterable of (page number, text) pairs, e.g. from iter_pdf_pages
+        chunk_size: Maximum size of each text chunk, overlap included
+        chunk_overlap: Text of the previous chunk repeated at the start of each chunk
+
+    Yields:
+        (chunk text, first page number, last page number)
+    """
+    chunk_overlap = min(chunk_overlap, chunk_size // 2)
+    body_size = chunk_size - chunk_overlap
+    # Cut points in the first third of a chunk are skipped to avoid small chunks.
+    # This is the only position-dependent rule, so boundaries fall back in step
+    # at the first cut point after an edit.
+    min_body = body_size // 3
+    # Expected distance between cut points past min_body; with the overlap the
+    # mean chunk is about 2/3 of chunk_size
+    spacing = max(1, body_size // 2)
+
+    overlap = ""
+    segments: List[Tuple[str, int]] = []
+    length = 0
+
+    def emit() -> Iterator[Tuple[str, int, int]]:
+        nonlocal overlap, segments, length
+        body = "".join(segment for segment, _ in segments)
+        pages_with_text = [page for segment, page in segments if segment.strip()]
+        if pages_with_text:
+            yield (overlap + body).strip(), pages_with_text[0], pages_with_text[-1]
+            overlap = _tail(segments, chunk_overlap)
+        segments, length = [], 0
+
+    for segment, page_num in _iter_segments(pages, spacing):
+        if segments and length + len(segment) > body_size:
+            yield from emit()
+        segments.append((segment, page_num))
+        length += len(segment)
+        if length >= min_body and _is_cut_point(segment, spacing):
+            yield from emit()
+    if segments:
+        yield from emit()
+
+
+def _tail(segments: List[Tuple[str, int]], max_length: int) -> str:
+    """The last whole segments of a chunk that fit in max_length, or its last max_length characters."""
+    if max_length <= 0:
+        return ""
+    tail: List[str] = []
+    length = 0
+    for segment, _ in reversed(segments):
+        if length + len(segment) > max_length:
+            break
+        tail.append(segment)
+        length += len(segment)
+    if not tail:
+        return segments[-1][0][-max_length:]
+    return "".join(reversed(tail))
+
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+# Bumped whenever chunk boundaries or chunk metadata change, so the ingestion
+# manifest re-chunks files that were ingested with an older version
+CHUNKER_VERSION = 4
+
+
+def iter_document_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (page number, text) for a PDF page by page, or the whole text of a text file as page 1."""
+    if file_path.endswith(".pdf"):
+        # Stream pages straight into the chunker instead of building one big string
+        yield from iter_pdf_pages(file_path)
+    else:
+        with open(file_path, 'r') as f:
+            yield 1, f.read()
+
+
+def process_document_file(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[Dict[str, Any]]:
+    """Extract and split a single PDF or text file, yielding document chunks as they are split."""
+    if not file_path.endswith(SUPPORTED_EXTENSIONS):
+        return iter(())  # Skip unsupported file types
+    return iter_chunk_documents(file_path, iter_document_pages(file_path),
+                                chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def iter_chunk_documents(file_path: str, pages: Iterable[Tuple[int, str]],
+                         chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[Dict[str, Any]]:
+    """Yield document entries for each chunk of a file as the page stream is split."""
+    with_pages = file_path.endswith(".pdf")
+    chunks = split_pages(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for i, (chunk, first_page, last_page) in enumerate(chunks):
+        yield make_chunk_document(file_path, i, chunk, (first_page, last_page) if with_pages else None)
+
+
+def make_chunk_document(file_path: str, index: int, chunk: str,
+                        pages: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Create the document entry for one chunk of a file, with its page range when known."""
+    doc = {
+        "content": chunk,
+        "metadata": {
+            "source": os.path.basename(file_path),
+            "chunk": index,
+            "path": file_path
+        }
+    }
+    if pages:
+        doc["metadata"]["page"], doc["metadata"]["page_end"] = pages
+    return doc
+
+
 def process_pdf_documents(pdf_dir: str) -> List[Dict[str, Any]]:
     """Process all PDF and text documents in a directory."""
     documents = []
     for filename in os.listdir(pdf_dir):
         file_path = os.path.join(pdf_dir, filename)
         try:
-            # Extract text based on file type
-            if filename.endswith(".pdf"):
-                text = extract_text_from_pdf(file_path)
-            elif filename.endswith(".txt"):
-                with open(file_path, 'r') as f:
-                    text = f.read()
-            else:
-                continue  # Skip unsupported file types
-            
-            # Split text into chunks
-            chunks = split_text(text)
-            
-            # Create document entries for each chunk
-            for i, chunk in enumerate(chunks):
-                doc = {
-                    "content": chunk,
-                    "metadata": {
-                        "source": filename,
-                        "chunk": i,
-                        "path": file_path
-                    }
-                }
-                documents.append(doc)
+            documents.extend(process_document_file(file_path))
         except Exception as e:
             print(f"Error processing {filename}: {e}")
     
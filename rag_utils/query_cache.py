@@ -0,0 +1,91 @@
+from typing import List, Dict, Any, Callable
+from collections import OrderedDict
+import re
+import threading
+import unicodedata
+import numpy as np
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query so trivially different spellings share one cache entry.
+
+    NFKC folds full-width ASCII and half-width katakana to their canonical
+    forms (and the ideographic space to a plain space); runs of whitespace
+    are then collapsed and the ends trimmed.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class QueryEmbeddingCache:
+    def __init__(self, embed_fn: Callable[[List[str]], List[np.ndarray]], max_size: int = 4096):
+        """
+        In-process LRU cache of query embeddings keyed by the normalized query.
+
+        Args:
+            embed_fn: Function embedding a batch of texts; pass a disk-cached
+                embedder to persist query embeddings across restarts
+            max_size: Maximum number of cached queries
+        """
+        self.embed_fn = embed_fn
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> np.ndarray:
+        return self.get_many([query])[0]
+
+    def get_many(self, queries: List[str]) -> List[np.ndarray]:
+        """
+        Return embeddings for the queries, embedding all misses in one batch.
+
+        Args:
+            queries: Raw query strings
+
+        Returns:
+            One float32 vector per query, in input order
+        """
+        keys = [normalize_query(query) for query in queries]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            vectors = self.embed_fn(missing)
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    found[key] = vector
+                    self._entries[key] = vector
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,12 +1,19 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, AsyncIterator, Tuple
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from urllib.parse import urlparse
+import os
 import re
-from rag_utils.vector_store import VectorStore, initialize_vector_store
+from rag_utils.ingest_jobs import IngestJobQueue
+from rag_utils.vector_store import VectorStore, initialize_vector_store, content_hash
 from rag_utils.web_processor import WebContentProcessor
 
 class RagService:
-    def __init__(self, pdf_dir: str, collection_name: str = "documents", chroma_db_dir: str = "./chroma_db", web_cache_dir: str = "./web_cache"):
+    def __init__(self, pdf_dir: str, collection_name: str = "documents", chroma_db_dir: str = "./chroma_db", web_cache_dir: str = "./web_cache",
+                 search_workers: int = 4, retrieval_mode: str = "vector", vector_backend: str = "chroma",
+                 url_ingest_mode: str = "inline", ingest_workers: int = 2, lexical_match_thresh: float = 0.4):
         """
         Initialize the RAG service with a vector store.
         
@@ -15,15 +22,35 @@ class RagService:
             collection_name: Name of the ChromaDB collection
             chroma_db_dir: Directory to store the vector database
             web_cache_dir: Directory to cache web content
+            search_workers: Threads used by the async API for embedding and search
+            retrieval_mode: Default retrieval mode, "vector" or "hybrid" (vector + BM25 fused by reciprocal rank)
+            vector_backend: "chroma" (HNSW) or "numpy" (exact search over a memory-mapped matrix)
+            url_ingest_mode: How URLs found in queries are ingested: "inline" (before
+                answering) or "background" (queued as jobs, the answer does not wait)
+            ingest_workers: Worker threads of the background ingestion job queue
+            lexical_match_thresh: Minimum 'bm25_match' (idf-weighted share of the query
+                terms) for a hybrid hit below the vector score threshold to be kept
         """
         self.vector_store = initialize_vector_store(
             pdf_dir=pdf_dir,
             collection_name=collection_name,
-            chroma_db_dir=chroma_db_dir
+            chroma_db_dir=chroma_db_dir,
+            backend=vector_backend
         )
         self.web_processor = WebContentProcessor(cache_dir=web_cache_dir)
+        self.retrieval_mode = self._check_mode(retrieval_mode)
+        self.lexical_match_thresh = lexical_match_thresh
+        # Bounded pool for the async API so embedding/search never runs on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="rag-search")
+        if url_ingest_mode not in ("inline", "background"):
+            raise ValueError(f"Unknown URL ingest mode: {url_ingest_mode}")
+        self.url_ingest_mode = url_ingest_mode
+        self.jobs = IngestJobQueue(os.path.join(chroma_db_dir, "ingest_jobs.sqlite3"), workers=ingest_workers)
+        self.jobs.register("url", self._run_url_job)
+        self.jobs.start()
     
-    def retrieve_context(self, query: str, max_documents: int = 10, retrieve_score_thresh: float = 0.8) -> str:
+    def retrieve_context(self, query: str, max_documents: int = 10, retrieve_score_thresh: float = 0.8,
+                         mode: Optional[str] = None) -> str:
         """
         Retrieve relevant context for the given query.
         
@@ -31,24 +58,68 @@ class RagService:
             query: The user's query to find relevant information for
             max_documents: Maximum number of documents to include in the context
             retrieve_score_thresh: Minimum similarity score threshold for retrieved documents (0.0 to 1.0)
+            mode: "vector" or "hybrid"; defaults to the service's retrieval_mode
         
         Returns:
             String containing concatenated relevant document content
         """
-        documents = self.vector_store.query(query, top_k=max_documents)
+        if self._check_mode(mode or self.retrieval_mode) == "hybrid":
+            documents = self.vector_store.hybrid_query(query, top_k=max_documents)
+        else:
+            documents = self.vector_store.query(query, top_k=max_documents)
+        return self._format_context(self._filter_documents(documents, retrieve_score_thresh))
+    
+    def retrieve_context_many(self, queries: List[str], max_documents: int = 10, retrieve_score_thresh: float = 0.8,
+                              mode: Optional[str] = None) -> List[str]:
+        """
+        Retrieve relevant context for several queries with a single batched vector search
+        (in hybrid mode too; only the BM25 lookups run per query).
+        
+        Args:
+            queries: The queries to find relevant information for
+            max_documents: Maximum number of documents to include in each context
+            retrieve_score_thresh: Minimum similarity score threshold for retrieved documents (0.0 to 1.0)
+            mode: "vector" or "hybrid"; defaults to the service's retrieval_mode
         
+        Returns:
+            One context string per query, in input order
+        """
+        if self._check_mode(mode or self.retrieval_mode) == "hybrid":
+            results = self.vector_store.hybrid_query_many(queries, top_k=max_documents)
+        else:
+            results = self.vector_store.query_many(queries, top_k=max_documents)
+        return [self._format_context(self._filter_documents(documents, retrieve_score_thresh)) for documents in results]
+    
+    @staticmethod
+    def _check_mode(mode: str) -> str:
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        return mode
+    
+    def _keep_document(self, doc: Dict[str, Any], retrieve_score_thresh: float) -> bool:
+        if doc.get('score', 0) >= retrieve_score_thresh:
+            return True
+        # Lexical hits (hybrid mode) below the vector threshold must match enough of the
+        # query; any BM25 hit would let a single shared bigram through
+        return doc.get('bm25_match', 0.0) >= self.lexical_match_thresh
+    
+    def _filter_documents(self, documents: List[Dict[str, Any]], retrieve_score_thresh: float) -> List[Dict[str, Any]]:
         # Filter documents by score threshold
         if documents and retrieve_score_thresh > 0.0:
-            filtered_documents = [doc for doc in documents if doc.get('score', 0) >= retrieve_score_thresh]
+            filtered_documents = [doc for doc in documents if self._keep_document(doc, retrieve_score_thresh)]
             print(f"Filtered documents from {len(documents)} to {len(filtered_documents)} using score threshold {retrieve_score_thresh}")
             
             # Print scores for debugging
             for i, doc in enumerate(documents):
                 score = doc.get('score', 0)
-                print(f"Document {i+1} score: {score:.4f} {'(kept)' if score >= retrieve_score_thresh else '(filtered)'}")
+                kept = self._keep_document(doc, retrieve_score_thresh)
+                lexical = f", bm25 match {doc['bm25_match']:.2f}" if 'bm25_match' in doc else ""
+                print(f"Document {i+1} score: {score:.4f}{lexical} {'(kept)' if kept else '(filtered)'}")
                 
             documents = filtered_documents
-        
+        return documents
+    
+    def _format_context(self, documents: List[Dict[str, Any]]) -> str:
         if not documents:
             return ""
         
@@ -63,11 +134,29 @@ class RagService:
             
             if doc_type == "web":
                 context_str += f"[Document {i+1} from web: {title} ({source}), score = {score}]\n{doc['content']}\n\n"
+            elif "page" in doc["metadata"]:
+                page = doc["metadata"]["page"]
+                page_end = doc["metadata"].get("page_end", page)
+                pages = f"p.{page}" if page == page_end else f"pp.{page}-{page_end}"
+                context_str += f"[Document {i+1} from {source} {pages}, score = {score}]\n{doc['content']}\n\n"
             else:
                 context_str += f"[Document {i+1} from {source}, score = {score}]\n{doc['content']}\n\n"
         
         return context_str
     
+    async def aretrieve_context(self, query: str, max_documents: int = 10, retrieve_score_thresh: float = 0.8,
+                                mode: Optional[str] = None) -> str:
+        """
+        Async variant of retrieve_context.
+        
+        Embedding and vector search run on the service's bounded executor so
+        the event loop stays free for other connections.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(self.retrieve_context, query, max_documents, retrieve_score_thresh, mode)
+        )
+    
     def answer_with_rag(self, query: str, system_prompt: Optional[str] = None, retrieve_score_thresh: float = 0.5) -> str:
         """
         Answer a query using the RAG approach.
@@ -85,7 +174,18 @@ class RagService:
         
         # Retrieve relevant context
         context = self.retrieve_context(query, retrieve_score_thresh=retrieve_score_thresh)
-        
+        return self._build_augmented_query(query, context)
+    
+    async def aanswer_with_rag(self, query: str, system_prompt: Optional[str] = None, retrieve_score_thresh: float = 0.5) -> str:
+        """
+        Async variant of answer_with_rag: URLs are fetched with async HTTP and
+        retrieval runs on the service's executor.
+        """
+        await self._aprocess_urls_in_query(query)
+        context = await self.aretrieve_context(query, retrieve_score_thresh=retrieve_score_thresh)
+        return self._build_augmented_query(query, context)
+    
+    def _build_augmented_query(self, query: str, context: str) -> str:
         # Augment the user query with context
         augmented_query = ""
         if len(context) > 0:
@@ -106,6 +206,13 @@ class RagService:
         
         return augmented_query
     
+    def _find_urls(self, query: str) -> List[str]:
+        # Simple URL regex pattern
+        url_pattern = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[\w/\-?=%.#&]*'
+        
+        # Find all URLs in the query
+        return re.findall(url_pattern, query)
+    
     def _process_urls_in_query(self, query: str) -> None:
         """
         Process URLs found in the query and add them to the knowledge base.
@@ -113,53 +220,250 @@ class RagService:
         Args:
             query: The user's query that might contain URLs
         """
-        # Simple URL regex pattern
-        url_pattern = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[\w/\-?=%.#&]*'
-        
-        # Find all URLs in the query
-        urls = re.findall(url_pattern, query)
+        for url in self._find_urls(query):
+            if self.url_ingest_mode == "background":
+                self.enqueue_url(url)
+            else:
+                self.add_web_url(url)
+    
+    async def _aprocess_urls_in_query(self, query: str) -> None:
+        """Async variant of _process_urls_in_query; URLs are fetched concurrently."""
+        urls = list(dict.fromkeys(self._find_urls(query)))
+        if self.url_ingest_mode == "background":
+            for url in urls:
+                self.enqueue_url(url)
+        elif urls:
+            await asyncio.gather(*(self.aadd_web_url(url) for url in urls))
+    
+    def enqueue_url(self, url: str) -> str:
+        """
+        Queue a URL for ingestion by the background workers.
         
-        for url in urls:
-            self.add_web_url(url)
+        Args:
+            url: The URL to process and add
+            
+        Returns:
+            ID of the ingestion job; a URL already queued or running returns the existing job
+        """
+        job_id = self.jobs.enqueue("url", {"url": url}, dedupe_key=url)
+        print(f"Queued URL {url} as job {job_id}")
+        return job_id
+    
+    def _run_url_job(self, payload: Dict[str, Any], report_progress) -> Dict[str, Any]:
+        url = payload["url"]
+        report_progress(0.1, "fetching")
+        result = self.web_processor.extract_content_from_url(url)
+        if "error" in result["metadata"]:
+            raise RuntimeError(result["metadata"]["error"])
+        report_progress(0.5, "indexing")
+        if self._ingest_web_result(url, result) == "error":
+            raise RuntimeError(f"No content could be indexed from {url}")
+        source = self.vector_store.registry.get(url) or {}
+        return {"url": url, "title": source.get("title"), "chunks": source.get("chunk_count", 0)}
             
     def add_web_url(self, url: str) -> bool:
         """
         Process a web URL and add its content to the vector store.
         
+        Pages that are already indexed with the same content are left alone,
+        so a URL repeated across chat messages costs a cache lookup only.
+        
         Args:
             url: The URL to process and add
             
         Returns:
-            True if successful, False otherwise
+            True if the page is indexed (now or already), False otherwise
         """
         try:
             print(f"Processing URL: {url}")
-            
-            # Process URL to get chunks
-            chunks = self.web_processor.process_url_to_chunks(url)
-            
-            # Add documents to vector store if chunks were generated
-            if chunks:
-                print(f"Generated {len(chunks)} chunks from URL: {url}")
-                
-                # Log chunk info for debugging
-                for i, chunk in enumerate(chunks[:2]):  # Log first 2 chunks
-                    print(f"Chunk {i} metadata: {chunk['metadata']}")
-                    print(f"Chunk {i} content snippet: {chunk['content'][:100]}...")
-                
-                # Add to vector store
-                self.vector_store.add_documents(chunks)
-                
-                # Verify chunks were added
-                doc_count = self.vector_store.collection.count()
-                print(f"Vector store now contains {doc_count} documents")
-                
-                return True
-            else:
-                print(f"No chunks generated from URL: {url}")
-                return False
+            result = self.web_processor.extract_content_from_url(url)
+            return self._ingest_web_result(url, result) != "error"
         except Exception as e:
             import traceback
             print(f"Error adding URL {url}: {e}")
             traceback.print_exc()
-            return False
\ No newline at end of file
+            return False
+    
+    async def aadd_web_url(self, url: str) -> bool:
+        """
+        Async variant of add_web_url: the page is fetched with async HTTP and
+        chunking and embedding run on the service's executor.
+        """
+        try:
+            print(f"Processing URL: {url}")
+            result = await self.web_processor.aextract_content_from_url(url)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._ingest_web_result, url, result) != "error"
+        except Exception as e:
+            import traceback
+            print(f"Error adding URL {url}: {e}")
+            traceback.print_exc()
+            return False
+    
+    def _ingest_web_result(self, url: str, result: Dict[str, Any]) -> str:
+        # Returns "added", "unchanged" (same text already indexed) or "error"
+        # Failed fetches are reported, never indexed as documents
+        if "error" in result["metadata"]:
+            print(f"Not indexing {url}: {result['metadata']['error']}")
+            return "error"
+        
+        page_hash = content_hash(result["content"])
+        source = self.vector_store.registry.get(url)
+        if source and source["content_hash"] == page_hash:
+            print(f"URL already indexed and unchanged: {url}")
+            return "unchanged"
+        
+        chunks = self.web_processor.split_result(result)
+        return "added" if self._add_web_chunks(url, chunks, page_hash) else "error"
+    
+    def _add_web_chunks(self, url: str, chunks: List[Dict[str, Any]], page_hash: str) -> bool:
+        # Add documents to vector store if chunks were generated
+        if chunks:
+            print(f"Generated {len(chunks)} chunks from URL: {url}")
+            
+            # Log chunk info for debugging
+            for i, chunk in enumerate(chunks[:2]):  # Log first 2 chunks
+                print(f"Chunk {i} metadata: {chunk['metadata']}")
+                print(f"Chunk {i} content snippet: {chunk['content'][:100]}...")
+            
+            # Add to vector store, then drop chunks of an earlier version of the page
+            old_ids = self.vector_store.registry.chunk_ids(url)
+            new_ids = self.vector_store.add_documents(chunks)
+            if not new_ids:
+                return False
+            kept = set(new_ids)
+            self.vector_store.delete_ids([old_id for old_id in old_ids if old_id not in kept])
+            self.vector_store.registry.set_content_hash(url, page_hash)
+            
+            # Verify chunks were added
+            doc_count = self.vector_store.count()
+            print(f"Vector store now contains {doc_count} documents")
+            
+            return True
+        else:
+            print(f"No chunks generated from URL: {url}")
+            return False
+    
+    async def aadd_web_urls(self, urls: List[str], batch_size: int = 256) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ingest many URLs concurrently, yielding one result per URL as it completes.
+        
+        All pages are fetched at once within the fetcher's global and per-host
+        limits. Chunks of completed pages are collected and embedded in
+        batches of about batch_size chunks while the remaining fetches go on.
+        
+        Args:
+            urls: URLs to ingest; duplicates are processed once
+            batch_size: Number of chunks embedded and written per batch
+            
+        Yields:
+            {"url", "status": "added" | "unchanged" | "error", "chunks", "error"} per URL
+        """
+        loop = asyncio.get_running_loop()
+        pending = {
+            asyncio.ensure_future(self.web_processor.aextract_content_from_url(url)): url
+            for url in dict.fromkeys(urls)
+        }
+        batch: List[Tuple[str, List[Dict[str, Any]], str]] = []
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        yield {"url": url, "status": "error", "chunks": 0, "error": str(e)}
+                        continue
+                    if "error" in result["metadata"]:
+                        yield {"url": url, "status": "error", "chunks": 0, "error": result["metadata"]["error"]}
+                        continue
+                    page_hash = content_hash(result["content"])
+                    source = self.vector_store.registry.get(url)
+                    if source and source["content_hash"] == page_hash:
+                        yield {"url": url, "status": "unchanged", "chunks": source["chunk_count"], "error": None}
+                        continue
+                    chunks = await asyncio.to_thread(self.web_processor.split_result, result)
+                    batch.append((url, chunks, page_hash))
+                
+                # Flush when a batch is full or nothing else is coming; fetches continue meanwhile
+                if batch and (not pending or sum(len(chunks) for _, chunks, _ in batch) >= batch_size):
+                    for item in await loop.run_in_executor(self._executor, self._add_web_batch, batch):
+                        yield item
+                    batch = []
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _add_web_batch(self, batch: List[Tuple[str, List[Dict[str, Any]], str]]) -> List[Dict[str, Any]]:
+        # One add_documents call embeds the chunks of every page in the batch together
+        old_ids = {url: self.vector_store.registry.chunk_ids(url) for url, _, _ in batch}
+        all_chunks = [chunk for _, chunks, _ in batch for chunk in chunks]
+        ids = self.vector_store.add_documents(all_chunks)
+        results = []
+        offset = 0
+        for url, chunks, page_hash in batch:
+            if not ids or not chunks:
+                results.append({"url": url, "status": "error", "chunks": 0, "error": "failed to index content"})
+                continue
+            kept = set(ids[offset:offset + len(chunks)])
+            offset += len(chunks)
+            self.vector_store.delete_ids([old_id for old_id in old_ids[url] if old_id not in kept])
+            self.vector_store.registry.set_content_hash(url, page_hash)
+            results.append({"url": url, "status": "added", "chunks": len(chunks), "error": None})
+        return results
+    
+    def refresh_web_urls(self, urls: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Synchronous entry point of arefresh_web_urls for code outside an event loop.
+        """
+        async def run():
+            try:
+                return await self.arefresh_web_urls(urls)
+            finally:
+                await self.web_processor.aclose()
+        return asyncio.run(run())
+    
+    async def arefresh_web_urls(self, urls: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Revalidate indexed web pages and re-index only the ones that changed.
+        
+        Cached pages are checked with conditional requests (ETag /
+        Last-Modified); pages still fresh per their max-age are not requested
+        at all, and a 304 skips parsing, chunking and embedding. A page
+        re-downloaded with identical text is not re-indexed either and is
+        counted as unchanged.
+        
+        Args:
+            urls: URLs to refresh; defaults to every web source in the knowledge base
+            
+        Returns:
+            Number of URLs per outcome: fresh, not_modified, unchanged, updated, failed
+        """
+        if urls is None:
+            urls = [source["source"] for source in self.vector_store.registry.list_sources("web")]
+        counts = {"fresh": 0, "not_modified": 0, "unchanged": 0, "updated": 0, "failed": 0}
+        
+        async def refresh(url: str):
+            result = await self.web_processor.aextract_content_from_url(url, revalidate=True)
+            status = result.get("fetch_status")
+            if status == "cached":
+                counts["fresh"] += 1
+            elif status == "not_modified":
+                counts["not_modified"] += 1
+            elif status == "fetched":
+                loop = asyncio.get_running_loop()
+                outcome = await loop.run_in_executor(self._executor, self._ingest_web_result, url, result)
+                if outcome == "added":
+                    counts["updated"] += 1
+                elif outcome == "unchanged":
+                    # Re-downloaded (e.g. no validators) but the text is the same
+                    counts["unchanged"] += 1
+                else:
+                    counts["failed"] += 1
+            else:
+                counts["failed"] += 1
+        
+        await asyncio.gather(*(refresh(url) for url in urls))
+        print(f"Refreshed {len(urls)} URLs: {counts}")
+        return counts
@@ -0,0 +1,163 @@
+from typing import List, Dict, Any, Optional
+import os
+import sqlite3
+import threading
+import time
+
+
+def source_key(metadata: Dict[str, Any]) -> str:
+    """Key of the source a chunk belongs to: the file path, or the URL for web pages."""
+    # Files are keyed by full path so equal filenames in different folders do not collide
+    return str(metadata.get("path") or metadata.get("source", ""))
+
+
+class SourceRegistry:
+    def __init__(self, db_path: str):
+        """
+        Persistent index of the sources (files and URLs) in a collection.
+
+        Keeps one row per source with its title, domain, chunk count, ingest
+        time and content hash, plus a chunk-to-source table so deletions by
+        chunk ID keep the counts exact. Listing sources never touches the
+        vector store.
+
+        Args:
+            db_path: Path of the SQLite file holding the registry
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "source_key TEXT PRIMARY KEY, type TEXT NOT NULL, source TEXT NOT NULL, title TEXT, domain TEXT, "
+            "chunk_count INTEGER NOT NULL DEFAULT 0, content_hash TEXT, ingested_at REAL NOT NULL)"
+        )
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS source_chunks (chunk_id TEXT PRIMARY KEY, source_key TEXT NOT NULL)"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS source_chunks_source ON source_chunks (source_key)")
+        self._con.execute("CREATE INDEX IF NOT EXISTS sources_type ON sources (type)")
+        self._con.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._con.execute("SELECT 1 FROM source_chunks LIMIT 1").fetchone() is None
+
+    def add_chunks(self, chunk_ids: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        Register stored chunks under their sources, creating or refreshing source rows.
+
+        Args:
+            chunk_ids: IDs the chunks are stored under
+            metadatas: Metadata of each chunk
+        """
+        if not chunk_ids:
+            return
+        now = time.time()
+        sources: Dict[str, Dict[str, Any]] = {}
+        for metadata in metadatas:
+            sources.setdefault(source_key(metadata), metadata)
+        with self._lock:
+            self._con.executemany(
+                "INSERT INTO sources (source_key, type, source, title, domain, ingested_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(source_key) DO UPDATE SET title = excluded.title, domain = excluded.domain, "
+                "ingested_at = excluded.ingested_at",
+                [
+                    (key, meta.get("type", "file"), str(meta.get("source", key)), meta.get("title"), meta.get("domain"), now)
+                    for key, meta in sources.items()
+                ],
+            )
+            self._con.executemany(
+                "INSERT OR REPLACE INTO source_chunks (chunk_id, source_key) VALUES (?, ?)",
+                [(chunk_id, source_key(meta)) for chunk_id, meta in zip(chunk_ids, metadatas)],
+            )
+            self._refresh_counts(list(sources))
+            self._con.commit()
+
+    def remove_chunks(self, chunk_ids: List[str]):
+        """
+        Unregister deleted chunks; sources left without chunks are dropped.
+
+        Args:
+            chunk_ids: IDs of the deleted chunks
+        """
+        if not chunk_ids:
+            return
+        with self._lock:
+            touched = set()
+            # Stay well below SQLite's host parameter limit
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                touched.update(row[0] for row in self._con.execute(
+                    f"SELECT DISTINCT source_key FROM source_chunks WHERE chunk_id IN ({placeholders})", batch
+                ))
+                self._con.execute(f"DELETE FROM source_chunks WHERE chunk_id IN ({placeholders})", batch)
+            self._refresh_counts(list(touched))
+            self._con.execute("DELETE FROM sources WHERE chunk_count = 0")
+            self._con.commit()
+
+    def _refresh_counts(self, keys: List[str]):
+        self._con.executemany(
+            "UPDATE sources SET chunk_count = (SELECT COUNT(*) FROM source_chunks WHERE source_key = ?) "
+            "WHERE source_key = ?",
+            [(key, key) for key in keys],
+        )
+
+    def set_content_hash(self, key: str, content_hash: str):
+        """Record the hash of a source's full content (file bytes or extracted page text)."""
+        with self._lock:
+            self._con.execute("UPDATE sources SET content_hash = ? WHERE source_key = ?", (content_hash, key))
+            self._con.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        rows = self.list_sources(key=key)
+        return rows[0] if rows else None
+
+    def chunk_ids(self, key: str) -> List[str]:
+        """IDs of the chunks registered under a source."""
+        with self._lock:
+            return [row[0] for row in self._con.execute(
+                "SELECT chunk_id FROM source_chunks WHERE source_key = ?", (key,)
+            )]
+
+    def list_sources(self, source_type: Optional[str] = None, key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List registered sources.
+
+        Args:
+            source_type: Only return sources of this type, e.g. "web" or "file"
+            key: Only return the source with this key
+
+        Returns:
+            One dictionary per source, oldest first
+        """
+        query = "SELECT source_key, type, source, title, domain, chunk_count, content_hash, ingested_at FROM sources"
+        conditions, params = [], []
+        if source_type is not None:
+            conditions.append("type = ?")
+            params.append(source_type)
+        if key is not None:
+            conditions.append("source_key = ?")
+            params.append(key)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY rowid"
+        with self._lock:
+            rows = self._con.execute(query, params).fetchall()
+        columns = ["key", "type", "source", "title", "domain", "chunk_count", "content_hash", "ingested_at"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of sources and chunks per source type."""
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT type, COUNT(*), COALESCE(SUM(chunk_count), 0) FROM sources GROUP BY type"
+            ).fetchall()
+        return {source_type: {"sources": sources, "chunks": chunks} for source_type, sources, chunks in rows}
+
+    def close(self):
+        with self._lock:
+            self._con.close()
@@ -1,74 +1,286 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 import os
+import hashlib
 from pathlib import Path
+import numpy as np
 import chromadb
 from chromadb.utils import embedding_functions
-from rag_utils.pdf_processor import process_pdf_documents
+from rag_utils.pdf_processor import SUPPORTED_EXTENSIONS, CHUNKER_VERSION
+from rag_utils.ingest_pipeline import IngestPipeline
+from rag_utils.embedding_cache import EmbeddingCache
+from rag_utils.query_cache import QueryEmbeddingCache
+from rag_utils.bm25_index import BM25Index
+from rag_utils.ingest_manifest import IngestManifest, file_content_hash
+from rag_utils.source_registry import SourceRegistry, source_key
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of a chunk's text, used to detect unchanged chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(source: str, content: str) -> str:
+    """
+    Build a deterministic chunk ID from its source and content.
+    
+    The position of the chunk is deliberately not part of the ID, so an edit
+    near the start of a document does not change the IDs of the chunks after
+    it; identical chunks within one source share an ID and are stored once.
+    
+    Args:
+        source: Path or URL the chunk came from
+        content: Text of the chunk
+    
+    Returns:
+        ID that is stable across re-ingestion of identical content
+    """
+    source_hash = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return f"{source_hash}_{content_hash(content)[:24]}"
 
 
 class VectorStore:
-    def __init__(self, collection_name: str = "pdf_documents", data_dir: str = "./chroma_db"):
+    def __init__(self, collection_name: str = "pdf_documents", data_dir: str = "./chroma_db",
+                 query_cache_size: int = 4096, persist_query_embeddings: bool = True):
         """
         Initialize the vector store with ChromaDB.
         
         Args:
             collection_name: Name of the collection to store documents
             data_dir: Directory to store the ChromaDB persistence data
+            query_cache_size: Number of query embeddings kept in the in-process LRU
+            persist_query_embeddings: Back the query LRU with the on-disk embedding cache
         """
         # Create directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
-        
-        # Initialize ChromaDB client with persistence
-        self.client = chromadb.PersistentClient(path=data_dir)
+        self.collection_name = collection_name
+        self.data_dir = data_dir
         
         # Use the OpenAI embedding function (we could replace this with a local model)
         self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
         
+        # Embeddings are cached on disk by text hash so re-indexing costs I/O, not inference
+        model_id = getattr(self.embedding_function, "MODEL_NAME", type(self.embedding_function).__name__)
+        self.embedding_cache = EmbeddingCache(os.path.join(data_dir, "embedding_cache.sqlite3"), model_id=model_id)
+        query_embed_fn = self.embed_texts if persist_query_embeddings else self._embed_uncached
+        self.query_cache = QueryEmbeddingCache(query_embed_fn, max_size=query_cache_size)
+        
+        self._open_backend()
+        
+        # Lexical index kept alongside the collection for hybrid retrieval
+        self.bm25 = BM25Index(f"{self.storage_prefix}_bm25")
+        if len(self.bm25) == 0 and self.count() > 0:
+            self._rebuild_lexical_index()
+        
+        # Per-source index answering "which files/URLs are loaded" without scanning the collection
+        self.registry = SourceRegistry(f"{self.storage_prefix}_sources.sqlite3")
+        if self.registry.is_empty() and self.count() > 0:
+            self._rebuild_source_registry()
+    
+    @property
+    def storage_prefix(self) -> str:
+        """Path prefix for files kept alongside this collection (BM25 index, manifest)."""
+        return os.path.join(self.data_dir, self.collection_name)
+    
+    def _open_backend(self):
+        # Initialize ChromaDB client with persistence
+        self.client = chromadb.PersistentClient(path=self.data_dir)
+        
         # Try to get the collection or create a new one
         try:
-            self.collection = self.client.get_collection(name=collection_name)
-            print(f"Using existing collection: {collection_name}")
+            self.collection = self.client.get_collection(name=self.collection_name)
+            print(f"Using existing collection: {self.collection_name}")
         except:
             self.collection = self.client.create_collection(
-                name=collection_name,
+                name=self.collection_name,
                 embedding_function=self.embedding_function,
                 metadata={"hnsw:space": "cosine"}
             )
-            print(f"Created new collection: {collection_name} with cosine similarity")
-
+            print(f"Created new collection: {self.collection_name} with cosine similarity")
+    
+    # Storage primitives; NumpyVectorStore overrides these to swap the backend
+    
+    def count(self) -> int:
+        """Number of stored chunks."""
+        return self.collection.count()
+    
+    def _get_metadatas(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        existing = self.collection.get(ids=ids, include=["metadatas"])
+        return {doc_id: meta for doc_id, meta in zip(existing["ids"], existing["metadatas"]) if meta is not None}
+    
+    def _get_documents(self, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return {doc_id: (doc, meta) for doc_id, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])}
+    
+    def _upsert(self, ids: List[str], embeddings: List[np.ndarray], texts: List[str], metadatas: List[Dict[str, Any]]):
+        # Upsert so a changed chunk under an existing ID replaces the old vector
+        self.collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+    
+    def _update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.update(ids=ids, metadatas=metadatas)
+    
+    def _delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+    
+    def _ids_where(self, where: Dict[str, Any]) -> List[str]:
+        return self.collection.get(where=where, include=[])["ids"]
     
-    def add_documents(self, documents: List[Dict[str, Any]]):
+    def _search(self, query_embeddings: List[np.ndarray], top_k: int) -> List[List[Tuple[str, str, Dict[str, Any], float]]]:
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not results or not results["documents"]:
+            return [[] for _ in query_embeddings]
+        return [
+            list(zip(doc_ids, docs, metas, dists))
+            for doc_ids, docs, metas, dists in zip(results["ids"], results["documents"], results["metadatas"], results["distances"])
+        ]
+    
+    def iter_documents(self, page_size: int = 5000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        """Yield (ids, documents, metadatas) pages covering every stored chunk."""
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            yield page["ids"], page["documents"], page["metadatas"]
+    
+    def add_documents(self, documents: List[Dict[str, Any]], ids: Optional[List[str]] = None) -> List[str]:
         """
-        Add documents to the vector store.
+        Add documents to the vector store, skipping chunks that are already stored.
+        
+        IDs default to make_chunk_id(source, content), so re-adding identical
+        content is a no-op and costs no embedding work. A stored chunk whose
+        position changed (e.g. text was inserted before it) only gets its
+        metadata rewritten; only new chunks are embedded and inserted.
         
         Args:
             documents: List of document dictionaries with 'content' and 'metadata'
+            ids: Optional explicit IDs, one per document
+        
+        Returns:
+            List of IDs the documents were stored under
         """
         if not documents:
-            return
+            return []
         
-        # Get current count to ensure IDs are unique
         try:
-            # Use the current timestamp plus a counter to ensure uniqueness
-            import time
-            timestamp = int(time.time())
+            # Content-addressed IDs make re-ingesting the same chunk idempotent
+            if ids is None:
+                ids = [
+                    make_chunk_id(source_key(doc["metadata"]), doc["content"])
+                    for doc in documents
+                ]
+            hashes = [content_hash(doc["content"]) for doc in documents]
             
-            # Extract components for ChromaDB with unique IDs
-            ids = [f"doc_{timestamp}_{i}" for i in range(len(documents))]
-            texts = [doc["content"] for doc in documents]
-            metadatas = [doc["metadata"] for doc in documents]
+            # Drop duplicate IDs within the batch, keeping the first occurrence
+            batch = {}
+            for doc_id, doc, doc_hash in zip(ids, documents, hashes):
+                if doc_id not in batch:
+                    batch[doc_id] = (doc, doc_hash)
             
-            # Add to collection
-            self.collection.add(
-                ids=ids,
-                documents=texts,
-                metadatas=metadatas
-            )
-            print(f"Added {len(documents)} documents to vector store with IDs starting with doc_{timestamp}_0")
+            # Skip chunks that are already stored with the same content hash; chunks
+            # that only moved within their source get their metadata refreshed
+            existing = self._get_metadatas(list(batch))
+            new_ids, moved_ids, unchanged = [], [], 0
+            for doc_id, (doc, doc_hash) in batch.items():
+                stored = existing.get(doc_id)
+                if stored is None or stored.get("content_hash") != doc_hash:
+                    new_ids.append(doc_id)
+                elif stored != {**doc["metadata"], "content_hash": doc_hash}:
+                    moved_ids.append(doc_id)
+                else:
+                    unchanged += 1
+            
+            if new_ids:
+                # Extract components for ChromaDB
+                texts = [batch[doc_id][0]["content"] for doc_id in new_ids]
+                metadatas = [{**batch[doc_id][0]["metadata"], "content_hash": batch[doc_id][1]} for doc_id in new_ids]
+                embeddings = self.embed_texts(texts, [batch[doc_id][1] for doc_id in new_ids])
+                self._upsert(new_ids, embeddings, texts, metadatas)
+                self.bm25.add(new_ids, texts)
+            if moved_ids:
+                self._update_metadatas(
+                    moved_ids, [{**batch[doc_id][0]["metadata"], "content_hash": batch[doc_id][1]} for doc_id in moved_ids]
+                )
+            self.registry.add_chunks(list(batch), [batch[doc_id][0]["metadata"] for doc_id in batch])
+            print(f"Added {len(new_ids)} documents to vector store, updated {len(moved_ids)} moved, skipped {unchanged} unchanged")
+            return ids
         except Exception as e:
             print(f"Error adding documents: {e}")
             import traceback
             traceback.print_exc()
+            return []
+    
+    def embed_texts(self, texts: List[str], text_hashes: Optional[List[str]] = None) -> List[np.ndarray]:
+        """
+        Embed texts, reusing cached vectors and only running the model on misses.
+        
+        Args:
+            texts: Texts to embed
+            text_hashes: Precomputed content hashes of the texts, if available
+        
+        Returns:
+            One float32 vector per text, in input order
+        """
+        if text_hashes is None:
+            text_hashes = [content_hash(text) for text in texts]
+        cached = self.embedding_cache.get_many(text_hashes)
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+        if missing:
+            vectors = self._embed_uncached(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self.embedding_cache.put_many(computed)
+            cached.update(computed)
+        return [cached[text_hash] for text_hash in text_hashes]
+    
+    def _embed_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        return [np.asarray(vector, dtype=np.float32) for vector in self.embedding_function(texts)]
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss statistics of the embedding caches."""
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "query_cache": self.query_cache.stats(),
+        }
+    
+    def delete_ids(self, ids: List[str]):
+        """
+        Delete documents from the vector store by ID.
+        
+        Args:
+            ids: IDs of the documents to delete
+        """
+        # The same ID can appear twice when a source holds duplicate chunks
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return
+        try:
+            self._delete(ids)
+            self.bm25.remove(ids)
+            self.registry.remove_chunks(ids)
+            print(f"Deleted {len(ids)} documents from vector store")
+        except Exception as e:
+            print(f"Error deleting documents: {e}")
+    
+    def delete_where(self, where: Dict[str, Any]):
+        """
+        Delete documents whose metadata matches a filter.
+        
+        Args:
+            where: ChromaDB metadata filter, e.g. {"path": "/data/a.pdf"}
+        """
+        try:
+            self.delete_ids(self._ids_where(where))
+        except Exception as e:
+            print(f"Error deleting documents matching {where}: {e}")
     
     def query(self, query_text: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -81,57 +293,247 @@ class VectorStore:
         Returns:
             List of document dictionaries with content, metadata, and relevance scores
         """
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=top_k,
-            include=["documents", "metadatas", "distances"]
-        )
+        return self.query_many([query_text], top_k=top_k)[0]
+    
+    def query_many(self, query_texts: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Query the vector store for several queries with one embedding batch and one Chroma query.
         
-        # Convert results to a list of document dictionaries
-        documents = []
-        if results and results["documents"]:
-            for i, (docs, metas, dists) in enumerate(zip(results["documents"], results["metadatas"], results["distances"])):
-                for j, (doc, meta, dist) in enumerate(zip(docs, metas, dists)):
-                    print(f"\n\n\n{doc}\n\n\n")
-                    print(f"\n\n\n{meta}\n\n\n")
-                    print(f"\n\n\n{dist}\n\n\n")
-                    
-                    # Convert distance to score (1.0 is perfect match, 0.0 is poor match)
-                    # For cosine, we can use 1-distance directly since distance = 1-cosine_similarity
-                    score = max(0.0, min(1.0, dist))
-                    
-                    documents.append({
-                        "content": doc,
-                        "metadata": meta,#results["metadatas"][0][i] if results["metadatas"] else {},
-                        "score": score
-                    })
+        Args:
+            query_texts: The query texts to find relevant documents for
+            top_k: Number of top results to return per query
         
+        Returns:
+            One list of document dictionaries per query, in input order
+        """
+        if not query_texts:
+            return []
+        
+        # Embed through the query cache instead of letting Chroma embed every request
+        query_embeddings = self.query_cache.get_many(query_texts)
+        results = self._search(query_embeddings, top_k)
+        
+        # Convert results to a list of document dictionaries per query
+        per_query = [[] for _ in query_texts]
+        for i, hits in enumerate(results):
+            documents = per_query[i]
+            for j, (doc_id, doc, meta, dist) in enumerate(hits):
+                print(f"\n\n\n{doc}\n\n\n")
+                print(f"\n\n\n{meta}\n\n\n")
+                print(f"\n\n\n{dist}\n\n\n")
+                
+                # Convert distance to score (1.0 is perfect match, 0.0 is poor match)
+                # For cosine, we can use 1-distance directly since distance = 1-cosine_similarity
+                score = max(0.0, min(1.0, dist))
+                
+                documents.append({
+                    "id": doc_id,
+                    "content": doc,
+                    "metadata": meta,#results["metadatas"][0][i] if results["metadatas"] else {},
+                    "score": score
+                })
+        
+        return per_query
+    
+    def lexical_query(self, query_text: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Query the BM25 index for documents sharing exact terms with the query.
+        
+        Args:
+            query_text: The query text
+            top_k: Number of top results to return
+        
+        Returns:
+            List of document dictionaries with content, metadata, 'bm25_score' and
+            'bm25_match' (the score relative to BM25Index.reference_score), best first
+        """
+        hits = self.bm25.search(query_text, top_k=top_k)
+        if not hits:
+            return []
+        reference = self.bm25.reference_score(query_text)
+        by_id = self._get_documents([doc_id for doc_id, _ in hits])
+        documents = []
+        for doc_id, bm25_score in hits:
+            if doc_id in by_id:
+                doc, meta = by_id[doc_id]
+                documents.append({"id": doc_id, "content": doc, "metadata": meta, "bm25_score": bm25_score,
+                                  "bm25_match": bm25_score / reference if reference > 0 else 0.0})
         return documents
+    
+    def hybrid_query(self, query_text: str, top_k: int = 5, candidates: Optional[int] = None,
+                     rrf_k: int = 60) -> List[Dict[str, Any]]:
+        """
+        Combine vector and BM25 results with reciprocal rank fusion.
+        
+        Args:
+            query_text: The query text
+            top_k: Number of fused results to return
+            candidates: Results taken from each retriever before fusion (default 2 * top_k)
+            rrf_k: Rank offset of the fusion formula sum(1 / (rrf_k + rank))
+        
+        Returns:
+            List of document dictionaries ordered by fused rank. Dense hits keep
+            their 'score'; lexical hits carry 'lexical_rank', 'bm25_score' and 'bm25_match'.
+        """
+        return self.hybrid_query_many([query_text], top_k=top_k, candidates=candidates, rrf_k=rrf_k)[0]
+    
+    def hybrid_query_many(self, query_texts: List[str], top_k: int = 5, candidates: Optional[int] = None,
+                          rrf_k: int = 60) -> List[List[Dict[str, Any]]]:
+        """
+        Hybrid search for several queries: the dense half runs as one batched
+        query_many (one embedding batch, one vector search), then each query's
+        BM25 results are fused with its dense results.
+        
+        Args:
+            query_texts: The query texts
+            top_k: Number of fused results to return per query
+            candidates: Results taken from each retriever before fusion (default 2 * top_k)
+            rrf_k: Rank offset of the fusion formula sum(1 / (rrf_k + rank))
+        
+        Returns:
+            One list of document dictionaries per query, in input order (see hybrid_query)
+        """
+        candidates = candidates or top_k * 2
+        dense_many = self.query_many(query_texts, top_k=candidates)
+        return [
+            self._fuse(dense, self.lexical_query(query_text, top_k=candidates), top_k, rrf_k)
+            for query_text, dense in zip(query_texts, dense_many)
+        ]
+    
+    @staticmethod
+    def _fuse(dense: List[Dict[str, Any]], lexical: List[Dict[str, Any]], top_k: int,
+              rrf_k: int) -> List[Dict[str, Any]]:
+        fused: Dict[str, Dict[str, Any]] = {}
+        for rank, doc in enumerate(dense, start=1):
+            entry = fused.setdefault(doc["id"], {**doc, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (rrf_k + rank)
+        for rank, doc in enumerate(lexical, start=1):
+            entry = fused.setdefault(doc["id"], {**doc, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (rrf_k + rank)
+            entry["lexical_rank"] = rank
+            entry["bm25_score"] = doc["bm25_score"]
+            entry["bm25_match"] = doc["bm25_match"]
+        return sorted(fused.values(), key=lambda doc: doc["rrf_score"], reverse=True)[:top_k]
+    
+    def _rebuild_lexical_index(self, page_size: int = 5000):
+        """Index every stored chunk in BM25, for collections created before the index existed."""
+        print(f"Building BM25 index for {self.count()} existing documents...")
+        for ids, docs, _ in self.iter_documents(page_size):
+            self.bm25.add(ids, [doc or "" for doc in docs])
+        self.bm25.save()
+    
+    def _rebuild_source_registry(self, page_size: int = 5000):
+        """Register every stored chunk, for collections created before the source registry existed."""
+        print(f"Building source registry for {self.count()} existing documents...")
+        for ids, _, metadatas in self.iter_documents(page_size):
+            self.registry.add_chunks(ids, [metadata or {} for metadata in metadatas])
 
 
-def initialize_vector_store(pdf_dir: str, collection_name: str = "pdf_documents", chroma_db_dir: str = "./chroma_db") -> VectorStore:
+def initialize_vector_store(pdf_dir: str, collection_name: str = "pdf_documents", chroma_db_dir: str = "./chroma_db",
+                            chunk_size: int = 1000, chunk_overlap: int = 200, backend: str = "chroma") -> VectorStore:
     """
-    Initialize and populate the vector store with documents from the PDF directory.
+    Initialize the vector store and incrementally sync it with the PDF directory.
+    
+    An ingestion manifest stored next to the ChromaDB data records what was
+    ingested from each file, so only new or changed files are extracted and
+    embedded, and the chunks of removed files are deleted. Changed files go
+    through the staged IngestPipeline.
     
     Args:
         pdf_dir: Directory containing PDF files
         collection_name: Name for the ChromaDB collection
         chroma_db_dir: Directory to store ChromaDB files
+        chunk_size: Size of each text chunk
+        chunk_overlap: Overlap between chunks
+        backend: "chroma" (HNSW via ChromaDB) or "numpy" (exact in-memory search)
     
     Returns:
         Initialized VectorStore instance
     """
     # Initialize vector store
-    vector_store = VectorStore(collection_name=collection_name, data_dir=chroma_db_dir)
+    if backend == "chroma":
+        vector_store = VectorStore(collection_name=collection_name, data_dir=chroma_db_dir)
+    elif backend == "numpy":
+        from rag_utils.numpy_store import NumpyVectorStore
+        vector_store = NumpyVectorStore(collection_name=collection_name, data_dir=chroma_db_dir)
+    else:
+        raise ValueError(f"Unknown vector store backend: {backend}")
     
-    # Process PDF documents
-    documents = process_pdf_documents(pdf_dir)
+    manifest = IngestManifest(f"{vector_store.storage_prefix}_manifest.json")
+    splitter = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "chunker": CHUNKER_VERSION}
     
-    # Add documents to vector store
-    if documents:
-        vector_store.add_documents(documents)
-        print(f"Initialized vector store with {len(documents)} document chunks from {pdf_dir}")
+    current_files = {}
+    if os.path.isdir(pdf_dir):
+        for filename in sorted(os.listdir(pdf_dir)):
+            if filename.endswith(SUPPORTED_EXTENSIONS):
+                file_path = os.path.join(pdf_dir, filename)
+                if os.path.isfile(file_path):
+                    current_files[file_path] = os.stat(file_path)
     else:
-        print(f"No documents found in {pdf_dir}")
+        print(f"PDF directory does not exist: {pdf_dir}")
+    
+    added_chunks = 0
+    skipped_files = 0
+    dirty = False
+    
+    # Drop the chunks of files that have been removed from the directory
+    for file_path in [path for path in manifest.entries if path not in current_files]:
+        vector_store.delete_ids(manifest.remove(file_path))
+        print(f"Removed chunks of deleted file: {file_path}")
+        dirty = True
+    
+    changed = {}
+    for file_path, stat in current_files.items():
+        if manifest.is_unchanged(file_path, stat, splitter):
+            skipped_files += 1
+            continue
+        try:
+            file_hash = file_content_hash(file_path)
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            continue
+        entry = manifest.get(file_path)
+        if entry and entry.get("sha256") == file_hash and entry.get("splitter") == splitter:
+            # Touched but not modified: refresh the stat fields only
+            manifest.record(file_path, stat, file_hash, entry["chunk_ids"], splitter)
+            skipped_files += 1
+            dirty = True
+            continue
+        if not entry:
+            # Files ingested before the manifest existed have no recorded IDs
+            vector_store.delete_where({"path": file_path})
+        changed[file_path] = (stat, file_hash, entry)
+    
+    def on_file_done(file_path: str, chunk_ids: Optional[List[str]], error: Optional[str]):
+        nonlocal added_chunks, dirty
+        stat, file_hash, entry = changed[file_path]
+        dirty = True
+        if chunk_ids is None:
+            # Leave the file out of the manifest so the next start retries it
+            vector_store.delete_ids(manifest.remove(file_path))
+            return
+        # Duplicate chunks of a file share one ID
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        if entry:
+            # Unchanged chunks keep their IDs; only drop the ones that disappeared
+            kept = set(chunk_ids)
+            vector_store.delete_ids([old_id for old_id in entry.get("chunk_ids", []) if old_id not in kept])
+        manifest.record(file_path, stat, file_hash, chunk_ids, splitter)
+        vector_store.registry.set_content_hash(file_path, file_hash)
+        added_chunks += len(chunk_ids)
+    
+    if changed:
+        pipeline = IngestPipeline(
+            vector_store,
+            # Spawning extraction processes is not worth it for a single file
+            extract_workers=None if len(changed) > 1 else 0,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+        )
+        pipeline.run(list(changed), on_file_done=on_file_done)
+    
+    if dirty:
+        manifest.save()
+    print(f"Initialized vector store from {pdf_dir}: {added_chunks} chunks added, {skipped_files} unchanged files skipped")
     
     return vector_store
\ No newline at end of file
@@ -0,0 +1,164 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class WebCacheStore:
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024, compress_level: int = 6):
+        """
+        Single-file cache of extracted web pages keyed by URL.
+
+        Entries are zlib-compressed JSON in one SQLite table with the URL as
+        primary key, so lookups are an index probe and writes are atomic.
+        When the compressed size exceeds max_bytes the least recently used
+        entries are evicted down to 90% of the limit.
+
+        Args:
+            db_path: Path of the SQLite file holding the cache
+            max_bytes: Upper bound of the total compressed entry size
+            compress_level: zlib compression level
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._con.commit()
+        self._total_bytes = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached page.
+
+        Args:
+            url: URL of the page
+
+        Returns:
+            The cached entry, or None if it is not cached
+        """
+        with self._lock:
+            row = self._con.execute("SELECT data FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._con.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._con.commit()
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, url: str, entry: Dict[str, Any]):
+        """
+        Store a page, replacing any previous entry for the URL.
+
+        Args:
+            url: URL of the page
+            entry: JSON-serializable cache entry
+        """
+        data = zlib.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"), self.compress_level)
+        now = time.time()
+        with self._lock:
+            old = self._con.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            self._con.execute(
+                "INSERT OR REPLACE INTO pages (url, data, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (url, data, len(data), now, now),
+            )
+            self._total_bytes += len(data) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9), keep_url=url)
+            self._con.commit()
+
+    def _evict(self, target_bytes: int, keep_url: Optional[str] = None):
+        # Walk the LRU order until enough has been freed, then delete exactly those rows
+        freed = 0
+        victims = []
+        for url, size in self._con.execute("SELECT url, size FROM pages ORDER BY accessed_at"):
+            if self._total_bytes - freed <= target_bytes:
+                break
+            if url == keep_url:
+                # Never evict the entry that is being stored
+                continue
+            freed += size
+            victims.append((url,))
+        if victims:
+            deleted = self._con.executemany("DELETE FROM pages WHERE url = ?", victims).rowcount
+            self.evictions += deleted
+            self._total_bytes = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def delete(self, url: str):
+        with self._lock:
+            self._con.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._con.commit()
+            self._total_bytes = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def clear(self):
+        """Remove every cached page."""
+        with self._lock:
+            self._con.execute("DELETE FROM pages")
+            self._con.commit()
+            self._total_bytes = 0
+
+    def import_json_dir(self, cache_dir: str) -> int:
+        """
+        Migrate a legacy cache directory of one JSON file per URL into the store.
+
+        Imported files are deleted; unreadable ones are left in place.
+
+        Args:
+            cache_dir: Directory holding the legacy *.json cache files
+
+        Returns:
+            Number of pages imported
+        """
+        imported = 0
+        for name in os.listdir(cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                url = entry["metadata"]["source"]
+            except Exception as e:
+                print(f"Skipping unreadable cache file {name}: {e}")
+                continue
+            self.put(url, entry)
+            os.remove(path)
+            imported += 1
+        if imported:
+            print(f"Imported {imported} legacy cache files into {self.db_path}")
+        return imported
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the cache."""
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._con.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._con.close()
@@ -1,175 +1,240 @@
+import asyncio
+import re
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, Optional, List
 from urllib.parse import urlparse
 import os
-import json
 from pathlib import Path
-import hashlib
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-import chardet
+import time
+from rag_utils.async_fetcher import AsyncFetcher
+from rag_utils.pdf_processor import split_text
+from rag_utils.web_cache_store import WebCacheStore
+from rag_utils.html_extractors import get_extractor
+from rag_utils.html_decoder import StreamingHtmlDecoder, UnsupportedContentError, is_text_content_type
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': '*'
+}
 
 
 class WebContentProcessor:
-    def __init__(self, cache_dir: str = "./web_cache"):
+    def __init__(self, cache_dir: str = "./web_cache", max_concurrency: int = 32, per_host: int = 4,
+                 timeout: float = 10.0, retries: int = 2, cache_max_bytes: int = 512 * 1024 * 1024,
+                 extractor: str = "auto", max_bytes: int = 5 * 1024 * 1024):
         """
         Initialize the web content processor with caching capability.
         
         Args:
             cache_dir: Directory to store cached web content
+            max_concurrency: Maximum concurrent async requests overall
+            per_host: Maximum concurrent async requests to one host
+            timeout: Request timeout in seconds
+            retries: Retries of transient failures (network errors, 429 and 5xx)
+            cache_max_bytes: Size cap of the compressed page cache
+            extractor: HTML-to-text extractor, "lxml" (main content only), "soup"
+                (full page, the original behaviour) or "auto" (lxml when installed)
+            max_bytes: Download budget per page; longer bodies are truncated
         """
         self.cache_dir = cache_dir
         os.makedirs(cache_dir, exist_ok=True)
+        self.cache = WebCacheStore(os.path.join(cache_dir, "web_cache.sqlite3"), max_bytes=cache_max_bytes)
+        # Move pages cached by earlier versions (one JSON file per URL) into the store
+        self.cache.import_json_dir(cache_dir)
+        self.timeout = timeout
+        self.extractor = get_extractor(extractor)
+        self.max_bytes = max_bytes
+        self.fetcher = AsyncFetcher(max_concurrency=max_concurrency, per_host=per_host, timeout=timeout,
+                                    retries=retries, headers=DEFAULT_HEADERS)
+        # Keep-alive session for the synchronous path so repeated hosts skip connection setup
+        self._session = requests.Session()
+        self._session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=per_host)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
     
     def clear_cache(self):
         """
         Clear all cached web content.
         """
-        if os.path.exists(self.cache_dir):
-            for file in os.listdir(self.cache_dir):
-                if file.endswith('.json'):
-                    try:
-                        os.remove(os.path.join(self.cache_dir, file))
-                    except Exception as e:
-                        print(f"Error removing cache file {file}: {e}")
-            print(f"Cleared web cache directory: {self.cache_dir}")
+        self.cache.clear()
+        print(f"Cleared web cache: {self.cache.db_path}")
         return True
     
-    def extract_content_from_url(self, url: str, use_cache: bool = True) -> Dict[str, Any]:
+    def _read_cache(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            cached_content = self.cache.get(url)
+            if cached_content is not None:
+                print(f"Using cached content for {url}")
+            return cached_content
+        except Exception as e:
+            print(f"Error reading cache for {url}: {e}")
+            # If there's an error reading the cache, drop the entry
+            try:
+                self.cache.delete(url)
+                print(f"Removed corrupt cache entry for {url}")
+            except Exception:
+                pass
+        return None
+    
+    def _write_cache(self, url: str, result: Dict[str, Any]):
+        try:
+            self.cache.put(url, result)
+            print(f"Cached content for {url}")
+        except Exception as e:
+            print(f"Error caching content for {url}: {e}")
+    
+    def _error_result(self, url: str, e: Exception) -> Dict[str, Any]:
+        print(f"Error processing URL {url}: {e}")
+        return {
+            "content": f"Error fetching content from {url}: {str(e)}",
+            "metadata": {
+                "source": url,
+                "error": str(e),
+                "type": "web"
+            },
+            "fetch_status": "error"
+        }
+    
+    def _validators(self, headers) -> Dict[str, Any]:
+        """Cache validators and freshness lifetime from response headers."""
+        cache_control = headers.get('cache-control', '').lower()
+        max_age = 0
+        match = re.search(r'max-age=(\d+)', cache_control)
+        if match and 'no-cache' not in cache_control and 'no-store' not in cache_control:
+            max_age = int(match.group(1))
+        return {
+            "etag": headers.get('etag'),
+            "last_modified": headers.get('last-modified'),
+            "fetched_at": time.time(),
+            "max_age": max_age,
+        }
+    
+    def _conditional_headers(self, cached: Dict[str, Any]) -> Dict[str, str]:
+        validators = cached.get("validators") or {}
+        headers = {}
+        if validators.get("etag"):
+            headers['If-None-Match'] = validators["etag"]
+        if validators.get("last_modified"):
+            headers['If-Modified-Since'] = validators["last_modified"]
+        return headers
+    
+    def _is_fresh(self, cached: Dict[str, Any]) -> bool:
+        validators = cached.get("validators") or {}
+        return time.time() < validators.get("fetched_at", 0) + validators.get("max_age", 0)
+    
+    def _not_modified(self, url: str, cached: Dict[str, Any], headers) -> Dict[str, Any]:
+        # A 304 may carry updated validators; keep the old ones where it does not
+        validators = {**cached.get("validators", {}), **{k: v for k, v in self._validators(headers).items() if v}}
+        cached = {**cached, "validators": validators}
+        self._write_cache(url, cached)
+        print(f"Content not modified: {url}")
+        return {**cached, "fetch_status": "not_modified"}
+    
+    def extract_content_from_url(self, url: str, use_cache: bool = True, revalidate: bool = False) -> Dict[str, Any]:
         """
         Extract content from a web URL with optional caching.
         
         Args:
             url: The URL to extract content from
             use_cache: Whether to use cached content if available
+            revalidate: Check a cached page with a conditional request (ETag /
+                Last-Modified) unless it is still fresh per its max-age
             
         Returns:
-            Dictionary with extracted content and metadata
+            Dictionary with extracted content and metadata. "fetch_status" is
+            "cached", "not_modified", "fetched" or "error"
         """
-        # Create a hash of the URL for cache filename
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        cache_path = os.path.join(self.cache_dir, f"{url_hash}.json")
-        
-        # Return cached content if available and requested
-        if use_cache and os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    cached_content = json.load(f)
-                    print(f"Using cached content for {url}")
-                    return cached_content
-            except Exception as e:
-                print(f"Error reading cache for {url}: {e}")
-                # If there's an error reading the cache, delete the cache file
-                try:
-                    os.remove(cache_path)
-                    print(f"Removed corrupt cache file for {url}")
-                except:
-                    pass
+        cached = self._read_cache(url) if use_cache or revalidate else None
+        if cached is not None and (not revalidate or self._is_fresh(cached)):
+            return {**cached, "fetch_status": "cached"}
         
         # Otherwise, fetch and process the content
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept-Language': '*'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            
-            # Try to detect encoding from the content
-            # First check content-type header
-            content_type = response.headers.get('content-type', '').lower()
-            encoding = None
-            
-            if 'charset=' in content_type:
-                encoding = content_type.split('charset=')[-1].split(';')[0].strip()
-                print(f"Detected encoding from headers: {encoding}")
-            
-            # If no encoding in headers, use chardet to detect from content
-            if not encoding:
-                detected = chardet.detect(response.content)
-                encoding = detected['encoding']
-                confidence = detected['confidence']
-                print(f"Detected encoding with chardet: {encoding} (confidence: {confidence:.2f})")
-            
-            # Default to utf-8 if no encoding detected
-            if not encoding:
-                encoding = 'utf-8'
-                print(f"Using default encoding: {encoding}")
-            
-            # Parse HTML with explicit encoding
-            content = response.content.decode(encoding, errors='replace')
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Extract and clean title
-            title = ""
-            if soup.title and soup.title.string:
-                title = soup.title.string.strip()
-                # Ensure title is properly encoded
-                title = title.encode().decode('utf-8', errors='replace')
-            else:
-                title = url
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "header", "footer", "nav"]):
-                script.extract()
-            
-            # Get text content with better handling of line breaks and whitespace
-            text_parts = []
-            for element in soup.find_all(text=True):
-                parent = element.parent.name.lower() if element.parent else ''
-                if parent in ['script', 'style', 'meta', 'noscript', 'header', 'footer', 'nav']:
-                    continue
-                    
-                text = element.strip()
-                if text:
-                    # Add appropriate spacing based on parent element
-                    if parent in ['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li']:
-                        text_parts.append(text + '\n')
-                    else:
-                        text_parts.append(text + ' ')
-            
-            # Join all parts and normalize whitespace
-            raw_text = ''.join(text_parts)
-            
-            # Normalize whitespace (multiple spaces/newlines to single)
-            import re
-            text = re.sub(r'\s+', ' ', raw_text).strip()
-            text = re.sub(r'\n\s*\n', '\n\n', text)  # Keep paragraph breaks
-            
-            # Verify text encoding is consistent
-            text = text.encode().decode('utf-8', errors='replace')
-            
-            # Create result dictionary
-            result = {
-                "content": text,
-                "metadata": {
-                    "source": url,
-                    "title": title,
-                    "domain": urlparse(url).netloc,
-                    "type": "web"
-                }
-            }
-            
-            # Cache the result with proper encoding handling
-            try:
-                with open(cache_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, ensure_ascii=False, indent=2)
-                    print(f"Cached content for {url}")
-            except Exception as e:
-                print(f"Error caching content for {url}: {e}")
-            
-            return result
+            headers = self._conditional_headers(cached) if cached is not None else {}
+            with self._session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304 and cached is not None:
+                    return self._not_modified(url, cached, response.headers)
+                response.raise_for_status()  # Raise exception for HTTP errors
+                decoder = self._decoder_for(response.headers.get('content-type', ''))
+                # Stream the body so pages over the byte budget are cut off instead of loaded whole
+                for chunk in response.iter_content(chunk_size=65536):
+                    if not decoder.feed(chunk):
+                        break
+            result = self._parse_text(url, decoder.finish(), decoder.truncated)
+        except Exception as e:
+            return self._error_result(url, e)
+        result["validators"] = self._validators(response.headers)
+        self._write_cache(url, result)
+        return {**result, "fetch_status": "fetched"}
+    
+    async def aextract_content_from_url(self, url: str, use_cache: bool = True, revalidate: bool = False) -> Dict[str, Any]:
+        """
+        Async variant of extract_content_from_url.
+        
+        The download goes through the shared AsyncFetcher (pooled connections,
+        concurrency limits, retries) and HTML parsing runs in a worker thread,
+        so the event loop is never blocked.
+        
+        Args:
+            url: The URL to extract content from
+            use_cache: Whether to use cached content if available
+            revalidate: Check a cached page with a conditional request unless it is still fresh
             
+        Returns:
+            Dictionary with extracted content and metadata, see extract_content_from_url
+        """
+        cached = await asyncio.to_thread(self._read_cache, url) if use_cache or revalidate else None
+        if cached is not None and (not revalidate or self._is_fresh(cached)):
+            return {**cached, "fetch_status": "cached"}
+        
+        try:
+            headers = self._conditional_headers(cached) if cached is not None else {}
+            async with self.fetcher.stream(url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    return await asyncio.to_thread(self._not_modified, url, cached, response.headers)
+                decoder = self._decoder_for(response.headers.get('content-type', ''))
+                async for chunk in response.aiter_bytes(65536):
+                    if not decoder.feed(chunk):
+                        break
+            result = await asyncio.to_thread(self._parse_text, url, decoder.finish(), decoder.truncated)
         except Exception as e:
-            print(f"Error processing URL {url}: {e}")
-            return {
-                "content": f"Error fetching content from {url}: {str(e)}",
-                "metadata": {
-                    "source": url,
-                    "error": str(e),
-                    "type": "web"
-                }
+            return self._error_result(url, e)
+        result["validators"] = self._validators(response.headers)
+        await asyncio.to_thread(self._write_cache, url, result)
+        return {**result, "fetch_status": "fetched"}
+    
+    async def aclose(self):
+        """Close the async connection pool of the current event loop."""
+        await self.fetcher.aclose()
+    
+    def _decoder_for(self, content_type: str) -> StreamingHtmlDecoder:
+        if not is_text_content_type(content_type):
+            raise UnsupportedContentError(f"Unsupported content type: {content_type.split(';')[0]}")
+        return StreamingHtmlDecoder(content_type, max_bytes=self.max_bytes)
+    
+    def _parse_text(self, url: str, content: str, truncated: bool = False) -> Dict[str, Any]:
+        """Extract the title and text of a decoded HTML document."""
+        title, text = self.extractor.extract(content, url)
+        if not title:
+            title = url
+        
+        # Create result dictionary
+        result = {
+            "content": text,
+            "metadata": {
+                "source": url,
+                "title": title,
+                "domain": urlparse(url).netloc,
+                "type": "web"
             }
+        }
+        if truncated:
+            print(f"Page exceeded {self.max_bytes} bytes and was truncated: {url}")
+            result["metadata"]["truncated"] = True
+        return result
     
     def process_url_to_chunks(self, url: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
         """
@@ -185,20 +250,62 @@ class WebContentProcessor:
         """
         # Extract content
         result = self.extract_content_from_url(url)
+        return self.split_result(result, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    
+    async def aprocess_url_to_chunks(self, url: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+        """Async variant of process_url_to_chunks."""
+        result = await self.aextract_content_from_url(url)
+        return await asyncio.to_thread(self.split_result, result, chunk_size, chunk_overlap)
+    
+    async def aprocess_urls_to_chunks(self, urls: List[str], chunk_size: int = 1000,
+                                      chunk_overlap: int = 200) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch, parse and chunk many URLs concurrently.
         
+        Args:
+            urls: URLs to process; duplicates are fetched once
+            chunk_size: Size of each text chunk
+            chunk_overlap: Overlap between chunks
+            
+        Returns:
+            Mapping from URL to its document chunks (a single error document if it failed)
+        """
+        unique = list(dict.fromkeys(urls))
+        chunks = await asyncio.gather(
+            *(self.aprocess_url_to_chunks(url, chunk_size=chunk_size, chunk_overlap=chunk_overlap) for url in unique)
+        )
+        return dict(zip(unique, chunks))
+    
+    def process_urls_to_chunks(self, urls: List[str], chunk_size: int = 1000,
+                               chunk_overlap: int = 200) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Synchronous entry point of aprocess_urls_to_chunks for code outside an event loop.
+        """
+        async def run():
+            try:
+                return await self.aprocess_urls_to_chunks(urls, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            finally:
+                await self.aclose()
+        return asyncio.run(run())
+    
+    def split_result(self, result: Dict[str, Any], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+        """
+        Split an extracted page into document chunks.
+        
+        Args:
+            result: Dictionary returned by extract_content_from_url
+            chunk_size: Size of each text chunk
+            chunk_overlap: Overlap between chunks
+            
+        Returns:
+            List of document dictionaries with content and metadata
+        """
         # Check if we got an error
         if "error" in result["metadata"]:
             # Return single document with error message
             return [result]
         
-        # Split content into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-        )
-        
-        chunks = text_splitter.split_text(result["content"])
+        chunks = split_text(result["content"], chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         
         # Create document chunks
         documents = []
@@ -212,4 +319,4 @@ class WebContentProcessor:
             }
             documents.append(doc)
         
-        return documents
\ No newline at end of file
+        return documents
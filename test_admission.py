@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import asyncio
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from pydantic_ai import Agent
+from pydantic_ai.models.function import FunctionModel
+
+import chat_app
+
+# Keep test conversations out of the app's history database
+db_dir = tempfile.TemporaryDirectory()
+test_db = Path(db_dir.name) / 'test_admission.sqlite'
+
+
+@asynccontextmanager
+async def test_lifespan(_app):
+    async with chat_app.Database.connect(test_db) as db:
+        yield {"db": db}
+
+
+chat_app.app.router.lifespan_context = test_lifespan
+
+
+# A slow model, so the first requests are still generating when the next one arrives
+async def slow_stream(messages, info):
+    await asyncio.sleep(1.0)
+    yield "answer"
+
+
+chat_app.agent = Agent(FunctionModel(stream_function=slow_stream))
+chat_app.chat_history.summarize = False
+admission = chat_app.admission
+admission.max_in_flight, admission.max_queue, admission.max_per_client = 4, 16, 2
+
+
+
+def post_concurrently(client, headers):
+    statuses = {}
+
+    def post(i):
+        response = client.post("/chat/", data={"prompt": f"question {i}", "use_rag": "false", "stream": "delta"},
+                               headers=headers[i])
+        statuses[i] = (response.status_code, response.text)
+
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(len(headers))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.1)
+    for thread in threads:
+        thread.join()
+    for i in sorted(statuses):
+        print(f"Request {i}: {statuses[i][0]}")
+    return statuses
+
+
+try:
+    with TestClient(chat_app.app) as client:
+        # Requests without a cookie get a new session each; the per-client limit must still apply
+        statuses = post_concurrently(client, [{}, {}, {}])
+        codes = sorted(code for code, _ in statuses.values())
+        assert codes == [200, 200, 429], codes
+        assert any(code == 429 and "this client" in text for code, text in statuses.values())
+
+        # Behind a proxy, clients are told apart by the last entry of the forwarded header
+        chat_app.CLIENT_ADDRESS_HEADER = "X-Forwarded-For"
+        statuses = post_concurrently(client, [
+            {"X-Forwarded-For": "10.0.0.1"},
+            {"X-Forwarded-For": "10.0.0.1"},
+            {"X-Forwarded-For": "10.0.0.1, 10.0.0.2"},
+        ])
+        assert all(code == 200 for code, _ in statuses.values()), statuses
+        assert chat_app.admission.stats()["in_flight"] == 0
+finally:
+    db_dir.cleanup()
+print("\nAdmission test passed")
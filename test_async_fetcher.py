@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+from rag_utils.async_fetcher import AsyncFetcher
+from rag_utils.web_processor import WebContentProcessor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import tempfile
+import threading
+import time
+
+# Local stub server: /page/N serves HTML slowly, /flaky fails twice before succeeding
+# Pages for the download limits: charset from meta tag, oversized body, binary content
+SPECIAL_PAGES = {
+    "/sjis": ("text/html", '<html><head><meta charset="shift_jis"><title>日本語</title></head><body><p>これは日本語のページです。</p></body></html>'.encode("shift_jis")),
+    "/huge": ("text/html; charset=utf-8", b"<html><body><p>" + b"x" * (3 * 1024 * 1024) + b"</p></body></html>"),
+    "/binary": ("application/pdf", b"%PDF-1.4 binary"),
+}
+state = {"active": 0, "max_active": 0, "flaky_calls": 0}
+lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            if self.path in SPECIAL_PAGES:
+                content_type, body = SPECIAL_PAGES[self.path]
+                self._reply(200, body, content_type)
+                return
+            if self.path == "/flaky":
+                with lock:
+                    state["flaky_calls"] += 1
+                    calls = state["flaky_calls"]
+                if calls <= 2:
+                    self._reply(503, b"busy")
+                    return
+            time.sleep(0.1)
+            page = self.path.strip("/").replace("/", " ")
+            body = f"<html><head><title>{page}</title></head><body><p>{page} text. " * 50 + "</p></body></html>"
+            self._reply(200, body.encode("utf-8"), "text/html; charset=utf-8")
+        finally:
+            with lock:
+                state["active"] -= 1
+
+    def _reply(self, status, body, content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients drop the connection when they stop reading an oversized page
+        pass
+
+
+server = StubServer(("127.0.0.1", 0), StubHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = f"http://127.0.0.1:{server.server_address[1]}"
+cache_dir = tempfile.TemporaryDirectory()
+
+try:
+    # Per-host limit is respected and requests run concurrently
+    print("Fetching 12 pages with per_host=3...")
+    fetcher = AsyncFetcher(per_host=3, backoff=0.05)
+    start = time.perf_counter()
+    responses = asyncio.run(fetcher.fetch_many([f"{base}/page/{i}" for i in range(12)]))
+    elapsed = time.perf_counter() - start
+    print(f"Fetched in {elapsed:.2f}s, max concurrent requests: {state['max_active']}")
+    assert all(response.status_code == 200 for response in responses)
+    assert state["max_active"] <= 3
+    assert elapsed < 12 * 0.1
+
+    # Transient 503s are retried with backoff
+    print("\nFetching a flaky URL...")
+    response = asyncio.run(fetcher.fetch(f"{base}/flaky"))
+    print(f"Status {response.status_code} after {state['flaky_calls']} attempts")
+    assert response.status_code == 200 and state["flaky_calls"] == 3
+
+    # Batch API fetches, parses and chunks many URLs; failures become error documents
+    print("\nProcessing URLs to chunks...")
+    processor = WebContentProcessor(cache_dir=cache_dir.name, retries=0)
+    urls = [f"{base}/page/{i}" for i in range(5)] + ["http://127.0.0.1:1/unreachable"]
+    chunks = processor.process_urls_to_chunks(urls, chunk_size=500, chunk_overlap=50)
+    for url, docs in chunks.items():
+        print(f"{url}: {len(docs)} chunks")
+    assert len(chunks) == len(urls)
+    assert all(len(chunks[url]) > 1 and chunks[url][0]["metadata"]["title"] for url in urls[:5])
+    assert "error" in chunks[urls[-1]][0]["metadata"]
+
+    # Charset from the meta tag, size cap and content-type gating on both download paths
+    print("\nChecking download limits...")
+    processor = WebContentProcessor(cache_dir=cache_dir.name, retries=0, max_bytes=1024 * 1024)
+    for extract in (processor.extract_content_from_url,
+                    lambda url: asyncio.run(processor.aextract_content_from_url(url))):
+        sjis = extract(f"{base}/sjis")
+        print(f"Shift_JIS page: {sjis['metadata']['title']} / {sjis['content']}")
+        assert sjis["metadata"]["title"] == "日本語" and "日本語のページ" in sjis["content"]
+        huge = extract(f"{base}/huge")
+        assert huge["metadata"].get("truncated") and len(huge["content"]) <= 1024 * 1024
+        binary = extract(f"{base}/binary")
+        print(f"Binary: {binary['metadata'].get('error')}")
+        assert "error" in binary["metadata"]
+        processor.clear_cache()
+finally:
+    server.shutdown()
+    cache_dir.cleanup()
+print("\nAsync fetcher test passed")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+from rag_utils.vector_store import VectorStore, initialize_vector_store
+import os
+import random
+import tempfile
+
+# Count the chunk texts that actually go through the embedding model
+embedded = []
+_embed_uncached = VectorStore._embed_uncached
+
+
+def counting_embed(self, texts):
+    embedded.extend(texts)
+    return _embed_uncached(self, texts)
+
+
+VectorStore._embed_uncached = counting_embed
+
+# Set up test directory
+work_dir = tempfile.TemporaryDirectory()
+test_dir = os.path.join(work_dir.name, 'docs')
+db_dir = os.path.join(work_dir.name, 'db')
+os.makedirs(test_dir)
+
+# A policy document of short lines, like text extracted from a PDF
+random.seed(7)
+words = ("policy employee leave request manager approval days notice payroll office remote "
+         "travel expense receipt limit report security device password access").split()
+lines = [f"{i + 1}. " + " ".join(random.choice(words) for _ in range(12)) + "." for i in range(150)]
+
+
+def ingest(document_lines):
+    with open(f'{test_dir}/policy.txt', 'w') as f:
+        f.write("\n".join(document_lines))
+    embedded.clear()
+    store = initialize_vector_store(test_dir, collection_name='chunk_diff_test', chroma_db_dir=db_dir)
+    return store, len(embedded)
+
+
+try:
+    print("Initial ingestion...")
+    store, initial = ingest(lines)
+    chunk_count = store.count()
+    print(f"{chunk_count} chunks, {initial} embedded")
+    assert chunk_count >= 12
+
+    # Boundaries are anchored to the text, so only the chunks around an edit change
+    print("\nInsert a line near the top...")
+    inserted = lines[:2] + ["Remote employees must also notify the office manager."] + lines[2:]
+    store, reembedded = ingest(inserted)
+    print(f"{store.count()} chunks, {reembedded} embedded")
+    assert reembedded <= 2
+
+    print("\nDelete a line near the top...")
+    store, reembedded = ingest(inserted[:4] + inserted[5:])
+    print(f"{store.count()} chunks, {reembedded} embedded")
+    assert reembedded <= 2
+    # Chunks that vanished were deleted
+    assert abs(store.count() - chunk_count) <= 2
+finally:
+    work_dir.cleanup()
+print("\nChunk diff test passed")
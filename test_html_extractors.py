@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+from rag_utils.html_extractors import EXTRACTORS, LXML_AVAILABLE
+
+# ASP.NET WebForms: one <form> wraps the whole page, only its controls are noise
+WEBFORMS_PAGE = """<html><head><title>会社概要</title></head><body>
+<form id="form1" method="post" action="./company.aspx">
+<input type="hidden" name="__VIEWSTATE" value="dDwtMTA4MTY5MjI0Mjs7Pg==" />
+<div><h1>会社概要</h1><p>当社は1950年に創業し、産業用機械の設計と製造を行っています。</p>
+<p>本社は東京都千代田区にあります。</p>
+<select name="lang"><option>日本語</option><option>English</option></select>
+<button type="submit">送信</button></div>
+</form></body></html>"""
+
+# Navigation and share blocks around an article
+ARTICLE_PAGE = """<html><head><title>Release notes</title></head><body>
+<nav><a href="/">Home</a><a href="/docs">Docs</a></nav>
+<div class="share-buttons"><a href="#">Twitter</a><a href="#">Facebook</a></div>
+<article><h1>Version 2.0</h1><p>This release adds streaming downloads and a faster HTML extractor.</p></article>
+<footer>Copyright</footer></body></html>"""
+
+for name, extractor_class in EXTRACTORS.items():
+    if name == "lxml" and not LXML_AVAILABLE:
+        print("lxml is not installed; skipping the lxml extractor")
+        continue
+    extractor = extractor_class()
+    print(f"\n{name}:")
+
+    title, text = extractor.extract(WEBFORMS_PAGE, "https://example.co.jp/company.aspx")
+    print(f"WebForms page: {title} / {text!r}")
+    assert title == "会社概要"
+    assert "産業用機械" in text and "千代田区" in text
+    if name == "lxml":
+        # The soup extractor keeps the original behaviour and leaves control labels in
+        assert "送信" not in text and "English" not in text
+
+    title, text = extractor.extract(ARTICLE_PAGE, "https://example.com/release")
+    print(f"Article page: {title} / {text!r}")
+    assert "streaming downloads" in text
+    assert "Home" not in text
+
+print("\nHTML extractor test passed")
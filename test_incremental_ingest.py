@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+from rag_utils.vector_store import initialize_vector_store
+import os
+import tempfile
+
+# Documents and database live in a temporary directory, removed even if an assertion fails
+work_dir = tempfile.TemporaryDirectory()
+test_dir = os.path.join(work_dir.name, 'docs')
+db_dir = os.path.join(work_dir.name, 'db')
+os.makedirs(test_dir)
+
+try:
+    for i in range(3):
+        with open(f'{test_dir}/doc{i}.txt', 'w') as f:
+            f.write(f"Document {i} about Python programming and machine learning. " * 40)
+
+    # First start ingests every file through the pipeline
+    print("Initial ingestion...")
+    store = initialize_vector_store(test_dir, collection_name='ingest_test', chroma_db_dir=db_dir)
+    initial_count = store.collection.count()
+    print(f"Collection has {initial_count} chunks")
+    assert initial_count > 0
+
+    # Second start must not add anything
+    print("\nRestart without changes...")
+    store = initialize_vector_store(test_dir, collection_name='ingest_test', chroma_db_dir=db_dir)
+    assert store.collection.count() == initial_count
+
+    # Removing a file drops its chunks, adding one ingests only that file
+    print("\nRemove one file, add another...")
+    os.remove(f'{test_dir}/doc0.txt')
+    with open(f'{test_dir}/doc3.txt', 'w') as f:
+        f.write("A short new document about neural networks.")
+    store = initialize_vector_store(test_dir, collection_name='ingest_test', chroma_db_dir=db_dir)
+    remaining = store.collection.get(include=["metadatas"])["metadatas"]
+    sources = {meta["source"] for meta in remaining}
+    print(f"Sources after update: {sorted(sources)}")
+    assert "doc0.txt" not in sources and "doc3.txt" in sources
+finally:
+    work_dir.cleanup()
+print("\nTest completed!")
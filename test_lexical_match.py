@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+from rag_utils.bm25_index import BM25Index
+import tempfile
+
+index_dir = tempfile.TemporaryDirectory()
+try:
+    index = BM25Index(index_dir.name)
+    index.add(
+        ['manual', 'faq', 'news', 'order'],
+        [
+            '型番AB-1234のポンプは毎分20リットルを送水します。保守点検は半年ごとに行ってください。',
+            'よくある質問：ご注文の変更はマイページから行ってください。',
+            '新製品の発表会を東京で開催しました。',
+            'ご注文の商品は3営業日以内に発送します。',
+        ]
+    )
+    # Common phrasing, so the function-word bigrams of the question are known and cheap
+    index.add(
+        [f'notice{i}' for i in range(4)],
+        [
+            'ポンプの選び方について、担当者が詳しく教えてくれます。',
+            '製品の保証について教えてほしいという質問が多く寄せられています。',
+            '点検の日程については営業担当にお問い合わせください。',
+            '使い方について動画で教えています。',
+        ]
+    )
+
+    # A question about the part number matches most of its weight in the manual
+    query = 'AB-1234のポンプの保守点検について教えてください'
+    reference = index.reference_score(query)
+    print(f"Query: {query} (reference score {reference:.3f})")
+    matches = {doc_id: score / reference for doc_id, score in index.search(query, top_k=8)}
+    for doc_id, match in matches.items():
+        print(f"{doc_id}: bm25 match {match:.2f}")
+
+    # RagService keeps lexical-only hits from a bm25 match of 0.4 (RAG_LEXICAL_MATCH_THRESH)
+    assert matches['manual'] >= 0.4
+    # The others only share the polite ending or "について" with the question
+    assert all(match < 0.4 for doc_id, match in matches.items() if doc_id != 'manual')
+finally:
+    index_dir.cleanup()
+print("\nLexical match test passed")
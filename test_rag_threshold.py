@@ -2,7 +2,7 @@
 
 from rag_utils.rag_service import RagService
 import os
-import shutil
+import tempfile
 
 # Set up test directory
 test_dir = './test_docs'
@@ -15,20 +15,23 @@ Python is widely used for machine learning and AI development.
 It's also popular for data analysis and web development.
 Machine learning concepts include neural networks, deep learning, and reinforcement learning.""")
 
-# Clean up previous database
-if os.path.exists('./test_chroma_db'):
-    shutil.rmtree('./test_chroma_db')
+# The database and web cache go to a temporary directory
+db_dir = tempfile.TemporaryDirectory()
 
-# Initialize RAG service with the test directory
-print("Initializing RAG service...")
-service = RagService(
-    pdf_dir=test_dir,
-    collection_name='test_cosine_collection',
-    chroma_db_dir='./test_chroma_db'
-)
+try:
+    # Initialize RAG service with the test directory
+    print("Initializing RAG service...")
+    service = RagService(
+        pdf_dir=test_dir,
+        collection_name='test_cosine_collection',
+        chroma_db_dir=db_dir.name,
+        web_cache_dir=os.path.join(db_dir.name, 'web_cache')
+    )
 
-# Test with different threshold values
-for threshold in [0.0, 0.4, 0.7]:
-    print(f"\n=== Testing with threshold {threshold} ===")
-    context = service.retrieve_context("What is Python?", retrieve_score_thresh=threshold)
-    print(context)
\ No newline at end of file
+    # Test with different threshold values
+    for threshold in [0.0, 0.4, 0.7]:
+        print(f"\n=== Testing with threshold {threshold} ===")
+        context = service.retrieve_context("What is Python?", retrieve_score_thresh=threshold)
+        print(context)
+finally:
+    db_dir.cleanup()
\ No newline at end of file